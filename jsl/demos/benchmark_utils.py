@@ -0,0 +1,18 @@
+# Helpers shared by the benchmarks of the Kalman filters
+
+import time
+
+
+def time_fn(fn, *args, n_repeats=3):
+    """
+    Time the execution of a jitted function, excluding compilation time
+    """
+    outputs = fn(*args)
+    outputs[0].block_until_ready()
+
+    start = time.time()
+    for _ in range(n_repeats):
+        outputs = fn(*args)
+        outputs[0].block_until_ready()
+    return (time.time() - start) / n_repeats
+
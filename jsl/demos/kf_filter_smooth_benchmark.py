@@ -0,0 +1,66 @@
+# Benchmark of the fused Kalman filter-smoother (filter_smooth) against
+# the two-call path (filter followed by smooth).
+# The fused version keeps only the filtered means and covariances for
+# the backward pass and recomputes the conditional terms, so it stores
+# half of the covariance history and runs a single vmap.
+
+import numpy as np
+import jax
+import matplotlib.pyplot as plt
+from jax import jit, random
+
+from jsl.lds.kalman_filter import OutputSpec, filter, smooth, filter_smooth
+from jsl.lds.lds_test_utils import tracking_lds
+from jsl.demos.benchmark_utils import time_fn
+
+
+def history_size(fn, *args):
+    """
+    Size in bytes of the outputs of a function, evaluated without running it
+    """
+    shapes = jax.tree_util.tree_leaves(jax.eval_shape(fn, *args))
+    return sum(np.prod(shape.shape) * shape.dtype.itemsize for shape in shapes)
+
+
+def main(timesteps_list=(100, 1_000, 10_000), n_samples=32):
+    lds_instance = tracking_lds()
+    key = random.PRNGKey(314)
+
+    two_calls = jit(lambda x: smooth(lds_instance, *filter(lds_instance, x)))
+    fused = lambda x: filter_smooth(lds_instance, x)
+
+    times = {"filter + smooth": [], "filter_smooth": []}
+    for timesteps in timesteps_list:
+        key, key_obs = random.split(key)
+        x_hist = random.normal(key_obs, (n_samples, timesteps, 2)).cumsum(axis=1) * 0.01
+
+        times["filter + smooth"].append(time_fn(two_calls, x_hist))
+        times["filter_smooth"].append(time_fn(fused, x_hist))
+
+        # Filtering history read back by the backward pass
+        size_two_calls = history_size(lambda x: filter(lds_instance, x), x_hist)
+        size_fused = history_size(lambda x: filter(lds_instance, x, output_spec=OutputSpec(("mu", "Sigma"))), x_hist)
+
+        print(f"T={timesteps:>7,}", *[f"{name}: {hist[-1]:.4f}s" for name, hist in times.items()],
+              f"filtering history: {size_two_calls / 2 ** 20:.1f}MiB vs {size_fused / 2 ** 20:.1f}MiB", sep=" | ")
+
+    dict_figures = {}
+    fig, ax = plt.subplots()
+    for name, hist in times.items():
+        ax.plot(timesteps_list, hist, marker="o", label=name)
+    ax.set_xscale("log")
+    ax.set_yscale("log")
+    ax.set_xlabel("timesteps")
+    ax.set_ylabel("time (s)")
+    ax.legend()
+    ax.set_title(f"Kalman smoother of {n_samples} sequences")
+    dict_figures["kf_filter_smooth_benchmark"] = fig
+
+    return dict_figures
+
+
+if __name__ == "__main__":
+    from jsl.demos.plot_utils import savefig
+    figures = main()
+    savefig(figures)
+    plt.show()
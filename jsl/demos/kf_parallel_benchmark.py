@@ -0,0 +1,59 @@
+# Benchmark of the sequential (lax.scan) and parallel-in-time
+# (lax.associative_scan) Kalman filter and RTS smoother.
+# We time a 2d tracking problem for an increasing number of timesteps.
+# Note that the parallel versions only pay off on hardware with enough
+# cores to exploit the O(log T) depth of the associative scan.
+
+import matplotlib.pyplot as plt
+from jax import jit, random
+
+from jsl.lds.kalman_filter import kalman_filter, kalman_smoother
+from jsl.lds.parallel_kalman_filter import parallel_kalman_filter, parallel_kalman_smoother
+from jsl.lds.lds_test_utils import tracking_lds
+from jsl.demos.benchmark_utils import time_fn
+
+
+def main(timesteps_list=(1_000, 10_000, 100_000, 1_000_000)):
+    lds_instance = tracking_lds()
+    key = random.PRNGKey(314)
+
+    filter_seq = jit(lambda x: kalman_filter(lds_instance, x))
+    filter_par = jit(lambda x: parallel_kalman_filter(lds_instance, x))
+    smoother_seq = jit(lambda hist: kalman_smoother(lds_instance, *hist))
+    smoother_par = jit(lambda hist: parallel_kalman_smoother(lds_instance, *hist))
+
+    times = {"filter (sequential)": [], "filter (parallel)": [],
+             "smoother (sequential)": [], "smoother (parallel)": []}
+    for timesteps in timesteps_list:
+        key, key_obs = random.split(key)
+        x_hist = random.normal(key_obs, (timesteps, 2)).cumsum(axis=0) * 0.01
+        filter_hist = filter_seq(x_hist)
+
+        times["filter (sequential)"].append(time_fn(filter_seq, x_hist))
+        times["filter (parallel)"].append(time_fn(filter_par, x_hist))
+        times["smoother (sequential)"].append(time_fn(smoother_seq, filter_hist))
+        times["smoother (parallel)"].append(time_fn(smoother_par, filter_hist))
+
+        print(f"T={timesteps:>9,}", *[f"{name}: {hist[-1]:.4f}s" for name, hist in times.items()], sep=" | ")
+
+    dict_figures = {}
+    fig, ax = plt.subplots()
+    for name, hist in times.items():
+        linestyle = "--" if "parallel" in name else "-"
+        ax.plot(timesteps_list, hist, marker="o", linestyle=linestyle, label=name)
+    ax.set_xscale("log")
+    ax.set_yscale("log")
+    ax.set_xlabel("timesteps")
+    ax.set_ylabel("time (s)")
+    ax.legend()
+    ax.set_title("Sequential vs parallel Kalman filter and smoother")
+    dict_figures["kf_parallel_benchmark"] = fig
+
+    return dict_figures
+
+
+if __name__ == "__main__":
+    from jsl.demos.plot_utils import savefig
+    figures = main()
+    savefig(figures)
+    plt.show()
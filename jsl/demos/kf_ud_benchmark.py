@@ -0,0 +1,100 @@
+# Benchmark of the UD-factorised (Bierman-Thornton) Kalman filter
+# against the Joseph-form kalman_filter over long float32 runs.
+# Both filters run in float32 on a poorly conditioned tracking problem
+# (precise position measurements, diffuse prior). Their covariances are
+# compared with a float64 numpy run of the covariance recursion, which
+# does not depend on the observations and serves as reference.
+
+import numpy as np
+import matplotlib.pyplot as plt
+from jax import jit, random
+
+from jsl.lds.kalman_filter import kalman_filter
+from jsl.lds.ud_kalman_filter import ud_kalman_filter
+from jsl.lds.lds_test_utils import tracking_lds
+from jsl.demos.benchmark_utils import time_fn
+
+
+def reference_covariances(lds, timesteps):
+    """
+    Filtered covariances of a time-invariant LDS in float64
+    """
+    A, C, Q, R, Sigma = (np.asarray(x, dtype=np.float64) for x in (lds.A, lds.C, lds.Q, lds.R, lds.Sigma))
+    Sigma_hist = np.empty((timesteps, *Sigma.shape))
+    for t in range(timesteps):
+        Sigma_cond = A @ Sigma @ A.T + Q
+        S = C @ Sigma_cond @ C.T + R
+        K = np.linalg.solve(S, C @ Sigma_cond).T
+        Sigma = Sigma_cond - K @ S @ K.T
+        Sigma_hist[t] = Sigma
+    return Sigma_hist
+
+
+def stability_metrics(Sigma_hist, Sigma_hist_ref):
+    """
+    Relative error of the covariances with respect to the reference
+    and smallest eigenvalue of every covariance (negative when
+    positive semi-definiteness has been lost)
+    """
+    Sigma_hist = np.asarray(Sigma_hist, dtype=np.float64)
+    error = np.linalg.norm(Sigma_hist - Sigma_hist_ref, axis=(1, 2)) / np.linalg.norm(Sigma_hist_ref, axis=(1, 2))
+    min_eig = np.linalg.eigvalsh((Sigma_hist + np.swapaxes(Sigma_hist, 1, 2)) / 2).min(axis=1)
+    return error, min_eig
+
+
+def main(timesteps_list=(1_000, 10_000, 100_000)):
+    key = random.PRNGKey(314)
+    lds_instance = tracking_lds(system_noise=1e-6, obs_noise=1e-4, prior_variance=1e4)
+
+    filters = {
+        "Joseph": jit(lambda x: kalman_filter(lds_instance, x)),
+        "UD": jit(lambda x: ud_kalman_filter(lds_instance, x)),
+    }
+
+    times = {name: [] for name in filters}
+    for timesteps in timesteps_list:
+        key, key_obs = random.split(key)
+        _, x_hist = lds_instance.sample(key_obs, timesteps)
+        Sigma_hist_ref = reference_covariances(lds_instance, timesteps)
+
+        report = []
+        for name, filter_fn in filters.items():
+            times[name].append(time_fn(filter_fn, x_hist))
+            _, Sigma_hist, _, _ = filter_fn(x_hist)
+            error, min_eig = stability_metrics(Sigma_hist, Sigma_hist_ref)
+            report.append(f"{name}: {times[name][-1]:.4f}s, max rel. error {error.max():.2e}, "
+                          f"min eigenvalue {min_eig.min():.2e}")
+        print(f"T={timesteps:>7,}", *report, sep=" | ")
+
+    dict_figures = {}
+    fig, ax = plt.subplots()
+    for name, hist in times.items():
+        ax.plot(timesteps_list, hist, marker="o", label=name)
+    ax.set_xscale("log")
+    ax.set_yscale("log")
+    ax.set_xlabel("timesteps")
+    ax.set_ylabel("time (s)")
+    ax.legend()
+    ax.set_title("float32 Kalman filter")
+    dict_figures["kf_ud_benchmark_time"] = fig
+
+    fig, ax = plt.subplots()
+    for name, filter_fn in filters.items():
+        _, Sigma_hist, _, _ = filter_fn(x_hist)
+        error, _ = stability_metrics(Sigma_hist, Sigma_hist_ref)
+        ax.plot(error, label=name)
+    ax.set_yscale("log")
+    ax.set_xlabel("timestep")
+    ax.set_ylabel("relative covariance error")
+    ax.legend()
+    ax.set_title("float32 error with respect to float64")
+    dict_figures["kf_ud_benchmark_error"] = fig
+
+    return dict_figures
+
+
+if __name__ == "__main__":
+    from jsl.demos.plot_utils import savefig
+    figures = main()
+    savefig(figures)
+    plt.show()
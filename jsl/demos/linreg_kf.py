@@ -41,7 +41,7 @@ def kf_linreg(X, y, R, mu0, Sigma0, F, Q):
     * array(n_obs, dimension, dimension)
         Online estimation of uncertainty
     """
-    C = lambda t: X[t][None, ...]
+    C = X[:, None, :]
     lds = LDS(F, C, Q, R, mu0, Sigma0)
 
     mu_hist, Sigma_hist, _, _ = kalman_filter(lds, y)
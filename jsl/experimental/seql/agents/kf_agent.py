@@ -50,7 +50,7 @@ class KalmanFilterRegAgent(Agent):
         *_, input_dim = x.shape
 
         A, Q = jnp.eye(input_dim), 0
-        C = lambda t: x[t][None, ...]
+        C = x[:, None, :]
 
         lds = LDS(A, C, Q, self.obs_noise, belief.mu, belief.Sigma)
         mu, Sigma, _, _ = kalman_filter(lds, y,
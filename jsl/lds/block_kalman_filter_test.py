@@ -0,0 +1,88 @@
+"""Tests for jsl.lds.block_kalman_filter"""
+import jax.numpy as jnp
+from jax import random, vmap
+
+import chex
+
+from absl.testing import absltest
+from absl.testing import parameterized
+
+from jsl.lds.kalman_filter import kalman_filter, kalman_smoother
+from jsl.lds.block_kalman_filter import BlockDiagonalLDS, block_kalman_filter, block_kalman_smoother
+from jsl.lds.lds_test_utils import tracking_lds
+
+
+def block_diagonal(blocks: chex.Array):
+    """
+    Expand an array(timesteps, n_blocks, b, b) of diagonal blocks
+    into an array(timesteps, n_blocks * b, n_blocks * b)
+    """
+    timesteps, n_blocks, b, _ = blocks.shape
+    eye = jnp.eye(n_blocks)
+    return jnp.einsum("tnij,nm->tnimj", blocks, eye).reshape(timesteps, n_blocks * b, n_blocks * b)
+
+
+class BlockKalmanFilterTest(parameterized.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        key_mu, key_dt, key_obs = random.split(random.PRNGKey(0), 3)
+        # Objects with different time steps and initial states
+        dts = random.uniform(key_dt, (5,), minval=0.05, maxval=0.2)
+        blocks = vmap(tracking_lds)(dts)
+        blocks.mu = random.normal(key_mu, (5, 4))
+        self.lds = BlockDiagonalLDS(blocks)
+        _, self.x_hist = self.lds.to_dense().sample(key_obs, 30)
+
+    @parameterized.named_parameters(
+        ("full", None, None),
+        ("missing", "missing", None),
+        ("ragged", None, 21),
+    )
+    def test_matches_dense_filter(self, missing: str, length: int):
+        x_hist = self.x_hist
+        if missing:
+            x_hist = x_hist.at[3:6, 2:5].set(jnp.nan)
+        dense_lds = self.lds.to_dense()
+
+        *outputs, log_likelihood = block_kalman_filter(self.lds, x_hist, length=length,
+                                                       return_log_likelihood=True)
+        mu_hist, Sigma_hist, mu_cond_hist, Sigma_cond_hist = outputs
+        chex.assert_shape(Sigma_hist, (30, 5, 4, 4))
+        *outputs_dense, log_likelihood_dense = kalman_filter(dense_lds, x_hist, length=length,
+                                                             return_log_likelihood=True)
+
+        outputs = (mu_hist, block_diagonal(Sigma_hist), mu_cond_hist, block_diagonal(Sigma_cond_hist))
+        chex.assert_trees_all_close(outputs, tuple(outputs_dense), atol=1e-4, rtol=1e-4)
+        chex.assert_trees_all_close(log_likelihood, log_likelihood_dense, rtol=1e-4)
+
+        mu_hist_smooth, Sigma_hist_smooth = block_kalman_smoother(self.lds, mu_hist, Sigma_hist,
+                                                                  mu_cond_hist, Sigma_cond_hist, length)
+        mu_hist_smooth_dense, Sigma_hist_smooth_dense = kalman_smoother(dense_lds, *outputs_dense, length)
+        chex.assert_trees_all_close(mu_hist_smooth, mu_hist_smooth_dense, atol=1e-4, rtol=1e-4)
+        chex.assert_trees_all_close(block_diagonal(Sigma_hist_smooth), Sigma_hist_smooth_dense,
+                                    atol=1e-4, rtol=1e-4)
+
+    def test_kronecker(self):
+        mu = random.normal(random.PRNGKey(1), (3, 4))
+        lds = BlockDiagonalLDS.kronecker(tracking_lds(), 3, mu)
+        chex.assert_shape(lds.blocks.A, (3, 4, 4))
+        dense_lds = lds.to_dense()
+        chex.assert_trees_all_close(dense_lds.A, jnp.kron(jnp.eye(3), tracking_lds().A))
+        chex.assert_trees_all_close(dense_lds.mu, mu.reshape(-1))
+
+        _, x_hist = dense_lds.sample(random.PRNGKey(2), 20)
+        mun, Sigman, _, _ = block_kalman_filter(lds, x_hist, return_history=False, chunk_size=2)
+        mun_dense, Sigman_dense, _, _ = kalman_filter(dense_lds, x_hist, return_history=False)
+        chex.assert_trees_all_close(mun, mun_dense, atol=1e-4, rtol=1e-4)
+        chex.assert_trees_all_close(block_diagonal(Sigman[None])[0], Sigman_dense, atol=1e-4, rtol=1e-4)
+
+    def test_callable_blocks(self):
+        lds = tracking_lds()
+        lds.C = lambda t: jnp.eye(2, 4)
+        with self.assertRaises(ValueError):
+            BlockDiagonalLDS(lds)
+
+
+if __name__ == '__main__':
+    absltest.main()
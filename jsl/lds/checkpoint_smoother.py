@@ -0,0 +1,164 @@
+# Memory-bounded Kalman smoother for long sequences.
+# The forward pass only stores the filtering state at the start of every
+# segment of the sequence (a checkpoint). The backward pass recomputes
+# the filtering history of one segment at a time from its checkpoint and
+# runs the RTS recursion over it. With segments of about sqrt(T) steps, the
+# working memory grows as O(sqrt(T) d^2) instead of O(T d^2), at the cost
+# of a second forward pass.
+
+import chex
+
+import numpy as np
+import jax.numpy as jnp
+from jax import lax
+from jax.scipy.linalg import solve
+
+from dataclasses import replace
+
+from jsl.lds.kalman_filter import LDS, kalman_filter_scan, split_stacked, as_covariance
+
+
+def segment_length_for_budget(timesteps: int, state_size: int,
+                              memory_budget: int = None,
+                              itemsize: int = 4):
+    """
+    Choose the segment length of the checkpointed smoother.
+    The working memory consists of the checkpoints, one (mu, Sigma) per
+    segment, and of the recomputed filtering history of one segment,
+    two means and two covariances per step.
+    Parameters
+    ----------
+    timesteps: int
+        Length of the sequence
+    state_size: int
+        Dimension of the hidden state
+    memory_budget: int
+        Working memory in bytes (optional). If not given,
+        segments of about sqrt(timesteps) steps are used.
+    itemsize: int
+        Size in bytes of an array element
+    Returns
+    -------
+    * int
+        Segment length
+    """
+    checkpoint_size = (state_size + state_size ** 2) * itemsize
+    step_size = 2 * checkpoint_size
+
+    def working_memory(segment_length):
+        n_segments = -(-timesteps // segment_length)
+        return n_segments * checkpoint_size + segment_length * step_size
+
+    segment_length = max(1, int(np.ceil(np.sqrt(timesteps / 2))))
+    if memory_budget is None:
+        return segment_length
+
+    if working_memory(segment_length) > memory_budget:
+        raise ValueError(f"The smoother needs at least {working_memory(segment_length)} bytes "
+                         f"of working memory, but the memory budget is {memory_budget} bytes.")
+
+    # Longer segments mean fewer sequential iterations: take the
+    # longest segment that fits in the budget
+    candidates = np.arange(segment_length, timesteps + 1)
+    n_segments = -(-timesteps // candidates)
+    fits = n_segments * checkpoint_size + candidates * step_size <= memory_budget
+    return int(candidates[fits].max())
+
+
+def checkpointed_kalman_smoother(params: LDS,
+                                 x_hist: chex.Array,
+                                 segment_length: int = None,
+                                 memory_budget: int = None,
+                                 full_covariance: bool = False):
+    """
+    Compute the Kalman smoother with bounded memory, by storing filtering
+    checkpoints every segment_length steps and recomputing the filtering
+    history of each segment during the backward pass.
+    Missing observations are given as NaNs in x_hist.
+    Parameters
+    ----------
+    params: LDS
+         Linear Dynamical System object
+    x_hist: array(timesteps, observation_size)
+    segment_length: int
+        Number of steps between checkpoints (optional)
+    memory_budget: int
+        Working memory in bytes used to choose segment_length
+        when it is not given (see segment_length_for_budget)
+    full_covariance: bool
+        Whether to return the full smoothed covariances, which take
+        O(T d^2) memory, or only their diagonals
+    Returns
+    -------
+    * array(timesteps, state_size):
+        Smoothed means mut
+    * array(timesteps, state_size, state_size) or array(timesteps, state_size)
+        Smoothed covariances Sigmat or their diagonals
+    """
+    timesteps = x_hist.shape[0]
+    state_size, _ = params.get_trans_mat_of(0).shape
+    if segment_length is None:
+        segment_length = segment_length_for_budget(timesteps, state_size, memory_budget,
+                                                   jnp.result_type(float).itemsize)
+    n_segments = -(-timesteps // segment_length)
+
+    pad_width = [(0, n_segments * segment_length - timesteps)] + [(0, 0)] * (x_hist.ndim - 1)
+    x_segments = jnp.pad(x_hist, pad_width).reshape(n_segments, segment_length, *x_hist.shape[1:])
+    starts = jnp.arange(n_segments) * segment_length
+    lengths = jnp.minimum(segment_length, timesteps - starts)
+
+    Sigma0 = jnp.broadcast_to(params.Sigma, (state_size, state_size))
+    initial_state = (params.mu, Sigma0, jnp.array(0), jnp.zeros(()))
+
+    # Stacked time-varying parameters are split into segments as well
+    to_segments = lambda x: jnp.pad(x, [pad_width[0]] + [(0, 0)] * (x.ndim - 1), mode="edge") \
+        .reshape(n_segments, segment_length, *x.shape[1:])
+    stacked_segments = {name: to_segments(param) for name, param in split_stacked(params).items()}
+
+    def filter_segment(state, inps):
+        x_segment, length, stacked = inps
+        params_segment = replace(params, **stacked)
+        final_state, history = kalman_filter_scan(params_segment, state, x_segment, length=length)
+        return final_state, history
+
+    # Forward pass: keep only the state at the start of every segment
+    def forward_step(state, inps):
+        final_state, _ = filter_segment(state, inps)
+        return final_state, state
+
+    inputs = (x_segments, lengths, stacked_segments)
+    (mun, Sigman, _, _), checkpoints = lax.scan(forward_step, initial_state, inputs)
+
+    def smoother_step(carry, inps):
+        mu_next, Sigma_next = carry
+        mu, Sigma, t = inps
+        A = params.get_trans_mat_of(t + 1)
+        Q = as_covariance(params.get_system_noise_of(t + 1), state_size)
+        mu_cond_next = A @ mu
+        Sigma_cond_next = A @ Sigma @ A.T + Q
+
+        J = solve(Sigma_cond_next, A @ Sigma, sym_pos=True).T
+        mu_smooth = mu + J @ (mu_next - mu_cond_next)
+        Sigma_smooth = Sigma + J @ (Sigma_next - Sigma_cond_next) @ J.T
+
+        # The last step (and the padding past it) is already smoothed
+        is_last = t >= timesteps - 1
+        mu_smooth = jnp.where(is_last, mu, mu_smooth)
+        Sigma_smooth = jnp.where(is_last, Sigma, Sigma_smooth)
+        Sigma_out = Sigma_smooth if full_covariance else jnp.diagonal(Sigma_smooth)
+        return (mu_smooth, Sigma_smooth), (mu_smooth, Sigma_out)
+
+    # Backward pass: recompute the filtering history of one segment at a time
+    def backward_step(carry, inps):
+        checkpoint, x_segment, length, stacked, start = inps
+        _, (mu_hist, Sigma_hist, _, _) = filter_segment(checkpoint, (x_segment, length, stacked))
+        t_hist = start + jnp.arange(segment_length)
+        carry, outputs = lax.scan(smoother_step, carry, (mu_hist, Sigma_hist, t_hist), reverse=True)
+        return carry, outputs
+
+    inputs = (checkpoints, x_segments, lengths, stacked_segments, starts)
+    _, (mu_hist_smooth, Sigma_hist_smooth) = lax.scan(backward_step, (mun, Sigman), inputs, reverse=True)
+
+    mu_hist_smooth = mu_hist_smooth.reshape(-1, state_size)[:timesteps]
+    Sigma_hist_smooth = Sigma_hist_smooth.reshape(-1, *Sigma_hist_smooth.shape[2:])[:timesteps]
+    return mu_hist_smooth, Sigma_hist_smooth
@@ -0,0 +1,72 @@
+"""Tests for jsl.lds.checkpoint_smoother"""
+import jax.numpy as jnp
+from jax import random
+
+import chex
+
+from absl.testing import absltest
+from absl.testing import parameterized
+
+from jsl.lds.kalman_filter import kalman_filter, kalman_smoother
+from jsl.lds.checkpoint_smoother import checkpointed_kalman_smoother, segment_length_for_budget
+from jsl.lds.lds_test_utils import tracking_lds
+
+
+class CheckpointSmootherTest(parameterized.TestCase):
+
+    @parameterized.parameters((None,), (1,), (7,), (10,), (70,))
+    def test_matches_kalman_smoother(self, segment_length):
+        timesteps = 70
+        lds = tracking_lds()
+        _, x_hist = lds.sample(random.PRNGKey(0), timesteps)
+        x_hist = x_hist.at[20:25].set(jnp.nan)
+        mu_expected, Sigma_expected = kalman_smoother(lds, *kalman_filter(lds, x_hist))
+
+        mu_hist, Sigma_hist = checkpointed_kalman_smoother(lds, x_hist, segment_length, full_covariance=True)
+        chex.assert_trees_all_close(mu_hist, mu_expected, atol=1e-4, rtol=1e-4)
+        chex.assert_trees_all_close(Sigma_hist, Sigma_expected, atol=1e-4, rtol=1e-4)
+
+        _, Sigma_diag_hist = checkpointed_kalman_smoother(lds, x_hist, segment_length)
+        chex.assert_shape(Sigma_diag_hist, (timesteps, 4))
+        chex.assert_trees_all_close(Sigma_diag_hist, jnp.diagonal(Sigma_expected, axis1=1, axis2=2),
+                                    atol=1e-4, rtol=1e-4)
+
+    def test_stacked_parameters(self):
+        timesteps = 30
+        lds = tracking_lds()
+        _, x_hist = lds.sample(random.PRNGKey(0), timesteps)
+        lds.C = lds.C + 0.1 * random.normal(random.PRNGKey(1), (timesteps, 2, 4))
+        mu_expected, Sigma_expected = kalman_smoother(lds, *kalman_filter(lds, x_hist))
+
+        mu_hist, Sigma_hist = checkpointed_kalman_smoother(lds, x_hist, 7, full_covariance=True)
+        chex.assert_trees_all_close(mu_hist, mu_expected, atol=1e-4, rtol=1e-4)
+        chex.assert_trees_all_close(Sigma_hist, Sigma_expected, atol=1e-4, rtol=1e-4)
+
+    def test_segment_length_for_budget(self):
+        timesteps, state_size = 10 ** 6, 50
+        segment_length = segment_length_for_budget(timesteps, state_size)
+        assert segment_length == 708
+
+        budget = 10 ** 9
+        segment_length = segment_length_for_budget(timesteps, state_size, budget)
+        checkpoint_size = (state_size + state_size ** 2) * 4
+        n_segments = -(-timesteps // segment_length)
+        assert n_segments * checkpoint_size + 2 * segment_length * checkpoint_size <= budget
+        assert segment_length > 708
+
+        with self.assertRaises(ValueError):
+            segment_length_for_budget(timesteps, state_size, 10 ** 6)
+
+    def test_diagonal_system_noise(self):
+        lds = tracking_lds()
+        _, x_hist = lds.sample(random.PRNGKey(0), 30)
+        mu_expected, Sigma_expected = kalman_smoother(lds, *kalman_filter(lds, x_hist))
+        lds.Q = jnp.diagonal(lds.Q)
+
+        mu_hist, Sigma_hist = checkpointed_kalman_smoother(lds, x_hist, 7, full_covariance=True)
+        chex.assert_trees_all_close(mu_hist, mu_expected, atol=1e-4, rtol=1e-4)
+        chex.assert_trees_all_close(Sigma_hist, Sigma_expected, atol=1e-4, rtol=1e-4)
+
+
+if __name__ == '__main__':
+    absltest.main()
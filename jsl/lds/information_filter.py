@@ -0,0 +1,132 @@
+# Information-form Kalman filter for a Linear Dynamical System with
+# high-dimensional observations. The measurement update is done on the
+# precision (information) matrix,
+#   Sigma_t^{-1} = Sigma_{t|t-1}^{-1} + C^T R^{-1} C,
+# so that, once C^T R^{-1} C and C^T R^{-1} x_t are available, every step
+# only involves state_size x state_size systems.
+
+import chex
+
+import jax.numpy as jnp
+from jax import lax, vmap, tree_map
+from jax.scipy.linalg import solve, cho_factor, cho_solve
+
+from functools import partial
+
+from jsl.lds.kalman_filter import LDS, as_covariance, is_stacked
+
+
+def _information_terms(Ct: chex.Array, R: chex.Array):
+    """
+    Compute the observation terms C^T R^{-1} C and C^T R^{-1}
+    """
+    observation_size, _ = Ct.shape
+    R = as_covariance(R, observation_size)
+    CtRinv = solve(R, Ct, sym_pos=True).T
+    return CtRinv @ Ct, CtRinv
+
+
+def information_kalman_filter(params: LDS, x_hist: chex.Array,
+                              return_history: bool = True):
+    """
+    Compute the online version of the Kalman-Filter in information form.
+    If C and R are constant, C^T R^{-1} C is computed once and the
+    observations are projected onto the state space before filtering.
+    Otherwise (functions of time or stacked arrays), the observation
+    terms are computed at every step.
+    Parameters
+    ----------
+    params: LDS
+         Linear Dynamical System object
+    x_hist: array(timesteps, observation_size)
+    return_history: bool
+    Returns
+    -------
+    * array(timesteps, state_size):
+        Filtered means mut
+    * array(timesteps, state_size, state_size)
+        Filtered covariances Sigmat
+    * array(timesteps, state_size)
+        Filtered conditional means mut|t-1
+    * array(timesteps, state_size, state_size)
+        Filtered conditional covariances Sigmat|t-1
+    """
+    state_size, _ = params.get_trans_mat_of(0).shape
+    I = jnp.eye(state_size)
+    constant_obs = not any(callable(param) or is_stacked(param) for param in (params.C, params.R))
+
+    if constant_obs:
+        J, CtRinv = _information_terms(params.C, params.R)
+        # Observations projected onto the state space: C^T R^{-1} x_t
+        obs_hist = x_hist @ CtRinv.T
+    else:
+        obs_hist = x_hist
+
+    def information_step(state, obs):
+        mu, Sigma, t = state
+        A = params.get_trans_mat_of(t)
+        Q = as_covariance(params.get_system_noise_of(t), state_size)
+
+        if constant_obs:
+            Jt, ht = J, obs
+        else:
+            Jt, CtRinv_t = _information_terms(params.get_obs_mat_of(t),
+                                              params.get_observation_noise_of(t))
+            ht = CtRinv_t @ obs
+
+        mu_cond = A @ mu
+        Sigma_cond = A @ Sigma @ A.T + Q
+
+        Lambda_cond = cho_solve(cho_factor(Sigma_cond, lower=True), I)
+        Lambda = Lambda_cond + Jt
+        Sigma = cho_solve(cho_factor(Lambda, lower=True), I)
+        Sigma = (Sigma + Sigma.T) / 2
+        mu = mu_cond + Sigma @ (ht - Jt @ mu_cond)
+
+        return (mu, Sigma, t + 1), (mu, Sigma, mu_cond, Sigma_cond)
+
+    mu0, Sigma0 = params.mu, params.Sigma
+    initial_state = (mu0, Sigma0, 0)
+    (mun, Sigman, _), history = lax.scan(information_step, initial_state, obs_hist)
+    if return_history:
+        return history
+    return mun, Sigman, None, None
+
+
+def filter(params: LDS, x_hist: chex.Array,
+           return_history: bool = True):
+    """
+    Compute the online version of the Kalman-Filter in information form.
+    Note that x_hist can optionally be of dimensionality two,
+    This corresponds to different samples of the same underlying
+    Linear Dynamical System
+    Parameters
+    ----------
+    params: LDS
+         Linear Dynamical System object
+    x_hist: array(n_samples?, timesteps, observation_size)
+    return_history: bool
+    Returns
+    -------
+    * array(n_samples?, timesteps, state_size):
+        Filtered means mut
+    * array(n_samples?, timesteps, state_size, state_size)
+        Filtered covariances Sigmat
+    * array(n_samples?, timesteps, state_size)
+        Filtered conditional means mut|t-1
+    * array(n_samples?, timesteps, state_size, state_size)
+        Filtered conditional covariances Sigmat|t-1
+    """
+    has_one_sim = False
+    if x_hist.ndim == 2:
+        x_hist = x_hist[None, ...]
+        has_one_sim = True
+
+    kalman_map = vmap(partial(information_kalman_filter, return_history=return_history), (None, 0))
+    outputs = kalman_map(params, x_hist)
+
+    if has_one_sim and return_history:
+        outputs = tree_map(lambda x: x[0, ...], outputs)
+        return outputs
+
+    return outputs
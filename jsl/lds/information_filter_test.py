@@ -0,0 +1,83 @@
+"""Tests for jsl.lds.information_filter"""
+import jax.numpy as jnp
+from jax import random
+
+import chex
+
+from absl.testing import absltest
+from absl.testing import parameterized
+
+from jsl.lds import kalman_filter as kf
+from jsl.lds import information_filter as inf
+from jsl.lds.kalman_filter import LDS
+
+
+def array_sensor_lds(key, observation_size: int, dt: float = 0.1):
+    A = jnp.array([
+        [1, 0, dt, 0],
+        [0, 1, 0, dt],
+        [0, 0, 1, 0],
+        [0, 0, 0, 1]
+    ])
+    C = random.normal(key, (observation_size, 4))
+    Q = jnp.eye(4) * 0.01
+    R = jnp.eye(observation_size) * 0.5
+    mu0 = jnp.array([1., 0., 0.5, -0.2])
+    Sigma0 = jnp.eye(4)
+    return LDS(A, C, Q, R, mu0, Sigma0)
+
+
+class InformationFilterTest(parameterized.TestCase):
+
+    @parameterized.parameters((0, 2, 1), (1, 8, 3), (2, 64, 2))
+    def test_matches_filter(self, seed: int, observation_size: int, n_samples: int):
+        timesteps = 40
+        key_lds, key_obs = random.split(random.PRNGKey(seed))
+        lds = array_sensor_lds(key_lds, observation_size)
+        _, x_hist = lds.sample(key_obs, timesteps, n_samples)
+
+        expected = kf.filter(lds, x_hist)
+        outputs = inf.filter(lds, x_hist)
+
+        for expected_hist, hist in zip(expected, outputs):
+            chex.assert_equal_shape([expected_hist, hist])
+            chex.assert_trees_all_close(hist, expected_hist, atol=1e-3, rtol=1e-3)
+
+    def test_time_varying_observation(self):
+        key_lds, key_obs = random.split(random.PRNGKey(0))
+        lds = array_sensor_lds(key_lds, 16)
+        _, x_hist = lds.sample(key_obs, 30)
+        C = lds.C
+        lds.C = lambda t: C * (1 + 0.1 * t)
+
+        expected = kf.kalman_filter(lds, x_hist)
+        outputs = inf.information_kalman_filter(lds, x_hist)
+
+        for expected_hist, hist in zip(expected, outputs):
+            chex.assert_trees_all_close(hist, expected_hist, atol=1e-3, rtol=1e-3)
+
+    def test_stacked_observation(self):
+        key_lds, key_obs = random.split(random.PRNGKey(1))
+        lds = array_sensor_lds(key_lds, 16)
+        _, x_hist = lds.sample(key_obs, 30)
+        lds.C = lds.C * (1 + 0.1 * jnp.arange(30))[:, None, None]
+
+        expected = kf.kalman_filter(lds, x_hist)
+        outputs = inf.information_kalman_filter(lds, x_hist)
+
+        for expected_hist, hist in zip(expected, outputs):
+            chex.assert_trees_all_close(hist, expected_hist, atol=1e-3, rtol=1e-3)
+
+    def test_diagonal_system_noise(self):
+        key_lds, key_obs = random.split(random.PRNGKey(2))
+        lds = array_sensor_lds(key_lds, 8)
+        _, x_hist = lds.sample(key_obs, 30)
+        expected = kf.kalman_filter(lds, x_hist)
+        lds.Q = jnp.diagonal(lds.Q)
+
+        outputs = inf.information_kalman_filter(lds, x_hist)
+        chex.assert_trees_all_close(outputs, expected, atol=1e-3, rtol=1e-3)
+
+
+if __name__ == '__main__':
+    absltest.main()
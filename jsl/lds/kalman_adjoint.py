@@ -0,0 +1,139 @@
+# Log-marginal-likelihood of a Linear Dynamical System with a custom
+# vector-Jacobian product. Differentiating through the scan of the
+# Kalman filter stores every intermediate of every step (gains,
+# innovation covariances, Joseph terms). Instead, the forward pass only
+# keeps the filtering state (mu, Sigma) before each step, and the
+# backward pass runs a reverse recursion over the steps, as a smoother
+# does, which recomputes a single step at a time and pulls the adjoints
+# of the state back through it. The memory of the gradient is that of
+# one filtering history, O(T (d + d^2)).
+
+import chex
+
+import jax.numpy as jnp
+from jax import lax, vjp, custom_vjp, tree_map
+
+from dataclasses import replace
+
+from jsl.lds.kalman_filter import LDS, kalman_step, split_stacked, _observation_mask
+
+
+def kalman_log_likelihood(params: LDS,
+                          x_hist: chex.Array,
+                          mask: chex.Array = None,
+                          length: int = None):
+    """
+    Log-marginal-likelihood log p(x1:T) of a sequence of observations,
+    computed by the Kalman filter, whose gradient with respect to the
+    parameters and the observations uses O(T (d + d^2)) memory.
+    The value and the gradient match those of kalman_filter with
+    return_log_likelihood=True. Only first-order reverse-mode
+    derivatives are supported.
+    Parameters
+    ----------
+    params: LDS
+         Linear Dynamical System object
+    x_hist: array(timesteps, observation_size)
+        Observations. Missing values are given as NaNs.
+    mask: array(timesteps) or array(timesteps, observation_size)
+        Boolean indicator of the observed steps or components (optional)
+    length: int
+        Valid length of the sequence (optional)
+    Returns
+    -------
+    * float
+        Log-marginal-likelihood log p(x1:T)
+    """
+    timesteps = x_hist.shape[0]
+    if length is None:
+        length = timesteps
+    x_hist, mask = _observation_mask(x_hist, mask)
+    # Integer leaves, e.g, Q=0, would need float0 cotangents
+    params = tree_map(lambda x: jnp.asarray(x, dtype=x_hist.dtype)
+                      if not jnp.issubdtype(jnp.result_type(x), jnp.inexact) else x, params)
+    return _log_likelihood(params, x_hist, mask, jnp.asarray(length))
+
+
+def _filter_step(constant: LDS, params_t: dict, mu: chex.Array, Sigma: chex.Array,
+                 obs: chex.Array, obs_mask: chex.Array, t: int, length: int):
+    """
+    One step of the filter, frozen past the end of the sequence.
+    The stacked time-varying parameters of the step are given
+    separately from the constant parameters.
+    """
+    params = replace(constant, **params_t)
+    mu_new, Sigma_new, _, _, log_likelihood = kalman_step(params, mu, Sigma, t, obs, obs_mask)
+    is_valid = t < length
+    mu_new = jnp.where(is_valid, mu_new, mu)
+    Sigma_new = jnp.where(is_valid, Sigma_new, Sigma)
+    return mu_new, Sigma_new, jnp.where(is_valid, log_likelihood, 0.)
+
+
+def _initial_state(params: LDS):
+    state_size, _ = params.get_trans_mat_of(0).shape
+    return params.mu, jnp.broadcast_to(params.Sigma, (state_size, state_size))
+
+
+def _split_constant(params: LDS):
+    """
+    Separate the stacked parameters, scanned over the steps,
+    from the constant ones, closed over by every step
+    """
+    stacked = split_stacked(params)
+    constant = replace(params, **{name: None for name in stacked})
+    return constant, stacked
+
+
+@custom_vjp
+def _log_likelihood(params: LDS, x_hist: chex.Array, mask: chex.Array, length: int):
+    log_likelihood, _ = _log_likelihood_fwd(params, x_hist, mask, length)
+    return log_likelihood
+
+
+def _log_likelihood_fwd(params: LDS, x_hist: chex.Array, mask: chex.Array, length: int):
+    constant, stacked = _split_constant(params)
+    timesteps = x_hist.shape[0]
+
+    def forward_step(carry, inps):
+        mu, Sigma, log_likelihood = carry
+        obs, obs_mask, t, params_t = inps
+        mu_new, Sigma_new, log_likelihood_t = _filter_step(constant, params_t, mu, Sigma,
+                                                           obs, obs_mask, t, length)
+        # Only the state before every step is kept for the backward pass
+        return (mu_new, Sigma_new, log_likelihood + log_likelihood_t), (mu, Sigma)
+
+    mu0, Sigma0 = _initial_state(params)
+    inps = (x_hist, mask, jnp.arange(timesteps), stacked)
+    (_, _, log_likelihood), history = lax.scan(forward_step, (mu0, Sigma0, 0.), inps)
+    return log_likelihood, (params, x_hist, mask, length, history)
+
+
+def _log_likelihood_bwd(residuals: tuple, g: float):
+    params, x_hist, mask, length, (mu_hist, Sigma_hist) = residuals
+    constant, stacked = _split_constant(params)
+    timesteps = x_hist.shape[0]
+
+    def backward_step(carry, inps):
+        g_mu, g_Sigma, g_constant = carry
+        mu, Sigma, obs, obs_mask, t, params_t = inps
+        step_fn = lambda constant, params_t, mu, Sigma, obs: _filter_step(constant, params_t, mu, Sigma,
+                                                                          obs, obs_mask, t, length)
+        _, step_vjp = vjp(step_fn, constant, params_t, mu, Sigma, obs)
+        g_constant_t, g_params_t, g_mu, g_Sigma, g_obs = step_vjp((g_mu, g_Sigma, g))
+        g_constant = tree_map(jnp.add, g_constant, g_constant_t)
+        return (g_mu, g_Sigma, g_constant), (g_params_t, g_obs)
+
+    state_size = mu_hist.shape[-1]
+    init = (jnp.zeros(state_size), jnp.zeros((state_size, state_size)), tree_map(jnp.zeros_like, constant))
+    inps = (mu_hist, Sigma_hist, x_hist, mask, jnp.arange(timesteps), stacked)
+    (g_mu0, g_Sigma0, g_constant), (g_stacked, g_x_hist) = lax.scan(backward_step, init, inps, reverse=True)
+
+    # Pull the adjoints of the first state back to the initial configuration
+    _, initial_vjp = vjp(_initial_state, params)
+    g_initial, = initial_vjp((g_mu0, g_Sigma0))
+    g_params = replace(g_constant, mu=g_constant.mu + g_initial.mu,
+                       Sigma=g_constant.Sigma + g_initial.Sigma, **g_stacked)
+    return g_params, g_x_hist, jnp.zeros_like(mask), None
+
+
+_log_likelihood.defvjp(_log_likelihood_fwd, _log_likelihood_bwd)
@@ -0,0 +1,71 @@
+"""Tests for jsl.lds.kalman_adjoint"""
+import jax.numpy as jnp
+from jax import random, grad, jit
+
+import chex
+
+from absl.testing import absltest
+from absl.testing import parameterized
+
+from jsl.lds.kalman_filter import LDS, kalman_filter
+from jsl.lds.kalman_adjoint import kalman_log_likelihood
+from jsl.lds.lds_test_utils import tracking_lds
+
+
+def filter_log_likelihood(params: LDS, x_hist: chex.Array, mask: chex.Array = None, length: int = None):
+    *_, log_likelihood = kalman_filter(params, x_hist, return_history=False, mask=mask,
+                                       length=length, return_log_likelihood=True)
+    return log_likelihood
+
+
+class KalmanAdjointTest(parameterized.TestCase):
+
+    @parameterized.named_parameters(
+        ("full", "full"),
+        ("diagonal_noise", "diagonal_noise"),
+        ("missing", "missing"),
+        ("ragged", "ragged"),
+        ("stacked", "stacked"),
+        ("callable", "callable"),
+    )
+    def test_gradient(self, case: str):
+        lds = tracking_lds()
+        _, x_hist = lds.sample(random.PRNGKey(0), 40)
+        mask, length = None, None
+        if case == "diagonal_noise":
+            lds.R = jnp.diagonal(lds.R)
+        elif case == "missing":
+            x_hist = x_hist.at[5:9].set(jnp.nan).at[20, 1].set(jnp.nan)
+        elif case == "ragged":
+            length = 27
+        elif case == "stacked":
+            lds.C = jnp.broadcast_to(lds.C, (40, 2, 4)) * jnp.linspace(0.5, 1.5, 40)[:, None, None]
+        elif case == "callable":
+            C = lds.C
+            lds.C = lambda t: C * (1 + 0.01 * t)
+
+        log_likelihood = jit(kalman_log_likelihood, static_argnums=3)(lds, x_hist, mask, length)
+        chex.assert_trees_all_close(log_likelihood, filter_log_likelihood(lds, x_hist, mask, length),
+                                    rtol=1e-5)
+
+        # Gradients with respect to the parameters and the observations
+        argnums = (0, 1) if case != "missing" else 0
+        grads = grad(kalman_log_likelihood, argnums)(lds, x_hist, mask, length)
+        grads_expected = grad(filter_log_likelihood, argnums)(lds, x_hist, mask, length)
+        chex.assert_trees_all_close(grads, grads_expected, atol=1e-3, rtol=1e-3)
+
+    def test_integer_parameters(self):
+        lds = tracking_lds()
+        _, x_hist = lds.sample(random.PRNGKey(0), 40)
+        lds.Q, lds.R = 0, 1
+
+        def log_likelihood_fn(A, x_hist, log_likelihood_fn):
+            return log_likelihood_fn(LDS(A, lds.C, lds.Q, lds.R, lds.mu, lds.Sigma), x_hist)
+
+        grads = grad(log_likelihood_fn, (0, 1))(lds.A, x_hist, kalman_log_likelihood)
+        grads_expected = grad(log_likelihood_fn, (0, 1))(lds.A, x_hist, filter_log_likelihood)
+        chex.assert_trees_all_close(grads, grads_expected, atol=1e-3, rtol=1e-3)
+
+
+if __name__ == '__main__':
+    absltest.main()
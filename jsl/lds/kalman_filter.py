@@ -8,14 +8,16 @@ config.update('jax_default_matmul_precision', 'float32')
 
 import chex
 
+import numpy as np
 import jax.numpy as jnp
-from jax.random import multivariate_normal, split
-from jax.scipy.linalg import solve
+from jax.random import normal, split, fold_in
+from jax.scipy.linalg import solve, solve_triangular, cho_solve
 from jax import tree_map
+from jax.tree_util import register_pytree_node, tree_flatten, tree_unflatten
 
-from jax import lax, vmap
+from jax import lax, vmap, jit
 
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from functools import partial
 from typing import Union, Callable
 
@@ -37,10 +39,22 @@ class LDS:
         Transition matrix
     C: array(observation_size, state_size)
         Constant observation matrix or function that depends on time
-    Q: array(state_size, state_size)
-        Transition covariance matrix
-    R: array(observation_size, observation_size)
-        Observation covariance
+    Q: array(state_size, state_size) or array(state_size)
+        Transition covariance matrix. If Q is a vector, it is taken
+        as the diagonal of the transition covariance.
+    R: array(observation_size, observation_size) or array(observation_size)
+        Observation covariance. If R is a vector, it is taken as the
+        diagonal of the observation covariance and the observations are
+        assimilated one component at a time.
+    Each of A, C, Q and R can also be time-varying, either as a function
+    of time or as an array(timesteps, ...) stacking the matrix of every
+    step, e.g, C of shape (timesteps, observation_size, state_size).
+    Stacked arrays are aligned with the observations and are scanned
+    together with them by the filter, which avoids retracing the filter
+    for every new sequence. A two-dimensional Q or R is always a constant
+    covariance matrix: a per-step diagonal noise has to be stacked as
+    matrices, e.g, R = vmap(jnp.diag)(r_hist) of shape
+    (timesteps, observation_size, observation_size).
     mu: array(state_size)
         Mean of initial configuration
     Sigma: array(state_size, state_size) or 0
@@ -59,24 +73,32 @@ class LDS:
     def get_trans_mat_of(self, t: int):
         if callable(self.A):
             return self.A(t)
+        elif is_stacked(self.A):
+            return self.A[t]
         else:            
             return self.A
 
     def get_obs_mat_of(self, t: int):
         if callable(self.C):
             return self.C(t)
+        elif is_stacked(self.C):
+            return self.C[t]
         else:
             return self.C
         
     def get_system_noise_of(self, t: int):
         if callable(self.Q):
             return self.Q(t)
+        elif is_stacked(self.Q):
+            return self.Q[t]
         else:
             return self.Q
 
     def get_observation_noise_of(self, t: int):
         if callable(self.R):
             return self.R(t)
+        elif is_stacked(self.R):
+            return self.R[t]
         else:
             return self.R
 
@@ -106,52 +128,386 @@ class LDS:
         * array(n_samples, timesteps, observation_size):
             Simulation of observed states
         """
-        key_z1, key_system_noise, key_obs_noise = split(key, 3)
+        chunks = self.sample_chunks(key, timesteps, n_samples, timesteps, sample_initial_state)
+        state_hist, obs_hist = next(chunks)
+        return state_hist, obs_hist
+
+    def sample_chunks(self,
+                      key: chex.PRNGKey,
+                      timesteps: int,
+                      n_samples: int = 1,
+                      chunk_size: int = 1000,
+                      sample_initial_state: bool = False):
+        """
+        Simulate a run of n_sample independent stochastic linear
+        dynamical systems in chunks of chunk_size steps, so that
+        long simulations are generated in constant memory.
+        The noise of every step is drawn from a key folded with
+        the step index, hence the simulation does not depend on
+        chunk_size and matches the output of sample.
+        Parameters
+        ----------
+        key: jax.random.PRNGKey
+            Seed of initial random states
+        timesteps: int
+            Total number of steps to sample
+        n_samples: int
+            Number of independent linear systems with shared dynamics (optional)
+        chunk_size: int
+            Number of steps of every chunk. The last chunk may be shorter
+        sample_initial_state: bool
+            Whether to sample from an initial state or specified
+        Returns
+        -------
+        * generator of (array(n_samples, chunk_size, state_size),
+                        array(n_samples, chunk_size, observation_size))
+            Simulation of latent and observed states of every chunk
+        """
+        if timesteps < 1 or chunk_size < 1:
+            raise ValueError(f"timesteps and chunk_size must be positive, "
+                             f"got {timesteps} and {chunk_size}")
+        chunk_size = min(chunk_size, timesteps)
+        key_z1, key_noise = split(key)
         state_size, _ = self.get_trans_mat_of(0).shape
 
         if not sample_initial_state:
-            state_t = self.mu * jnp.ones((n_samples, state_size))
+            state = self.mu * jnp.ones((n_samples, state_size))
         else:
-            state_t = multivariate_normal(key_z1, self.mu, self.Sigma, (n_samples,))
+            state = self.mu + normal(key_z1, (n_samples, state_size)) @ _noise_root(self.Sigma, state_size).T
+
+        for t0 in range(0, timesteps, chunk_size):
+            state, (state_hist, obs_hist) = _sample_chunk(self, key_noise, state, t0, chunk_size)
+            # The last chunk is simulated in full to reuse the compiled
+            # simulation and cut to the remaining number of steps
+            length = min(chunk_size, timesteps - t0)
+            state_hist = jnp.swapaxes(state_hist[:length], 0, 1)
+            obs_hist = jnp.swapaxes(obs_hist[:length], 0, 1)
+
+            if n_samples == 1:
+                state_hist = state_hist[0, ...]
+                obs_hist = obs_hist[0, ...]
+            yield state_hist, obs_hist
+
+    def sample_into(self,
+                    key: chex.PRNGKey,
+                    state_out: np.ndarray,
+                    obs_out: np.ndarray,
+                    chunk_size: int = 1000,
+                    sample_initial_state: bool = False):
+        """
+        Simulate the linear dynamical system chunk by chunk and write
+        the simulation into preallocated arrays, e.g., numpy memory maps,
+        so that simulations larger than the device memory can be stored.
+        Parameters
+        ----------
+        key: jax.random.PRNGKey
+            Seed of initial random states
+        state_out: array(n_samples, timesteps, state_size) or array(timesteps, state_size)
+            Array where the latent states are written
+        obs_out: array(n_samples, timesteps, observation_size) or array(timesteps, observation_size)
+            Array where the observed states are written
+        chunk_size: int
+            Number of steps simulated at a time
+        sample_initial_state: bool
+            Whether to sample from an initial state or specified
+        Returns
+        -------
+        * array(n_samples, timesteps, state_size):
+            state_out
+        * array(n_samples, timesteps, observation_size):
+            obs_out
+        """
+        if state_out.shape[:-1] != obs_out.shape[:-1]:
+            raise ValueError(f"state_out and obs_out must have the same leading dimensions, "
+                             f"got {state_out.shape} and {obs_out.shape}")
+        n_samples = 1 if state_out.ndim == 2 else state_out.shape[0]
+        timesteps = state_out.shape[-2]
 
-        # Generate all future noise terms
-        zeros_state = jnp.zeros(state_size)
-        R = self.get_observation_noise_of(0)
+        chunks = self.sample_chunks(key, timesteps, n_samples, chunk_size, sample_initial_state)
+        for t0, (state_hist, obs_hist) in zip(range(0, timesteps, chunk_size), chunks):
+            state_hist, obs_hist = np.asarray(state_hist), np.asarray(obs_hist)
+            length = state_hist.shape[-2]
+            state_out[..., t0:t0 + length, :] = state_hist.reshape(state_out[..., t0:t0 + length, :].shape)
+            obs_out[..., t0:t0 + length, :] = obs_hist.reshape(obs_out[..., t0:t0 + length, :].shape)
+        return state_out, obs_out
 
-        observation_size = timesteps if isinstance(R, int) else R.shape[0]
-        zeros_obs = jnp.zeros(observation_size)
 
-        system_noise = multivariate_normal(key_system_noise, zeros_state,
-                                         self.get_obs_mat_of(0), (timesteps, n_samples))
-        obs_noise = multivariate_normal(key_obs_noise, zeros_obs, R, (timesteps, n_samples))
+def _noise_root(noise: chex.Array, size: int):
+    """
+    Square root L of a noise covariance, L L^T = noise, computed by
+    eigendecomposition so that positive semi-definite covariances,
+    e.g, Q=0, are supported
+    """
+    cov = jnp.asarray(as_covariance(noise, size), dtype=jnp.result_type(float))
+    eigvals, eigvecs = jnp.linalg.eigh(cov)
+    return eigvecs * jnp.sqrt(jnp.maximum(eigvals, 0.))
 
-        obs_t = jnp.einsum("ij,sj->si", self.get_obs_mat_of(0), state_t) + obs_noise[0]
 
-        def sample_step(state, inps):
-            system_noise_t, obs_noise_t, t = inps
-            A = self.get_trans_mat_of(t)
-            state_new = state @ A.T + system_noise_t
-            obs_new = state_new @ self.get_obs_mat_of(t).T + obs_noise_t
-            return state_new, (state_new, obs_new)
+@partial(jit, static_argnames=("chunk_size",))
+def _sample_chunk(params: LDS, key: chex.PRNGKey, state: chex.Array, t0: int, chunk_size: int):
+    """
+    Simulate chunk_size steps t0, t0 + 1, ... of the linear dynamical
+    system, starting from the states of step t0 - 1. The initial states
+    are the states of step 0 and only receive observation noise.
+    The square roots of constant noise covariances are computed once.
+    """
+    n_samples, state_size = state.shape
+    observation_size, _ = params.get_obs_mat_of(0).shape
+    constant_Q = not (callable(params.Q) or is_stacked(params.Q))
+    constant_R = not (callable(params.R) or is_stacked(params.R))
+    Q_root = _noise_root(params.Q, state_size) if constant_Q else None
+    R_root = _noise_root(params.R, observation_size) if constant_R else None
+
+    def sample_step(state, t):
+        key_system, key_obs = split(fold_in(key, t))
+        A = params.get_trans_mat_of(t)
+        C = params.get_obs_mat_of(t)
+        Q_root_t = Q_root if constant_Q else _noise_root(params.get_system_noise_of(t), state_size)
+        R_root_t = R_root if constant_R else _noise_root(params.get_observation_noise_of(t), observation_size)
 
-        timesteps = jnp.arange(1, timesteps)
-        inputs = (system_noise[1:], obs_noise[1:], timesteps)
-        _, (state_hist, obs_hist) = lax.scan(sample_step, state_t, inputs)
+        system_noise = normal(key_system, (n_samples, state_size)) @ Q_root_t.T
+        obs_noise = normal(key_obs, (n_samples, observation_size)) @ R_root_t.T
+        state_new = jnp.where(t == 0, state, state @ A.T + system_noise)
+        obs_new = state_new @ C.T + obs_noise
+        return state_new, (state_new, obs_new)
 
-        state_hist = jnp.swapaxes(jnp.vstack([state_t[None, ...], state_hist]), 0, 1)
-        obs_hist = jnp.swapaxes(jnp.vstack([obs_t[None, ...], obs_hist]), 0, 1)
+    return lax.scan(sample_step, state, t0 + jnp.arange(chunk_size))
+
+
+def _lds_flatten(params: LDS):
+    # Functions of time are static, the arrays are the leaves of the pytree
+    values = (params.A, params.C, params.Q, params.R, params.mu, params.Sigma)
+    children = tuple(None if callable(value) else value for value in values)
+    aux_data = tuple(value if callable(value) else None for value in values)
+    return children, aux_data
+
+
+def _lds_unflatten(aux_data, children):
+    return LDS(*(child if fn is None else fn for child, fn in zip(children, aux_data)))
+
+
+register_pytree_node(LDS, _lds_flatten, _lds_unflatten)
+
+
+def is_stacked(param):
+    """
+    Whether a parameter of an LDS is an array(timesteps, ...)
+    stacking a matrix per step
+    """
+    return not callable(param) and jnp.ndim(param) == 3
+
+
+def split_stacked(params: LDS):
+    """
+    Separate the stacked time-varying parameters of an LDS,
+    so that they can be scanned together with the observations
+    """
+    names = ("A", "C", "Q", "R")
+    return {name: getattr(params, name) for name in names if is_stacked(getattr(params, name))}
+
+
+def check_noise_shapes(params: LDS):
+    """
+    Check that the constant noise terms of an LDS are scalars, diagonals
+    or square matrices of the size of the state or of the observations.
+    A per-step diagonal noise given as an array(timesteps, size) would
+    otherwise be read as a constant matrix.
+    """
+    state_size, _ = params.get_trans_mat_of(0).shape
+    observation_size, _ = params.get_obs_mat_of(0).shape
+    for name, size in (("Q", state_size), ("R", observation_size)):
+        noise = getattr(params, name)
+        if callable(noise) or is_stacked(noise) or jnp.ndim(noise) == 0:
+            continue
+        if jnp.shape(noise) not in ((size,), (size, size)):
+            raise ValueError(f"{name} of shape {jnp.shape(noise)} is neither a diagonal of size {size} "
+                             f"nor a ({size}, {size}) covariance. Per-step diagonal noise has to be "
+                             f"stacked as matrices of shape (timesteps, {size}, {size}).")
+
+
+def as_covariance(noise: chex.Array, size: int):
+    """
+    Represent a noise term as a (size, size) covariance matrix.
+    A vector is taken as the diagonal of the covariance and
+    a scalar is broadcast to every entry.
+    Parameters
+    ----------
+    noise: float, array(size) or array(size, size)
+    size: int
+    Returns
+    -------
+    * array(size, size)
+    """
+    if jnp.ndim(noise) == 1:
+        return jnp.diag(noise)
+    return jnp.broadcast_to(noise, (size, size))
+
+
+@dataclass(frozen=True)
+class OutputSpec:
+    """
+    Selection of the history recorded by the filter and the smoother.
+    Quantities that are not requested are never stored, so that long
+    runs only allocate the history that is actually used.
+    Parameters
+    ----------
+    quantities: tuple of str
+        Names of the recorded quantities, among "mu", "Sigma", "mu_cond"
+        and "Sigma_cond" for the filter and "mu", "Sigma" for the smoother.
+        If None, every quantity is recorded.
+    covariance: str
+        Format of the recorded covariances: "full" (state_size, state_size)
+        matrices, "diag" (state_size) diagonals or "packed"
+        (state_size * (state_size + 1) / 2) lower triangles, row by row
+        (see unpack_covariance)
+    stride: int
+        Record every stride-th step, i.e, steps 0, stride, 2 * stride, ...
+    """
+    quantities: tuple = None
+    covariance: str = "full"
+    stride: int = 1
+
+
+def _project_history(output_spec: OutputSpec, values: dict):
+    """
+    Select and format the quantities of a single step requested by output_spec
+    """
+    if output_spec.covariance not in ("full", "diag", "packed"):
+        raise ValueError(f"Unknown covariance format {output_spec.covariance}.")
+    quantities = values.keys() if output_spec.quantities is None else output_spec.quantities
+    history = {}
+    for name in quantities:
+        if name not in values:
+            raise ValueError(f"Unknown quantity {name}, expected one of {tuple(values)}.")
+        value = values[name]
+        if name.startswith("Sigma") and output_spec.covariance == "diag":
+            value = jnp.diagonal(value)
+        elif name.startswith("Sigma") and output_spec.covariance == "packed":
+            value = value[jnp.tril_indices(value.shape[0])]
+        history[name] = value
+    return history
+
+
+def unpack_covariance(packed: chex.Array, size: int):
+    """
+    Rebuild covariance matrices from their packed lower triangles
+    (see OutputSpec)
+    Parameters
+    ----------
+    packed: array(..., size * (size + 1) / 2)
+    size: int
+    Returns
+    -------
+    * array(..., size, size)
+    """
+    rows, cols = jnp.tril_indices(size)
+    L = jnp.zeros((*packed.shape[:-1], size, size), dtype=packed.dtype)
+    L = L.at[..., rows, cols].set(packed)
+    return L + jnp.swapaxes(L, -1, -2) - L * jnp.eye(size, dtype=packed.dtype)
+
+
+def _strided_scan(step_fn: Callable, init, xs, stride: int, reverse: bool = False):
+    """
+    lax.scan that only keeps the output of the steps 0, stride, 2 * stride, ...
+    The steps in between are run without output, so that their history
+    is never allocated. The length of xs must be a multiple of stride.
+    """
+    if stride == 1:
+        return lax.scan(step_fn, init, xs, reverse=reverse)
+
+    no_output_fn = lambda carry, x: (step_fn(carry, x)[0], None)
+    blocks = tree_map(lambda x: x.reshape(-1, stride, *x.shape[1:]), xs)
+
+    def block_step(carry, block):
+        first = tree_map(lambda x: x[0], block)
+        rest = tree_map(lambda x: x[1:], block)
+        if reverse:
+            carry, _ = lax.scan(no_output_fn, carry, rest, reverse=True)
+            return step_fn(carry, first)
+        carry, output = step_fn(carry, first)
+        carry, _ = lax.scan(no_output_fn, carry, rest)
+        return carry, output
+
+    return lax.scan(block_step, init, blocks, reverse=reverse)
+
+
+def sequential_update(mu_cond: chex.Array,
+                      Sigma_cond: chex.Array,
+                      Ct: chex.Array,
+                      r: chex.Array,
+                      obs: chex.Array,
+                      obs_mask: chex.Array = None):
+    """
+    Kalman measurement update for a diagonal observation covariance,
+    done one observation component at a time. Every component is a
+    scalar update, so that no linear system has to be solved.
+    Parameters
+    ----------
+    mu_cond: array(state_size)
+        Conditional mean mut|t-1
+    Sigma_cond: array(state_size, state_size)
+        Conditional covariance Sigmat|t-1
+    Ct: array(observation_size, state_size)
+        Observation matrix
+    r: array(observation_size)
+        Diagonal of the observation covariance
+    obs: array(observation_size)
+        Observation
+    obs_mask: array(observation_size)
+        Indicator of the observed components (optional).
+        Missing components are skipped.
+    Returns
+    -------
+    * array(state_size)
+        Filtered mean mut
+    * array(state_size, state_size)
+        Filtered covariance Sigmat
+    * float
+        Log-likelihood of the observation given the past, log p(xt|x1:t-1)
+    """
+    if obs_mask is None:
+        obs_mask = jnp.ones_like(obs)
+
+    def scalar_update(carry, inps):
+        mu, Sigma, log_likelihood = carry
+        c, r_i, obs_i, mask_i = inps
+        Sigma_c = Sigma @ c
+        s = c @ Sigma_c + r_i
+        e = obs_i - c @ mu
+        k = mask_i * Sigma_c / s
+        mu = mu + k * e
+        Sigma = Sigma - s * jnp.outer(k, k)
+        log_likelihood = log_likelihood - mask_i * (e ** 2 / s + jnp.log(2 * jnp.pi * s)) / 2
+        return (mu, Sigma, log_likelihood), None
+
+    r = jnp.broadcast_to(r, obs.shape)
+    initial_state = (mu_cond, Sigma_cond, 0.)
+    (mu, Sigma, log_likelihood), _ = lax.scan(scalar_update, initial_state, (Ct, r, obs, obs_mask))
+    Sigma = (Sigma + Sigma.T) / 2
+    return mu, Sigma, log_likelihood
 
-        if n_samples == 1:
-            state_hist = state_hist[0, ...]
-            obs_hist = obs_hist[0, ...]
-        return state_hist, obs_hist
+
+def _observation_mask(x_hist: chex.Array, mask: chex.Array = None):
+    """
+    Build the (timesteps, observation_size) float indicator of the
+    observed values and zero-out the missing values of x_hist, so
+    that NaNs do not propagate through the filter (or its gradients)
+    """
+    if mask is None:
+        mask = ~jnp.isnan(x_hist)
+    elif mask.ndim < x_hist.ndim:
+        mask = jnp.broadcast_to(mask[:, None], x_hist.shape)
+    x_hist = jnp.where(mask, x_hist, 0)
+    return x_hist, mask.astype(x_hist.dtype)
 
 
 def kalman_smoother(params: LDS,
                     mu_hist: chex.Array,
                     Sigma_hist: chex.Array,
                     mu_cond_hist: chex.Array,
-                    Sigma_cond_hist: chex.Array):
+                    Sigma_cond_hist: chex.Array,
+                    length: int = None,
+                    output_spec: OutputSpec = None):
     """
     Compute the offline version of the Kalman-Filter, i.e,
     the kalman smoother for the hidden state.
@@ -164,58 +520,274 @@ def kalman_smoother(params: LDS,
         Filtered means mut
     Sigma_hist: array(timesteps, state_size, state_size)
         Filtered covariances Sigmat
-    mu_cond_hist: array(timesteps, state_size)
+    mu_cond_hist: array(timesteps, state_size) or None
         Filtered conditional means mut|t-1
-    Sigma_cond_hist: array(timesteps, state_size, state_size)
-        Filtered conditional covariances Sigmat|t-1
+    Sigma_cond_hist: array(timesteps, state_size, state_size) or None
+        Filtered conditional covariances Sigmat|t-1. If the conditional
+        terms are None, they are recomputed from the filtered terms.
+    length: int
+        Valid length of the sequence (optional). The smoothed
+        states past the end of the sequence are frozen at the
+        last filtered state.
+    output_spec: OutputSpec
+        Selection of the recorded history among "mu" and "Sigma" (optional)
     Returns
     -------
     * array(timesteps, state_size):
         Smoothed means mut
     * array(timesteps, state_size, state_size)
         Smoothed covariances Sigmat
+    If output_spec is given, a dict with the requested quantities
+    is returned instead
     """
 
-    mut_giv_T = mu_hist[-1, :]
-    Sigmat_giv_T = Sigma_hist[-1, :]
+    timesteps = len(mu_hist)
+    if length is None:
+        length = timesteps
+    stride = 1 if output_spec is None else output_spec.stride
+    n_steps = -(-timesteps // stride) * stride
 
     def smoother_step(state, elements):
-        mut_giv_T, Sigmat_giv_T, t= state
-        A = params.get_trans_mat_of(t)
-
-        mutt, Sigmatt, mut_cond_next, Sigmat_cond_next = elements
+        mut_giv_T, Sigmat_giv_T = state
+        mutt, Sigmatt, mut_cond_next, Sigmat_cond_next, t = elements
+        A = params.get_trans_mat_of(t + 1)
+        if mut_cond_next is None:
+            mut_cond_next = A @ mutt
+            Q = as_covariance(params.get_system_noise_of(t + 1), A.shape[0])
+            Sigmat_cond_next = A @ Sigmatt @ A.T + Q
 
         Jt = solve(Sigmat_cond_next, A @ Sigmatt, sym_pos=True).T
         mut_giv_T = mutt + Jt @ (mut_giv_T - mut_cond_next)
         Sigmat_giv_T = Sigmatt + Jt @ (Sigmat_giv_T - Sigmat_cond_next) @ Jt.T
-        return (mut_giv_T, Sigmat_giv_T,  t+1), (mut_giv_T, Sigmat_giv_T)
 
-    elements = (mu_hist[-2::-1],
-                Sigma_hist[-2::-1, ...],
-                mu_cond_hist[1:][::-1, ...],
-                Sigma_cond_hist[1:][::-1, ...])
-    initial_state = (mut_giv_T, Sigmat_giv_T, 0)
+        # The last step is already smoothed and, past the end
+        # of the sequence, the filtered state is already final
+        is_last = t >= length - 1
+        mut_giv_T = jnp.where(is_last, mutt, mut_giv_T)
+        Sigmat_giv_T = jnp.where(is_last, Sigmatt, Sigmat_giv_T)
+
+        outputs = (mut_giv_T, Sigmat_giv_T)
+        if output_spec is not None:
+            outputs = _project_history(output_spec, {"mu": mut_giv_T, "Sigma": Sigmat_giv_T})
+        return (mut_giv_T, Sigmat_giv_T), outputs
+
+    # The conditional terms of step t + 1 are paired with the filtered terms
+    # of step t. The last step (and the padding up to a multiple of the
+    # stride) is paired with a copy of the last conditional terms, unused.
+    def shift(hist):
+        if hist is None:
+            return None
+        padding = jnp.repeat(hist[-1:], n_steps - timesteps + 1, axis=0)
+        return jnp.concatenate([hist[1:], padding])
 
-    _, (mu_hist_smooth, Sigma_hist_smooth) = lax.scan(smoother_step, initial_state, elements)
+    def pad(hist):
+        return jnp.concatenate([hist, jnp.repeat(hist[-1:], n_steps - timesteps, axis=0)])
 
-    mu_hist_smooth = jnp.concatenate([mu_hist_smooth[::-1, ...], mut_giv_T[None, ...]], axis=0)
-    Sigma_hist_smooth = jnp.concatenate([Sigma_hist_smooth[::-1, ...], Sigmat_giv_T[None, ...]], axis=0)
+    elements = (pad(mu_hist), pad(Sigma_hist), shift(mu_cond_hist), shift(Sigma_cond_hist), jnp.arange(n_steps))
+    initial_state = (mu_hist[-1], Sigma_hist[-1])
 
-    return mu_hist_smooth, Sigma_hist_smooth
+    _, history = _strided_scan(smoother_step, initial_state, elements, stride, reverse=True)
+    return history
+
+
+def kalman_step(params: LDS,
+                mu: chex.Array,
+                Sigma: chex.Array,
+                t: int,
+                obs: chex.Array,
+                obs_mask: chex.Array = None):
+    """
+    Run a single step of the Kalman-Filter, i.e, the time update
+    (prediction) followed by the measurement update.
+    If the observation covariance R of the LDS is given as a vector
+    (its diagonal), the measurement update is done sequentially over
+    the components of the observation (see sequential_update).
+    Parameters
+    ----------
+    params: LDS
+         Linear Dynamical System object
+    mu: array(state_size)
+        Filtered mean mut-1
+    Sigma: array(state_size, state_size)
+        Filtered covariance Sigmat-1
+    t: int
+        Current timestep
+    obs: array(observation_size)
+        Observation xt
+    obs_mask: array(observation_size)
+        Indicator of the observed components (optional)
+    Returns
+    -------
+    * array(state_size):
+        Filtered mean mut
+    * array(state_size, state_size)
+        Filtered covariance Sigmat
+    * array(state_size)
+        Filtered conditional mean mut|t-1
+    * array(state_size, state_size)
+        Filtered conditional covariance Sigmat|t-1
+    * float
+        Log-likelihood of the observation given the past, log p(xt|x1:t-1)
+    """
+    if obs_mask is None:
+        obs_mask = jnp.ones_like(obs)
+
+    # \Sigma_{t|t-1}
+    A = params.get_trans_mat_of(t)
+    Q = as_covariance(params.get_system_noise_of(t), A.shape[0])
+    Sigma_cond = A @ Sigma @ A.T + Q
+
+    # \mu_{t |t-1} and xn|{n-1}
+    mu_cond = A @ mu
+
+    Ct = params.get_obs_mat_of(t)
+    R = params.get_observation_noise_of(t)
+
+    if jnp.ndim(R) == 1:
+        mu, Sigma, log_likelihood = sequential_update(mu_cond, Sigma_cond, Ct, R, obs, obs_mask)
+        return mu, Sigma, mu_cond, Sigma_cond, log_likelihood
+
+    state_size, _ = Sigma_cond.shape
+    observation_size, _ = Ct.shape
+    I = jnp.eye(state_size)
+    R = as_covariance(R, observation_size)
+    obs_mask = jnp.broadcast_to(obs_mask, (observation_size,))
+
+    # Missing components are decoupled from the state with unit noise,
+    # so that they do not contribute to the update
+    Ct = Ct * obs_mask[:, None]
+    R = R * jnp.outer(obs_mask, obs_mask) + jnp.diag(1 - obs_mask)
+
+    St = Ct @ Sigma_cond @ Ct.T + R
+    St_chol = jnp.linalg.cholesky(St)
+    Kt = cho_solve((St_chol, True), Ct @ Sigma_cond).T
+
+    et = obs_mask * (obs - Ct @ mu_cond)
+    mu = mu_cond + Kt @ et
+
+    #  More stable solution is (I − KtCt)Σt|t−1(I − KtCt)T + KtRtKTt
+    tmp = (I - Kt @ Ct)
+    Sigma = tmp @ Sigma_cond @ tmp.T + Kt @ R @ Kt.T
+
+    # log N(et | 0, St) over the observed components
+    zt = solve_triangular(St_chol, et, lower=True)
+    log_likelihood = -(jnp.sum(zt ** 2) + obs_mask.sum() * jnp.log(2 * jnp.pi)) / 2 \
+                     - jnp.log(jnp.diag(St_chol)).sum()
+
+    return mu, Sigma, mu_cond, Sigma_cond, log_likelihood
+
+
+def kalman_filter_scan(params: LDS,
+                       initial_state: tuple,
+                       x_hist: chex.Array,
+                       mask: chex.Array = None,
+                       length: int = None,
+                       output_spec: OutputSpec = None):
+    """
+    Run the Kalman-Filter over a sequence of observations starting
+    from an arbitrary filtering state. This is the building block of
+    kalman_filter and of the streaming filter.
+    Parameters
+    ----------
+    params: LDS
+         Linear Dynamical System object
+    initial_state: tuple
+        (mu, Sigma, t, log_likelihood) before the first observation of x_hist.
+        Stacked time-varying parameters of the LDS are aligned with x_hist,
+        i.e, their first entry is used for the first observation of x_hist,
+        whatever the value of t.
+    x_hist: array(timesteps, observation_size)
+    mask: array(timesteps) or array(timesteps, observation_size)
+        Boolean indicator of the observed steps or components (optional).
+        If not given, every non-NaN value of x_hist is observed.
+    length: int
+        Number of valid steps of x_hist (optional). The state is frozen
+        past the end of the sequence.
+    output_spec: OutputSpec
+        Selection of the recorded history (optional)
+    Returns
+    -------
+    * tuple
+        (mu, Sigma, t, log_likelihood) after the last valid observation
+    * tuple
+        History of the filtered means, filtered covariances,
+        conditional means and conditional covariances,
+        or a dict with the quantities requested by output_spec
+    """
+    timesteps = x_hist.shape[0]
+    if length is None:
+        length = timesteps
+    check_noise_shapes(params)
+    x_hist, mask = _observation_mask(x_hist, mask)
+    stacked = split_stacked(params)
+
+    def filter_step(state, inps):
+        mu_prev, Sigma_prev, t, log_likelihood = state
+        obs, obs_mask, step, params_t = inps
+        params_t = replace(params, **params_t)
+        mu, Sigma, mu_cond, Sigma_cond, log_likelihood_t = kalman_step(params_t, mu_prev, Sigma_prev,
+                                                                      t, obs, obs_mask)
+
+        # Freeze the state past the end of the sequence
+        is_valid = step < length
+        mu = jnp.where(is_valid, mu, mu_prev)
+        Sigma = jnp.where(is_valid, Sigma, Sigma_prev)
+        mu_cond = jnp.where(is_valid, mu_cond, mu_prev)
+        Sigma_cond = jnp.where(is_valid, Sigma_cond, Sigma_prev)
+        log_likelihood = log_likelihood + jnp.where(is_valid, log_likelihood_t, 0.)
+        t = t + is_valid
+
+        outputs = (mu, Sigma, mu_cond, Sigma_cond)
+        if output_spec is not None:
+            outputs = _project_history(output_spec, dict(zip(("mu", "Sigma", "mu_cond", "Sigma_cond"), outputs)))
+        return (mu, Sigma, t, log_likelihood), outputs
+
+    if output_spec is None or output_spec.stride == 1:
+        return lax.scan(filter_step, initial_state, (x_hist, mask, jnp.arange(timesteps), stacked))
+
+    # Pad the sequence to a multiple of the stride, the padding is frozen
+    stride = output_spec.stride
+    n_steps = -(-timesteps // stride) * stride
+    pad = lambda x: jnp.pad(x, [(0, n_steps - timesteps)] + [(0, 0)] * (x.ndim - 1), mode="edge")
+    x_hist, mask, stacked = pad(x_hist), pad(mask) * (jnp.arange(n_steps) < timesteps)[:, None], tree_map(pad, stacked)
+    length = jnp.minimum(length, timesteps)
+    return _strided_scan(filter_step, initial_state, (x_hist, mask, jnp.arange(n_steps), stacked), stride)
 
 
 def kalman_filter(params: LDS, x_hist: chex.Array,
-                  return_history: bool = True):
+                  return_history: bool = True,
+                  mask: chex.Array = None,
+                  length: int = None,
+                  return_log_likelihood: bool = False,
+                  output_spec: OutputSpec = None):
     """
     Compute the online version of the Kalman-Filter, i.e,
     the one-step-ahead prediction for the hidden state or the
-    time update step
+    time update step.
+    If the observation covariance R of the LDS is given as a vector
+    (its diagonal), the measurement update is done sequentially over
+    the components of the observation (see sequential_update).
+    Missing observations, either flagged by mask or given as NaNs
+    in x_hist, are left out of the measurement update.
     Parameters
     ----------
     params: LDS
          Linear Dynamical System object
     x_hist: array(timesteps, observation_size)
     return_history: bool
+    mask: array(timesteps) or array(timesteps, observation_size)
+        Boolean indicator of the observed steps or components (optional).
+        If not given, every non-NaN value of x_hist is observed.
+    length: int
+        Valid length of the sequence (optional). The state is frozen
+        past the end of the sequence, so that the padded steps of
+        the history and the final state all equal the last filtered state.
+    return_log_likelihood: bool
+        Whether to also return the log-marginal-likelihood of the observations
+    output_spec: OutputSpec
+        Selection of the recorded history (optional). If given and
+        return_history is True, the history is returned as a dict
+        with the requested quantities.
     Returns
     -------
     * array(timesteps, state_size):
@@ -226,55 +798,115 @@ def kalman_filter(params: LDS, x_hist: chex.Array,
         Filtered conditional means mut|t-1
     * array(timesteps, state_size, state_size)
         Filtered conditional covariances Sigmat|t-1
+    * float
+        Log-marginal-likelihood log p(x1:T) (only if return_log_likelihood)
     """
-    A = params.get_trans_mat_of(0) 
+    mu0, Sigma0 = params.mu, params.Sigma
+    initial_state = (mu0, Sigma0, 0, 0.)
+    if not return_history:
+        # Record nothing, only the final state is needed
+        output_spec = OutputSpec(quantities=())
+    (mun, Sigman, _, log_likelihood), history = kalman_filter_scan(params, initial_state, x_hist, mask,
+                                                                   length, output_spec)
+    if return_history and output_spec is not None:
+        return (history, log_likelihood) if return_log_likelihood else history
+    outputs = history if return_history else (mun, Sigman, None, None)
+    if return_log_likelihood:
+        return (*outputs, log_likelihood)
+    return outputs
+
+
+def kalman_covariance_recursion(params: LDS, timesteps: int):
+    """
+    Compute the data-independent part of the Kalman-Filter, i.e,
+    the Riccati recursion for the covariances and the Kalman gains.
+    For an LDS whose parameters do not depend on the observations,
+    these terms are shared by every sequence filtered with it.
+    Parameters
+    ----------
+    params: LDS
+         Linear Dynamical System object
+    timesteps: int
+        Number of steps to run the recursion
+    Returns
+    -------
+    * array(timesteps, state_size, state_size)
+        Filtered covariances Sigmat
+    * array(timesteps, state_size, state_size)
+        Filtered conditional covariances Sigmat|t-1
+    * array(timesteps, state_size, observation_size)
+        Kalman gains Kt
+    """
+    A = params.get_trans_mat_of(0)
 
     state_size, _ = A.shape
     I = jnp.eye(state_size)
 
-    def predict_step(mu, Sigma, t):
-        # \Sigma_{t|t-1}
+    def covariance_step(Sigma, t):
         A = params.get_trans_mat_of(t)
-        Q = params.get_system_noise_of(t)
-
-        Sigman_cond = A @ Sigma @ A.T + Q
+        Q = as_covariance(params.get_system_noise_of(t), state_size)
+        Ct = params.get_obs_mat_of(t)
+        observation_size, _ = Ct.shape
+        R = as_covariance(params.get_observation_noise_of(t), observation_size)
 
-        # \mu_{t |t-1} and xn|{n-1}
-        mu_cond = A @ mu
+        Sigma_cond = A @ Sigma @ A.T + Q
+        St = Ct @ Sigma_cond @ Ct.T + R
+        Kt = solve(St, Ct @ Sigma_cond, sym_pos=True).T
 
-        return mu_cond, Sigman_cond
+        tmp = (I - Kt @ Ct)
+        Sigma = tmp @ Sigma_cond @ tmp.T + Kt @ R @ Kt.T
 
-    def kalman_step(state, obs):
-        mu, Sigma, t = state
+        return Sigma, (Sigma, Sigma_cond, Kt)
 
-        mu_cond, Sigma_cond = predict_step(mu, Sigma, t)
-        Ct = params.get_obs_mat_of(t)
-        R = params.get_observation_noise_of(t)
-        
-        St = Ct @ Sigma_cond @ Ct.T + R
-        Kt = solve(St, Ct @ Sigma_cond, sym_pos=True).T
+    _, history = lax.scan(covariance_step, params.Sigma, jnp.arange(timesteps))
+    return history
 
-        et = obs - Ct @ mu_cond
-        mu = mu_cond + Kt @ et
 
-        #  More stable solution is (I − KtCt)Σt|t−1(I − KtCt)T + KtRtKTt
-        tmp = (I - Kt @ Ct)
-        Sigma = tmp @ Sigma_cond @ tmp.T + Kt @ (R * Kt.T)
+def kalman_mean_recursion(params: LDS, x_hist: chex.Array,
+                          K_hist: chex.Array, return_history: bool = True):
+    """
+    Compute the data-dependent part of the Kalman-Filter, i.e,
+    the recursion for the filtered means given precomputed
+    Kalman gains (see kalman_covariance_recursion)
+    Parameters
+    ----------
+    params: LDS
+         Linear Dynamical System object
+    x_hist: array(timesteps, observation_size)
+    K_hist: array(timesteps, state_size, observation_size)
+        Kalman gains Kt
+    return_history: bool
+    Returns
+    -------
+    * array(timesteps, state_size):
+        Filtered means mut
+    * array(timesteps, state_size)
+        Filtered conditional means mut|t-1
+    """
+    def mean_step(state, inps):
+        mu, t = state
+        obs, Kt = inps
+        A = params.get_trans_mat_of(t)
+        Ct = params.get_obs_mat_of(t)
 
-        t = t + 1
+        mu_cond = A @ mu
+        mu = mu_cond + Kt @ (obs - Ct @ mu_cond)
 
-        return (mu, Sigma, t), (mu, Sigma, mu_cond, Sigma_cond)
+        return (mu, t + 1), (mu, mu_cond)
 
-    mu0, Sigma0 = params.mu, params.Sigma
-    initial_state = (mu0, Sigma0, 0)
-    (mun, Sigman, _), history = lax.scan(kalman_step, initial_state, x_hist)
+    (mun, _), history = lax.scan(mean_step, (params.mu, 0), (x_hist, K_hist))
     if return_history:
         return history
-    return mun, Sigman, None, None
+    return mun, None
 
 
 def filter(params: LDS, x_hist: chex.Array,
-           return_history: bool = True):
+           return_history: bool = True,
+           shared_covariance: bool = False,
+           mask: chex.Array = None,
+           lengths: chex.Array = None,
+           return_log_likelihood: bool = False,
+           output_spec: OutputSpec = None):
     """
     Compute the online version of the Kalman-Filter, i.e,
     the one-step-ahead prediction for the hidden state or the
@@ -288,6 +920,29 @@ def filter(params: LDS, x_hist: chex.Array,
          Linear Dynamical System object
     x_hist: array(n_samples?, timesteps, observation_size)
     return_history: bool
+    shared_covariance: bool
+        Whether to run the (data-independent) covariance and gain
+        recursion once and share it across samples. Only the mean
+        recursion is then mapped over samples and the returned
+        covariances do not have the n_samples dimension.
+        Requires the parameters of the LDS not to depend on x_hist
+        and every observation to be available.
+    mask: array(n_samples?, timesteps) or array(n_samples?, timesteps, observation_size)
+        Boolean indicator of the observed steps or components (optional).
+        If not given, every non-NaN value of x_hist is observed.
+    lengths: array(n_samples?)
+        Valid length of each sequence (optional). The state of every
+        sequence is frozen past its end (see kalman_filter).
+        Use lds_utils.bucket_sequences to reduce the amount of padding.
+    return_log_likelihood: bool
+        Whether to also return the log-marginal-likelihood of each sequence.
+        Not available with shared_covariance.
+    output_spec: OutputSpec
+        Selection of the recorded history (optional), e.g, the filtered
+        means and the covariance diagonals every 100th step with
+        OutputSpec(("mu", "Sigma"), covariance="diag", stride=100).
+        If given, the history is returned as a dict with the requested
+        quantities. Not available with shared_covariance.
     Returns
     -------
     * array(n_samples?, timesteps, state_size):
@@ -298,14 +953,34 @@ def filter(params: LDS, x_hist: chex.Array,
         Filtered conditional means mut|t-1
     * array(n_samples?, timesteps, state_size, state_size)
         Filtered conditional covariances Sigmat|t-1
+    * array(n_samples?)
+        Log-marginal-likelihood log p(x1:T) (only if return_log_likelihood)
     """
     has_one_sim = False
     if x_hist.ndim == 2:
         x_hist = x_hist[None, ...]
+        mask = None if mask is None else mask[None, ...]
+        lengths = None if lengths is None else jnp.atleast_1d(lengths)
         has_one_sim = True
 
-    kalman_map = vmap(partial(kalman_filter, return_history=return_history), (None, 0))
-    outputs = kalman_map(params, x_hist)
+    if shared_covariance:
+        if mask is not None or lengths is not None:
+            raise ValueError("Shared covariances require every observation to be available.")
+        if return_log_likelihood or output_spec is not None:
+            raise ValueError("The log-likelihood and output_spec are not available with shared covariances.")
+        timesteps = x_hist.shape[1]
+        Sigma_hist, Sigma_cond_hist, K_hist = kalman_covariance_recursion(params, timesteps)
+        mean_map = vmap(partial(kalman_mean_recursion, return_history=return_history), (None, 0, None))
+        mu_hist, mu_cond_hist = mean_map(params, x_hist, K_hist)
+        if not return_history:
+            return mu_hist, Sigma_hist[-1], None, None
+        if has_one_sim:
+            mu_hist, mu_cond_hist = mu_hist[0, ...], mu_cond_hist[0, ...]
+        return mu_hist, Sigma_hist, mu_cond_hist, Sigma_cond_hist
+
+    kalman_map = vmap(lambda x, m, l: kalman_filter(params, x, return_history, m, l,
+                                                    return_log_likelihood, output_spec))
+    outputs = kalman_map(x_hist, mask, lengths)
 
     if has_one_sim and return_history:
         outputs = tree_map(lambda x: x[0, ...], outputs)
@@ -318,7 +993,9 @@ def smooth(params: LDS,
            mu_hist: chex.Array,
            Sigma_hist: chex.Array,
            mu_cond_hist: chex.Array,
-           Sigma_cond_hist: chex.Array):
+           Sigma_cond_hist: chex.Array,
+           lengths: chex.Array = None,
+           output_spec: OutputSpec = None):
     """
     Compute the offline version of the Kalman-Filter, i.e,
     the kalman smoother for the state space.
@@ -326,7 +1003,9 @@ def smooth(params: LDS,
     Note that the mean terms can optionally be of dimensionality two.
     Similarly, the covariance terms can optinally be of dimensionally three.
     This corresponds to different samples of the same underlying
-    Linear Dynamical System
+    Linear Dynamical System. If the covariance terms do not have the
+    n_samples dimension (see filter with shared_covariance=True), they
+    are shared across samples and so are the smoothed covariances.
     Parameters
     ----------
     params: LDS
@@ -339,6 +1018,12 @@ def smooth(params: LDS,
         Filtered conditional means mut|t-1
     Sigma_cond_hist: array(n_samples?, timesteps, state_size, state_size)
         Filtered conditional covariances Sigmat|t-1
+    lengths: array(n_samples?)
+        Valid length of each sequence (optional).
+        Not available with shared covariances.
+    output_spec: OutputSpec
+        Selection of the recorded history among "mu" and "Sigma" (optional).
+        If given, the history is returned as a dict with the requested quantities.
     Returns
     -------
     * array(n_samples?, timesteps, state_size):
@@ -346,13 +1031,352 @@ def smooth(params: LDS,
     * array(timesteps?, state_size, state_size)
         Smoothed covariances Sigmat
     """
+    if mu_hist.ndim == 3 and Sigma_hist.ndim == 3:
+        if lengths is not None:
+            raise ValueError("Shared covariances require every observation to be available.")
+        out_axes = (0, None)
+        if output_spec is not None:
+            quantities = ("mu", "Sigma") if output_spec.quantities is None else output_spec.quantities
+            out_axes = {name: 0 if name == "mu" else None for name in quantities}
+        smoother_map = vmap(partial(kalman_smoother, output_spec=output_spec), (None, 0, None, 0, None), out_axes)
+        return smoother_map(params, mu_hist, Sigma_hist, mu_cond_hist, Sigma_cond_hist)
+
     has_one_sim = False
     if mu_hist.ndim == 2:
         mu_hist, Sigma_hist, mu_cond_hist, Sigma_cond_hist = mu_hist[None, ...], Sigma_hist[None, ...], \
                                                              mu_cond_hist[None, ...], Sigma_cond_hist[None, ...]
+        lengths = None if lengths is None else jnp.atleast_1d(lengths)
         has_one_sim = True
-    smoother_map = vmap(kalman_smoother, (None, 0, 0, 0, 0))
-    mu_hist_smooth, Sigma_hist_smooth = smoother_map(params, mu_hist, Sigma_hist, mu_cond_hist, Sigma_cond_hist)
+    smoother_map = vmap(partial(kalman_smoother, output_spec=output_spec), (None, 0, 0, 0, 0, 0))
+    outputs = smoother_map(params, mu_hist, Sigma_hist, mu_cond_hist, Sigma_cond_hist, lengths)
     if has_one_sim:
-        mu_hist_smooth, Sigma_hist_smooth = mu_hist_smooth[0, ...], Sigma_hist_smooth[0, ...]
-    return mu_hist_smooth, Sigma_hist_smooth
\ No newline at end of file
+        outputs = tree_map(lambda x: x[0, ...], outputs)
+    return outputs
+
+def _chunked_vmap(fn: Callable, in_axes: tuple, chunk_size: int = None):
+    """
+    vmap of fn over the leading axis of the arguments whose axis is 0
+    (the others, with axis None, are shared). If chunk_size is given,
+    the batch is split into chunks of chunk_size elements that are
+    processed one after the other with lax.map, so that the peak memory
+    is that of a single chunk.
+    """
+    mapped_fn = vmap(fn, in_axes)
+    if chunk_size is None:
+        return mapped_fn
+
+    def chunked_fn(*args):
+        is_axis = lambda x: x is None
+        batched = tree_map(lambda axis, arg: arg if axis == 0 else None, in_axes, args, is_leaf=is_axis)
+        shared = tree_map(lambda axis, arg: None if axis == 0 else arg, in_axes, args, is_leaf=is_axis)
+
+        leaves, treedef = tree_flatten(batched)
+        batch_size = leaves[0].shape[0]
+        n_chunks = -(-batch_size // chunk_size)
+
+        def to_chunks(x):
+            # Pad with copies of the last element, the padded outputs are dropped
+            x = jnp.concatenate([x, jnp.repeat(x[-1:], n_chunks * chunk_size - batch_size, axis=0)])
+            return x.reshape(n_chunks, chunk_size, *x.shape[1:])
+
+        def chunk_fn(chunk):
+            chunk_args = tree_map(lambda axis, b, s: b if axis == 0 else s,
+                                  in_axes, chunk, shared, is_leaf=is_axis)
+            return mapped_fn(*chunk_args)
+
+        chunks = tree_unflatten(treedef, [to_chunks(leaf) for leaf in leaves])
+        outputs = lax.map(chunk_fn, chunks)
+        return tree_map(lambda x: x.reshape(-1, *x.shape[2:])[:batch_size], outputs)
+
+    return chunked_fn
+
+
+def batch_filter(params: LDS, x_hist: chex.Array,
+                 return_history: bool = True,
+                 mask: chex.Array = None,
+                 lengths: chex.Array = None,
+                 return_log_likelihood: bool = False,
+                 output_spec: OutputSpec = None,
+                 params_axes: LDS = None,
+                 chunk_size: int = None):
+    """
+    Run the Kalman-Filter over a bank of Linear Dynamical Systems,
+    each with its own parameters and its own observations, e.g,
+    one model per asset. The filter is mapped over both the parameters
+    and the observations.
+    Parameters
+    ----------
+    params: LDS
+        Bank of Linear Dynamical Systems, whose (non-callable) parameters
+        have a leading n_series axis, e.g, A of shape (n_series, state_size, state_size)
+    x_hist: array(n_series, timesteps, observation_size)
+    return_history: bool
+    mask: array(n_series, timesteps) or array(n_series, timesteps, observation_size)
+        Boolean indicator of the observed steps or components (optional)
+    lengths: array(n_series)
+        Valid length of each sequence (optional)
+    return_log_likelihood: bool
+        Whether to also return the log-marginal-likelihood of each sequence
+    output_spec: OutputSpec
+        Selection of the recorded history (optional)
+    params_axes: LDS
+        Mapped axis of each parameter, 0 or None (optional). Use None for
+        the parameters shared by every series, e.g,
+        LDS(A=0, C=None, Q=0, R=0, mu=None, Sigma=None).
+        By default every parameter has a leading n_series axis.
+    chunk_size: int
+        Number of series filtered at once (optional). Bounds the peak
+        memory, which otherwise grows with n_series.
+    Returns
+    -------
+    * array(n_series, timesteps, state_size):
+        Filtered means mut
+    * array(n_series, timesteps, state_size, state_size)
+        Filtered covariances Sigmat
+    * array(n_series, timesteps, state_size)
+        Filtered conditional means mut|t-1
+    * array(n_series, timesteps, state_size, state_size)
+        Filtered conditional covariances Sigmat|t-1
+    * array(n_series)
+        Log-marginal-likelihood log p(x1:T) (only if return_log_likelihood)
+    If output_spec is given, the history is a dict (see kalman_filter)
+    """
+    if params_axes is None:
+        params_axes = tree_map(lambda _: 0, params)
+
+    def filter_fn(params, x_hist, mask, length):
+        return kalman_filter(params, x_hist, return_history, mask, length, return_log_likelihood, output_spec)
+
+    filter_map = _chunked_vmap(filter_fn, (params_axes, 0, 0, 0), chunk_size)
+    return filter_map(params, x_hist, mask, lengths)
+
+
+def batch_smooth(params: LDS,
+                 mu_hist: chex.Array,
+                 Sigma_hist: chex.Array,
+                 mu_cond_hist: chex.Array,
+                 Sigma_cond_hist: chex.Array,
+                 lengths: chex.Array = None,
+                 output_spec: OutputSpec = None,
+                 params_axes: LDS = None,
+                 chunk_size: int = None):
+    """
+    Run the Kalman smoother over a bank of Linear Dynamical Systems
+    filtered with batch_filter
+    Parameters
+    ----------
+    params: LDS
+        Bank of Linear Dynamical Systems (see batch_filter)
+    mu_hist: array(n_series, timesteps, state_size):
+        Filtered means mut
+    Sigma_hist: array(n_series, timesteps, state_size, state_size)
+        Filtered covariances Sigmat
+    mu_cond_hist: array(n_series, timesteps, state_size)
+        Filtered conditional means mut|t-1
+    Sigma_cond_hist: array(n_series, timesteps, state_size, state_size)
+        Filtered conditional covariances Sigmat|t-1
+    lengths: array(n_series)
+        Valid length of each sequence (optional)
+    output_spec: OutputSpec
+        Selection of the recorded history (optional)
+    params_axes: LDS
+        Mapped axis of each parameter, 0 or None (see batch_filter)
+    chunk_size: int
+        Number of series smoothed at once (optional)
+    Returns
+    -------
+    * array(n_series, timesteps, state_size):
+        Smoothed means mut
+    * array(n_series, timesteps, state_size, state_size)
+        Smoothed covariances Sigmat
+    """
+    if params_axes is None:
+        params_axes = tree_map(lambda _: 0, params)
+
+    smoother_fn = partial(kalman_smoother, output_spec=output_spec)
+    smoother_map = _chunked_vmap(smoother_fn, (params_axes, 0, 0, 0, 0, 0), chunk_size)
+    return smoother_map(params, mu_hist, Sigma_hist, mu_cond_hist, Sigma_cond_hist, lengths)
+
+
+def kalman_filter_smoother(params: LDS, x_hist: chex.Array,
+                           mask: chex.Array = None,
+                           length: int = None,
+                           return_log_likelihood: bool = False,
+                           output_spec: OutputSpec = None):
+    """
+    Run the Kalman filter and the Kalman smoother in a single pass.
+    Only the filtered means and covariances are kept for the backward
+    pass, which recomputes the conditional terms mut+1|t and Sigmat+1|t
+    instead of storing them.
+    Parameters
+    ----------
+    params: LDS
+         Linear Dynamical System object
+    x_hist: array(timesteps, observation_size)
+    mask: array(timesteps) or array(timesteps, observation_size)
+        Boolean indicator of the observed steps or components (optional)
+    length: int
+        Valid length of the sequence (optional)
+    return_log_likelihood: bool
+        Whether to also return the log-marginal-likelihood of the observations
+    output_spec: OutputSpec
+        Selection of the recorded smoothed history among "mu" and "Sigma" (optional)
+    Returns
+    -------
+    * array(timesteps, state_size):
+        Smoothed means mut
+    * array(timesteps, state_size, state_size)
+        Smoothed covariances Sigmat
+    * float
+        Log-marginal-likelihood log p(x1:T) (only if return_log_likelihood)
+    If output_spec is given, the history is a dict (see kalman_smoother)
+    """
+    initial_state = (params.mu, params.Sigma, 0, 0.)
+    filter_spec = OutputSpec(quantities=("mu", "Sigma"))
+    (*_, log_likelihood), filtered = kalman_filter_scan(params, initial_state, x_hist, mask, length, filter_spec)
+    outputs = kalman_smoother(params, filtered["mu"], filtered["Sigma"], None, None, length, output_spec)
+    if return_log_likelihood:
+        return (*outputs, log_likelihood) if output_spec is None else (outputs, log_likelihood)
+    return outputs
+
+
+@partial(jit, static_argnames=("return_log_likelihood", "output_spec"))
+def filter_smooth(params: LDS, x_hist: chex.Array,
+                  mask: chex.Array = None,
+                  lengths: chex.Array = None,
+                  return_log_likelihood: bool = False,
+                  output_spec: OutputSpec = None):
+    """
+    Jitted Kalman smoother of one or several sequences, i.e, a fused
+    version of filter followed by smooth (see kalman_filter_smoother),
+    which never stores the conditional histories.
+    Parameters
+    ----------
+    params: LDS
+         Linear Dynamical System object
+    x_hist: array(n_samples?, timesteps, observation_size)
+    mask: array(n_samples?, timesteps) or array(n_samples?, timesteps, observation_size)
+        Boolean indicator of the observed steps or components (optional)
+    lengths: array(n_samples?)
+        Valid length of each sequence (optional)
+    return_log_likelihood: bool
+        Whether to also return the log-marginal-likelihood of each sequence
+    output_spec: OutputSpec
+        Selection of the recorded smoothed history (optional)
+    Returns
+    -------
+    * array(n_samples?, timesteps, state_size):
+        Smoothed means mut
+    * array(n_samples?, timesteps, state_size, state_size)
+        Smoothed covariances Sigmat
+    * array(n_samples?)
+        Log-marginal-likelihood log p(x1:T) (only if return_log_likelihood)
+    """
+    fused_fn = partial(kalman_filter_smoother, return_log_likelihood=return_log_likelihood,
+                       output_spec=output_spec)
+    if x_hist.ndim == 2:
+        return fused_fn(params, x_hist, mask, lengths)
+    return vmap(fused_fn, (None, 0, 0, 0))(params, x_hist, mask, lengths)
+
+
+def _compose_transitions(first: tuple, second: tuple):
+    """
+    Compose the k-step transitions (A^a, V_a) and (A^b, V_b), where
+    V_k = sum_{j<k} A^j Q A^j^T, into the (a + b)-step transition
+    """
+    A_first, V_first = first
+    A_second, V_second = second
+    return A_second @ A_first, A_second @ V_first @ A_second.T + V_second
+
+
+def transition_powers(params: LDS, horizons: chex.Array):
+    """
+    Compute the k-step transition matrices A^k and the accumulated
+    system noise V_k = sum_{j<k} A^j Q A^j^T of a time-invariant LDS
+    for several horizons, by repeated doubling. Every horizon costs
+    O(log k) matrix products.
+    Parameters
+    ----------
+    params: LDS
+         Linear Dynamical System object with constant A and Q
+    horizons: array(n_horizons)
+        Non-empty array of non-negative integer horizons, where the
+        horizon 0 gives (I, 0). The values must be concrete, since
+        they set the number of doubling steps.
+    Returns
+    -------
+    * array(n_horizons, state_size, state_size)
+        Transition matrices A^k
+    * array(n_horizons, state_size, state_size)
+        Accumulated system noise V_k
+    """
+    horizons = np.asarray(horizons)
+    if horizons.ndim != 1 or horizons.size == 0:
+        raise ValueError(f"The horizons must be a non-empty array(n_horizons), got shape {horizons.shape}.")
+    if np.any(horizons < 0):
+        raise ValueError("The horizons must be non-negative.")
+    A = params.A
+    state_size, _ = A.shape
+    Q = as_covariance(params.Q, state_size)
+    n_bits = max(int(horizons.max()).bit_length(), 1)
+
+    # (A^{2^i}, V_{2^i}) for every bit i
+    def doubling_step(transition, _):
+        return _compose_transitions(transition, transition), transition
+
+    _, (A_pows, V_pows) = lax.scan(doubling_step, (A, Q), None, length=n_bits)
+
+    def power_of(horizon):
+        def bit_step(transition, inps):
+            i, A_pow, V_pow = inps
+            composed = _compose_transitions(transition, (A_pow, V_pow))
+            is_set = (horizon >> i) & 1
+            return tree_map(lambda new, old: jnp.where(is_set, new, old), composed, transition), None
+
+        identity = (jnp.eye(state_size), jnp.zeros((state_size, state_size)))
+        transition, _ = lax.scan(bit_step, identity, (jnp.arange(n_bits), A_pows, V_pows))
+        return transition
+
+    return vmap(power_of)(jnp.asarray(horizons))
+
+
+def forecast(params: LDS, mu: chex.Array, Sigma: chex.Array, horizons: chex.Array):
+    """
+    Compute the k-step-ahead predictive distributions of the hidden state
+    and of the observations of a time-invariant LDS, for several horizons
+    and several series at once, from the last filtered state(s)
+        mut+k|t = A^k mut,  Sigmat+k|t = A^k Sigmat A^k^T + sum_{j<k} A^j Q A^j^T
+    Parameters
+    ----------
+    params: LDS
+         Linear Dynamical System object with constant parameters
+    mu: array(n_series?, state_size)
+        Last filtered mean(s) mut
+    Sigma: array(n_series?, state_size, state_size)
+        Last filtered covariance(s) Sigmat
+    horizons: array(n_horizons)
+        Concrete, non-empty array of non-negative integer horizons,
+        e.g, jnp.arange(1, 169). The horizon 0 gives the filtered state.
+    Returns
+    -------
+    * array(n_series?, n_horizons, state_size)
+        Predictive means of the hidden state mut+k|t
+    * array(n_series?, n_horizons, state_size, state_size)
+        Predictive covariances of the hidden state Sigmat+k|t
+    * array(n_series?, n_horizons, observation_size)
+        Predictive means of the observations
+    * array(n_series?, n_horizons, observation_size, observation_size)
+        Predictive covariances of the observations
+    """
+    if any(callable(param) or is_stacked(param) for param in (params.A, params.C, params.Q, params.R)):
+        raise ValueError("Forecasting requires constant A, C, Q and R.")
+    C = params.C
+    observation_size, _ = C.shape
+    R = as_covariance(params.R, observation_size)
+
+    A_pows, V_pows = transition_powers(params, horizons)
+    mu_pred = jnp.einsum("hij,...j->...hi", A_pows, mu)
+    Sigma_pred = jnp.einsum("hij,...jk,hlk->...hil", A_pows, Sigma, A_pows) + V_pows
+    x_mean = jnp.einsum("ij,...j->...i", C, mu_pred)
+    x_cov = jnp.einsum("ij,...jk,lk->...il", C, Sigma_pred, C) + R
+    return mu_pred, Sigma_pred, x_mean, x_cov
@@ -0,0 +1,396 @@
+"""Tests for jsl.lds.kalman_filter"""
+import numpy as np
+import jax.numpy as jnp
+from jax import random, lax, vmap, jit
+from jax.tree_util import tree_flatten, tree_unflatten
+
+import chex
+
+from absl.testing import absltest
+from absl.testing import parameterized
+
+from jsl.lds.kalman_filter import LDS, kalman_filter, kalman_smoother, filter, smooth
+from jsl.lds.kalman_filter import OutputSpec, unpack_covariance, batch_filter, batch_smooth, filter_smooth
+from jsl.lds.kalman_filter import forecast
+from jsl.lds.lds_utils import pad_sequences, bucket_sequences
+from jsl.lds.lds_test_utils import tracking_lds
+
+
+class KalmanFilterTest(parameterized.TestCase):
+
+    @parameterized.parameters((0, 3, 20), (1, 5, 50))
+    def test_shared_covariance(self, seed: int, n_samples: int, timesteps: int):
+        lds = tracking_lds()
+        _, x_hist = lds.sample(random.PRNGKey(seed), timesteps, n_samples)
+
+        mu_hist, Sigma_hist, mu_cond_hist, Sigma_cond_hist = filter(lds, x_hist)
+        outputs = filter(lds, x_hist, shared_covariance=True)
+        mu_hist_shared, Sigma_hist_shared, mu_cond_hist_shared, Sigma_cond_hist_shared = outputs
+
+        chex.assert_shape(Sigma_hist_shared, (timesteps, 4, 4))
+        chex.assert_trees_all_close(mu_hist_shared, mu_hist, atol=1e-4, rtol=1e-4)
+        chex.assert_trees_all_close(mu_cond_hist_shared, mu_cond_hist, atol=1e-4, rtol=1e-4)
+        chex.assert_trees_all_close(Sigma_hist_shared, Sigma_hist[0], atol=1e-4, rtol=1e-4)
+        chex.assert_trees_all_close(Sigma_cond_hist_shared, Sigma_cond_hist[0], atol=1e-4, rtol=1e-4)
+
+        mu_hist_smooth, Sigma_hist_smooth = smooth(lds, mu_hist, Sigma_hist, mu_cond_hist, Sigma_cond_hist)
+        mu_hist_smooth_shared, Sigma_hist_smooth_shared = smooth(lds, *outputs)
+
+        chex.assert_shape(Sigma_hist_smooth_shared, (timesteps, 4, 4))
+        chex.assert_trees_all_close(mu_hist_smooth_shared, mu_hist_smooth, atol=1e-4, rtol=1e-4)
+        chex.assert_trees_all_close(Sigma_hist_smooth_shared, Sigma_hist_smooth[0], atol=1e-4, rtol=1e-4)
+
+        with self.assertRaises(ValueError):
+            smooth(lds, *outputs, lengths=jnp.full(n_samples, timesteps))
+
+    def test_shared_covariance_single_sample(self):
+        lds = tracking_lds()
+        _, x_hist = lds.sample(random.PRNGKey(0), 20)
+
+        expected = kalman_filter(lds, x_hist)
+        outputs = filter(lds, x_hist, shared_covariance=True)
+
+        for expected_hist, hist in zip(expected, outputs):
+            chex.assert_trees_all_close(hist, expected_hist, atol=1e-4, rtol=1e-4)
+
+    @parameterized.parameters((0, 2), (1, 50))
+    def test_diagonal_observation_noise(self, seed: int, observation_size: int):
+        timesteps = 30
+        key_C, key_r, key_obs = random.split(random.PRNGKey(seed), 3)
+        lds = tracking_lds()
+        lds.C = random.normal(key_C, (observation_size, 4))
+        r = random.uniform(key_r, (observation_size,), minval=0.1, maxval=1.0)
+        lds.R = jnp.diag(r)
+        _, x_hist = lds.sample(key_obs, timesteps)
+
+        expected = kalman_filter(lds, x_hist)
+        lds.R = r
+        outputs = kalman_filter(lds, x_hist)
+
+        for expected_hist, hist in zip(expected, outputs):
+            chex.assert_trees_all_close(hist, expected_hist, atol=1e-3, rtol=1e-3)
+
+    def test_missing_observations(self):
+        timesteps = 40
+        lds = tracking_lds()
+        _, x_hist = lds.sample(random.PRNGKey(0), timesteps)
+        mask = random.bernoulli(random.PRNGKey(1), 0.7, x_hist.shape)
+        mask = mask.at[10:15].set(False)
+        x_hist_nan = jnp.where(mask, x_hist, jnp.nan)
+
+        mu_hist, Sigma_hist, mu_cond_hist, Sigma_cond_hist = kalman_filter(lds, x_hist, mask=mask)
+        outputs_nan = kalman_filter(lds, x_hist_nan)
+
+        for expected_hist, hist in zip((mu_hist, Sigma_hist, mu_cond_hist, Sigma_cond_hist), outputs_nan):
+            assert not jnp.any(jnp.isnan(hist))
+            chex.assert_trees_all_close(hist, expected_hist)
+
+        # Fully missing steps only propagate the state
+        chex.assert_trees_all_close(mu_hist[10:15], mu_cond_hist[10:15])
+        chex.assert_trees_all_close(Sigma_hist[10:15], Sigma_cond_hist[10:15])
+
+        # Missing components behave as components with infinite noise
+        lds.R = jnp.ones(2) * 0.5
+        outputs_sequential = kalman_filter(lds, x_hist_nan)
+        R_hist = jnp.where(mask, 0.5, 1e8)
+        lds.R = lambda t: jnp.diag(R_hist[t])
+        outputs_noisy = kalman_filter(lds, x_hist)
+        for expected_hist, hist, noisy_hist in zip(outputs_nan, outputs_sequential, outputs_noisy):
+            chex.assert_trees_all_close(hist, expected_hist, atol=1e-4, rtol=1e-4)
+            chex.assert_trees_all_close(noisy_hist, expected_hist, atol=1e-3, rtol=1e-3)
+
+    def test_filter_step_mask(self):
+        lds = tracking_lds()
+        _, x_hist = lds.sample(random.PRNGKey(0), 20, 3)
+        mask = jnp.ones((3, 20), dtype=bool).at[1, 5:].set(False)
+
+        mu_hist, Sigma_hist, mu_cond_hist, Sigma_cond_hist = filter(lds, x_hist, mask=mask)
+        chex.assert_trees_all_close(mu_hist[1, 5:], mu_cond_hist[1, 5:])
+        chex.assert_trees_all_close(mu_hist[0], kalman_filter(lds, x_hist[0])[0])
+
+    def test_ragged_sequences(self):
+        lds = tracking_lds()
+        lengths = [5, 12, 20, 9]
+        keys = random.split(random.PRNGKey(0), len(lengths))
+        sequences = [lds.sample(key, length)[1] for key, length in zip(keys, lengths)]
+        x_hist, lengths = pad_sequences(sequences, pad_val=100.)
+
+        mu_hist, Sigma_hist, mu_cond_hist, Sigma_cond_hist = filter(lds, x_hist, lengths=lengths)
+        mun, Sigman, _, _ = filter(lds, x_hist, return_history=False, lengths=lengths)
+        mu_hist_smooth, Sigma_hist_smooth = smooth(lds, mu_hist, Sigma_hist, mu_cond_hist, Sigma_cond_hist,
+                                                   lengths=lengths)
+
+        for n, (seq, length) in enumerate(zip(sequences, lengths)):
+            expected = kalman_filter(lds, seq)
+            expected_smooth = kalman_smoother(lds, *expected)
+            chex.assert_trees_all_close(mu_hist[n, :length], expected[0], atol=1e-5, rtol=1e-5)
+            chex.assert_trees_all_close(Sigma_hist[n, :length], expected[1], atol=1e-5, rtol=1e-5)
+            chex.assert_trees_all_close(mun[n], expected[0][-1], atol=1e-5, rtol=1e-5)
+            chex.assert_trees_all_close(Sigman[n], expected[1][-1], atol=1e-5, rtol=1e-5)
+            chex.assert_trees_all_close(mu_hist_smooth[n, :length], expected_smooth[0], atol=1e-4, rtol=1e-4)
+            chex.assert_trees_all_close(Sigma_hist_smooth[n, :length], expected_smooth[1], atol=1e-4, rtol=1e-4)
+
+    def test_bucket_sequences(self):
+        lengths = jnp.array([3, 40, 7, 38, 5, 21])
+        x_hist = jnp.arange(6 * 40 * 2.).reshape(6, 40, 2)
+        buckets = bucket_sequences(x_hist, lengths, n_buckets=3, multiple=4)
+
+        indices = jnp.concatenate([bucket[0] for bucket in buckets])
+        assert sorted(indices.tolist()) == list(range(6))
+        for indices, x_bucket, lengths_bucket in buckets:
+            assert x_bucket.shape[1] % 4 == 0 or x_bucket.shape[1] == 40
+            assert x_bucket.shape[1] >= lengths_bucket.max()
+            chex.assert_trees_all_close(x_bucket, x_hist[indices, :x_bucket.shape[1]])
+        assert buckets[0][1].shape[1] == 8
+
+    @parameterized.parameters((1, 20), (7, 20), (5, 20), (100, 20))
+    def test_output_spec(self, stride: int, timesteps: int):
+        lds = tracking_lds()
+        _, x_hist = lds.sample(random.PRNGKey(0), timesteps, 3)
+        lengths = jnp.array([20, 11, 16])
+        steps = jnp.arange(0, timesteps, stride)
+
+        filtered = filter(lds, x_hist, lengths=lengths)
+        smoothed = smooth(lds, *filtered, lengths=lengths)
+
+        spec = OutputSpec(("mu", "Sigma_cond"), covariance="diag", stride=stride)
+        outputs = filter(lds, x_hist, lengths=lengths, output_spec=spec)
+        assert sorted(outputs) == ["Sigma_cond", "mu"]
+        chex.assert_trees_all_close(outputs["mu"], filtered[0][:, steps], atol=1e-5, rtol=1e-5)
+        chex.assert_trees_all_close(outputs["Sigma_cond"],
+                                    jnp.diagonal(filtered[3][:, steps], axis1=2, axis2=3), atol=1e-5, rtol=1e-5)
+
+        spec = OutputSpec(covariance="packed", stride=stride)
+        outputs = smooth(lds, *filtered, lengths=lengths, output_spec=spec)
+        chex.assert_trees_all_close(outputs["mu"], smoothed[0][:, steps], atol=1e-5, rtol=1e-5)
+        chex.assert_shape(outputs["Sigma"], (3, len(steps), 10))
+        chex.assert_trees_all_close(unpack_covariance(outputs["Sigma"], 4), smoothed[1][:, steps],
+                                    atol=1e-5, rtol=1e-5)
+
+        # Shared covariances in the smoother
+        filtered = filter(lds, x_hist, shared_covariance=True)
+        smoothed = smooth(lds, *filtered)
+        outputs = smooth(lds, *filtered, output_spec=OutputSpec(("Sigma", "mu"), stride=stride))
+        chex.assert_trees_all_close(outputs["mu"], smoothed[0][:, steps], atol=1e-5, rtol=1e-5)
+        chex.assert_trees_all_close(outputs["Sigma"], smoothed[1][steps], atol=1e-5, rtol=1e-5)
+
+    def test_output_spec_errors(self):
+        lds = tracking_lds()
+        _, x_hist = lds.sample(random.PRNGKey(0), 10)
+        with self.assertRaises(ValueError):
+            kalman_filter(lds, x_hist, output_spec=OutputSpec(("mu_smooth",)))
+        with self.assertRaises(ValueError):
+            kalman_filter(lds, x_hist, output_spec=OutputSpec(covariance="sparse"))
+        with self.assertRaises(ValueError):
+            filter(lds, x_hist, shared_covariance=True, output_spec=OutputSpec())
+
+    def test_stacked_parameters(self):
+        timesteps = 25
+        lds = tracking_lds()
+        _, x_hist = lds.sample(random.PRNGKey(0), timesteps)
+        key_A, key_C, key_R = random.split(random.PRNGKey(1), 3)
+        A_hist = lds.A + 0.01 * random.normal(key_A, (timesteps, 4, 4))
+        C_hist = lds.C + 0.1 * random.normal(key_C, (timesteps, 2, 4))
+        Q_hist = lds.Q * jnp.linspace(0.5, 2., timesteps)[:, None, None]
+        R_hist = jnp.eye(2) * random.uniform(key_R, (timesteps, 1, 1), minval=0.1, maxval=1.)
+
+        lds_callable = LDS(lambda t: A_hist[t], lambda t: C_hist[t], lambda t: Q_hist[t], lambda t: R_hist[t],
+                           lds.mu, lds.Sigma)
+        lds_stacked = LDS(A_hist, C_hist, Q_hist, R_hist, lds.mu, lds.Sigma)
+
+        expected = kalman_filter(lds_callable, x_hist)
+        outputs = kalman_filter(lds_stacked, x_hist)
+        for expected_hist, hist in zip(expected, outputs):
+            chex.assert_trees_all_close(hist, expected_hist, atol=1e-5, rtol=1e-5)
+
+        expected_smooth = kalman_smoother(lds_callable, *expected)
+        chex.assert_trees_all_close(kalman_smoother(lds_stacked, *outputs), expected_smooth, atol=1e-5, rtol=1e-5)
+
+        outputs = kalman_filter(lds_stacked, x_hist, output_spec=OutputSpec(("mu",), stride=4))
+        chex.assert_trees_all_close(outputs["mu"], expected[0][::4], atol=1e-5, rtol=1e-5)
+
+    def test_stacked_diagonal_noise(self):
+        timesteps = 5
+        lds = tracking_lds()
+        _, x_hist = lds.sample(random.PRNGKey(0), timesteps)
+        r_hist = jnp.linspace(0.1, 1., timesteps * 2).reshape(timesteps, 2)
+
+        # Per-step diagonals are not mistaken for a constant matrix
+        lds.R = r_hist
+        with self.assertRaises(ValueError):
+            kalman_filter(lds, x_hist)
+
+        lds.R = vmap(jnp.diag)(r_hist)
+        lds_callable = LDS(lds.A, lds.C, lds.Q, lambda t: r_hist[t], lds.mu, lds.Sigma)
+        chex.assert_trees_all_close(kalman_filter(lds, x_hist), kalman_filter(lds_callable, x_hist),
+                                    atol=1e-5, rtol=1e-5)
+
+    def test_stacked_parameters_compile_once(self):
+        lds = tracking_lds()
+        n_traces = []
+
+        @jit
+        def filter_fn(C_hist, x_hist):
+            n_traces.append(1)
+            return kalman_filter(LDS(lds.A, C_hist, lds.Q, lds.R, lds.mu, lds.Sigma), x_hist)[0]
+
+        for seed in range(3):
+            key_C, key_obs = random.split(random.PRNGKey(seed))
+            C_hist = random.normal(key_C, (10, 2, 4))
+            x_hist = random.normal(key_obs, (10, 2))
+            filter_fn(C_hist, x_hist)
+        assert len(n_traces) == 1
+
+    @parameterized.parameters((None,), (2,), (3,))
+    def test_batch_filter(self, chunk_size):
+        n_series, timesteps = 5, 15
+        lds = tracking_lds()
+        key_q, key_r, key_obs = random.split(random.PRNGKey(0), 3)
+        Q_bank = lds.Q * random.uniform(key_q, (n_series, 1, 1), minval=0.5, maxval=2.)
+        R_bank = lds.R * random.uniform(key_r, (n_series, 1, 1), minval=0.5, maxval=2.)
+        bank = LDS(jnp.broadcast_to(lds.A, (n_series, 4, 4)), lds.C, Q_bank, R_bank, lds.mu, lds.Sigma)
+        params_axes = LDS(0, None, 0, 0, None, None)
+        x_hist = random.normal(key_obs, (n_series, timesteps, 2))
+        lengths = jnp.array([15, 10, 15, 3, 12])
+
+        *filtered, log_likelihood = batch_filter(bank, x_hist, lengths=lengths, return_log_likelihood=True,
+                                                 params_axes=params_axes, chunk_size=chunk_size)
+        smoothed = batch_smooth(bank, *filtered, lengths=lengths, params_axes=params_axes, chunk_size=chunk_size)
+
+        for n in range(n_series):
+            lds_n = LDS(lds.A, lds.C, Q_bank[n], R_bank[n], lds.mu, lds.Sigma)
+            *expected, expected_log_likelihood = kalman_filter(lds_n, x_hist[n], length=lengths[n],
+                                                               return_log_likelihood=True)
+            expected_smooth = kalman_smoother(lds_n, *expected, length=lengths[n])
+            for expected_hist, hist in zip(expected, filtered):
+                chex.assert_trees_all_close(hist[n], expected_hist, atol=1e-5, rtol=1e-5)
+            for expected_hist, hist in zip(expected_smooth, smoothed):
+                chex.assert_trees_all_close(hist[n], expected_hist, atol=1e-5, rtol=1e-5)
+            chex.assert_trees_all_close(log_likelihood[n], expected_log_likelihood, rtol=1e-5)
+
+    def test_lds_pytree(self):
+        lds = tracking_lds()
+        lds.C = lambda t: jnp.eye(2, 4)
+        leaves, treedef = tree_flatten(lds)
+        assert len(leaves) == 5
+        restored = tree_unflatten(treedef, leaves)
+        assert restored.C is lds.C
+
+        _, x_hist = tracking_lds().sample(random.PRNGKey(0), 10)
+        mu_hist = jit(lambda params: kalman_filter(params, x_hist)[0])(lds)
+        chex.assert_trees_all_close(mu_hist, kalman_filter(lds, x_hist)[0])
+
+    def test_filter_smooth(self):
+        lds = tracking_lds()
+        _, x_hist = lds.sample(random.PRNGKey(0), 20, 3)
+        x_hist = x_hist.at[0, 5:8].set(jnp.nan)
+        lengths = jnp.array([20, 9, 14])
+
+        *filtered, expected_log_likelihood = filter(lds, x_hist, lengths=lengths, return_log_likelihood=True)
+        expected = smooth(lds, *filtered, lengths=lengths)
+        *outputs, log_likelihood = filter_smooth(lds, x_hist, lengths=lengths, return_log_likelihood=True)
+        for expected_hist, hist in zip(expected, outputs):
+            chex.assert_trees_all_close(hist, expected_hist, atol=1e-5, rtol=1e-5)
+        chex.assert_trees_all_close(log_likelihood, expected_log_likelihood, rtol=1e-5)
+
+        outputs = filter_smooth(lds, x_hist[1])
+        chex.assert_trees_all_close(outputs[0], smooth(lds, *filter(lds, x_hist[1]))[0], atol=1e-5, rtol=1e-5)
+
+        outputs = filter_smooth(lds, x_hist, lengths=lengths, output_spec=OutputSpec(("mu",), stride=3))
+        chex.assert_trees_all_close(outputs["mu"], expected[0][:, ::3], atol=1e-5, rtol=1e-5)
+
+    def test_forecast(self):
+        lds = tracking_lds()
+        lds.A = lds.A * 0.98
+        _, x_hist = lds.sample(random.PRNGKey(0), 20, 3)
+        mun, Sigman, _, _ = filter(lds, x_hist, return_history=False)
+        horizons = jnp.array([1, 2, 5, 13, 40])
+
+        forecast_fn = jit(lambda mu, Sigma: forecast(lds, mu, Sigma, np.asarray(horizons)))
+        mu_pred, Sigma_pred, x_mean, x_cov = forecast_fn(mun, Sigman)
+        chex.assert_shape(Sigma_pred, (3, 5, 4, 4))
+        chex.assert_shape(x_cov, (3, 5, 2, 2))
+
+        def step(state, _):
+            mu, Sigma = state
+            mu, Sigma = mu @ lds.A.T, lds.A @ Sigma @ lds.A.T + lds.Q
+            return (mu, Sigma), (mu, Sigma)
+
+        _, (mu_hist, Sigma_hist) = lax.scan(step, (mun, Sigman), None, length=40)
+        mu_expected, Sigma_expected = mu_hist[horizons - 1].swapaxes(0, 1), Sigma_hist[horizons - 1].swapaxes(0, 1)
+        chex.assert_trees_all_close(mu_pred, mu_expected, atol=1e-4, rtol=1e-4)
+        chex.assert_trees_all_close(Sigma_pred, Sigma_expected, atol=1e-4, rtol=1e-4)
+        chex.assert_trees_all_close(x_cov, lds.C @ Sigma_expected @ lds.C.T + lds.R, atol=1e-4, rtol=1e-4)
+
+        # A single series
+        mu_pred_single, *_ = forecast(lds, mun[1], Sigman[1], horizons)
+        chex.assert_trees_all_close(mu_pred_single, mu_pred[1], atol=1e-5, rtol=1e-5)
+
+        # The horizon 0 gives the filtered state
+        mu_pred_zero, Sigma_pred_zero, *_ = forecast(lds, mun, Sigman, np.array([0]))
+        chex.assert_trees_all_close((mu_pred_zero[:, 0], Sigma_pred_zero[:, 0]), (mun, Sigman))
+
+        for horizons in (np.array([], dtype=int), np.array([-1, 2])):
+            with self.assertRaises(ValueError):
+                forecast(lds, mun, Sigman, horizons)
+
+    @parameterized.parameters((1, 3), (4, 7), (1, 50))
+    def test_sample_chunks(self, n_samples: int, chunk_size: int):
+        lds = tracking_lds()
+        key = random.PRNGKey(3)
+        state_hist, obs_hist = lds.sample(key, 30, n_samples)
+        chunks = list(lds.sample_chunks(key, 30, n_samples, chunk_size))
+        self.assertLen(chunks, -(-30 // chunk_size))
+
+        state_chunks, obs_chunks = zip(*chunks)
+        chex.assert_trees_all_close(jnp.concatenate(state_chunks, axis=-2), state_hist)
+        chex.assert_trees_all_close(jnp.concatenate(obs_chunks, axis=-2), obs_hist)
+
+        shape = (n_samples, 30) if n_samples > 1 else (30,)
+        state_out, obs_out = np.zeros((*shape, 4)), np.zeros((*shape, 2))
+        lds.sample_into(key, state_out, obs_out, chunk_size)
+        chex.assert_trees_all_close(state_out, state_hist, atol=1e-6)
+        chex.assert_trees_all_close(obs_out, obs_hist, atol=1e-6)
+
+    def test_sample_noise(self):
+        lds = tracking_lds()
+        state_hist, obs_hist = lds.sample(random.PRNGKey(0), 200, 100)
+        system_noise = state_hist[:, 1:] - state_hist[:, :-1] @ lds.A.T
+        obs_noise = obs_hist - state_hist @ lds.C.T
+        system_cov = jnp.einsum("sti,stj->ij", system_noise, system_noise) / system_noise[..., 0].size
+        obs_cov = jnp.einsum("sti,stj->ij", obs_noise, obs_noise) / obs_noise[..., 0].size
+        chex.assert_trees_all_close(system_cov, lds.Q, atol=0.005)
+        chex.assert_trees_all_close(obs_cov, lds.R, atol=0.05 * jnp.max(lds.R))
+
+    def test_sample_singular_noise(self):
+        # Deterministic dynamics and initial state, e.g, Q=0 in linreg_kf
+        lds = tracking_lds()
+        lds.Q, lds.Sigma = 0, 0
+        state_hist, obs_hist = lds.sample(random.PRNGKey(0), 50, 3, sample_initial_state=True)
+        self.assertFalse(jnp.any(jnp.isnan(obs_hist)))
+        _, state_expected = lax.scan(lambda z, _: (lds.A @ z, z), lds.mu, None, length=50)
+        chex.assert_trees_all_close(state_hist, jnp.broadcast_to(state_expected, (3, 50, 4)), atol=1e-5)
+
+        # A positive semi-definite covariance with a deterministic component
+        lds = tracking_lds()
+        lds.Q = jnp.diag(jnp.array([0., 0., 0.01, 0.01]))
+        state_hist, _ = lds.sample(random.PRNGKey(1), 50, 3)
+        self.assertFalse(jnp.any(jnp.isnan(state_hist)))
+
+    def test_diagonal_system_noise(self):
+        lds = tracking_lds()
+        _, x_hist = lds.sample(random.PRNGKey(0), 20, 3)
+        lds_diagonal = tracking_lds()
+        lds_diagonal.Q = jnp.diagonal(lds.Q)
+
+        expected = filter(lds, x_hist)
+        outputs = filter(lds_diagonal, x_hist)
+        chex.assert_trees_all_close(outputs, expected, atol=1e-5, rtol=1e-5)
+        chex.assert_trees_all_close(smooth(lds_diagonal, *outputs), smooth(lds, *expected), atol=1e-5, rtol=1e-5)
+
+        outputs = filter(lds_diagonal, x_hist, shared_covariance=True)
+        chex.assert_trees_all_close(outputs[1], expected[1][0], atol=1e-5, rtol=1e-5)
+
+
+if __name__ == '__main__':
+    absltest.main()
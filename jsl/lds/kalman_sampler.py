@@ -1,9 +1,11 @@
 import jax.numpy as jnp
-from jax.random import multivariate_normal, PRNGKey
+from jax.random import multivariate_normal, PRNGKey, split
 from jax.scipy.linalg import solve, cholesky
-from jax import lax
+from jax import lax, vmap, tree_map
 
-from .kalman_filter import LDS
+from dataclasses import replace
+
+from .kalman_filter import LDS, as_covariance, _chunked_vmap, _observation_mask
 
 
 
@@ -43,7 +45,7 @@ def smooth_sampler(params: LDS,
         system_noise_t, mutt, Sigmatt , t =  inps
         A = params.get_trans_mat_of(t)
         et = state - mutt @ A.T 
-        St = A @ Sigmatt @ A.T + params.get_system_noise_of(t)
+        St = A @ Sigmatt @ A.T + as_covariance(params.get_system_noise_of(t), state_size)
         Kt = solve(St, A @ Sigmatt, sym_pos=True).T
         mu_t = mutt + et @ Kt.T
         Sigma_t = (I - Kt @ A) @ Sigmatt  
@@ -59,4 +61,230 @@ def smooth_sampler(params: LDS,
 
     if n_samples == 1:
         state_sample_smooth = state_sample_smooth[:, 0, :]
-    return state_sample_smooth
\ No newline at end of file
+    return state_sample_smooth
+
+def smoother_gains(params: LDS, timesteps: int, mask: jnp.array = None):
+    """
+    Compute the Kalman gains and the smoother gains of a linear
+    dynamical system. They only depend on the parameters and on
+    which steps are observed, not on the values of the observations.
+    Parameters
+    ----------
+    params: LDS
+         Linear Dynamical System object
+    timesteps: int
+        Number of steps
+    mask: array(timesteps) or array(timesteps, observation_size)
+        Whether the observation of every step, or every component
+        of the observations, is available (optional)
+    Returns
+    -------
+    * array(timesteps, state_size, observation_size):
+        Kalman gains Kt
+    * array(timesteps, state_size, state_size):
+        Smoother gains Jt
+    """
+    state_size, _ = params.get_trans_mat_of(0).shape
+    if mask is None:
+        mask = jnp.ones(timesteps, dtype=bool)
+    Sigma0 = jnp.broadcast_to(params.Sigma, (state_size, state_size))
+
+    def filter_step(Sigma, inps):
+        observed, t = inps
+        A = params.get_trans_mat_of(t)
+        C = params.get_obs_mat_of(t)
+        observation_size, _ = C.shape
+        Q = as_covariance(params.get_system_noise_of(t), state_size)
+        R = as_covariance(params.get_observation_noise_of(t), observation_size)
+
+        # Missing components are decoupled from the state with unit noise,
+        # so that their columns of the gain are zero (see kalman_step)
+        observed = jnp.broadcast_to(observed, (observation_size,)).astype(Sigma.dtype)
+        C = C * observed[:, None]
+        R = R * jnp.outer(observed, observed) + jnp.diag(1 - observed)
+
+        Sigma_cond = A @ Sigma @ A.T + Q
+        S = C @ Sigma_cond @ C.T + R
+        K = solve(S, C @ Sigma_cond, sym_pos=True).T
+        Sigma = Sigma_cond - K @ S @ K.T
+        return Sigma, (Sigma, Sigma_cond, K)
+
+    inps = (mask, jnp.arange(timesteps))
+    _, (Sigma_hist, Sigma_cond_hist, K_hist) = lax.scan(filter_step, Sigma0, inps)
+
+    def smoother_gain(Sigma, Sigma_cond_next, t):
+        A = params.get_trans_mat_of(t + 1)
+        return solve(Sigma_cond_next, A @ Sigma, sym_pos=True).T
+
+    # The smoother gain of the last step is never used
+    J_hist = vmap(smoother_gain)(Sigma_hist[:-1], Sigma_cond_hist[1:], jnp.arange(timesteps - 1))
+    J_hist = jnp.concatenate([J_hist, jnp.zeros((1, state_size, state_size))])
+    return K_hist, J_hist
+
+
+def smoothed_mean(params: LDS,
+                  K_hist: jnp.array,
+                  J_hist: jnp.array,
+                  x_hist: jnp.array,
+                  mask: jnp.array,
+                  mu0: jnp.array):
+    """
+    Compute the smoothed means of a linear dynamical system with
+    precomputed gains. Every step only takes matrix-vector products.
+    Parameters
+    ----------
+    params: LDS
+         Linear Dynamical System object
+    K_hist: array(timesteps, state_size, observation_size)
+        Kalman gains Kt
+    J_hist: array(timesteps, state_size, state_size)
+        Smoother gains Jt
+    x_hist: array(timesteps, observation_size)
+        Observations, the unobserved values are ignored
+    mask: array(timesteps) or array(timesteps, observation_size)
+        Whether the observation of every step, or every component
+        of the observations, is available
+    mu0: array(state_size)
+        Mean of the state before the first step
+    Returns
+    -------
+    * array(timesteps, state_size):
+        Smoothed means
+    """
+    timesteps = len(x_hist)
+    x_hist, mask = _observation_mask(x_hist, mask)
+
+    def filter_step(mu, inps):
+        K, x, observed, t = inps
+        mu_cond = params.get_trans_mat_of(t) @ mu
+        mu = mu_cond + K @ (observed * (x - params.get_obs_mat_of(t) @ mu_cond))
+        return mu, mu
+
+    mun, mu_hist = lax.scan(filter_step, mu0, (K_hist, x_hist, mask, jnp.arange(timesteps)))
+
+    def smoother_step(mu_next, inps):
+        mu, J, t = inps
+        mu_smooth = mu + J @ (mu_next - params.get_trans_mat_of(t + 1) @ mu)
+        return mu_smooth, mu_smooth
+
+    inps = (mu_hist[:-1], J_hist[:-1], jnp.arange(timesteps - 1))
+    _, mu_hist_smooth = lax.scan(smoother_step, mun, inps, reverse=True)
+    return jnp.concatenate([mu_hist_smooth, mun[None]])
+
+
+def simulation_smoother(params: LDS,
+                        key: PRNGKey,
+                        x_hist: jnp.array,
+                        n_samples: int = 1):
+    """
+    Sample from the smoothing distribution with the mean-correction
+    simulation smoother of Durbin and Koopman (2002). Every sample
+    z+ - E[z+|x+] + E[z|x] is built from an unconditional simulation
+    (z+, x+) of the system. By linearity, it equals z+ + E[z|x - x+]
+    with a zero prior mean, so that each sample costs a single pass of
+    smoothed_mean, while the gains are computed once for all the samples.
+    Missing observations, of whole steps or of single components,
+    are given as NaNs in x_hist.
+    Parameters
+    ----------
+    params: LDS
+         Linear Dynamical System object
+    key: jax.random.PRNGKey
+        Seed of the unconditional simulations
+    x_hist: array(timesteps, observation_size)
+        Observations
+    n_samples: int
+        Number of posterior samples (optional)
+    Returns
+    -------
+    * array(n_samples, timesteps, state_size):
+        Posterior samples
+    """
+    timesteps = len(x_hist)
+    x_hist, mask = _observation_mask(x_hist)
+    K_hist, J_hist = smoother_gains(params, timesteps, mask)
+    samples = _simulation_smoother_draws(params, key, x_hist, mask, K_hist, J_hist, n_samples)
+
+    if n_samples == 1:
+        samples = samples[0]
+    return samples
+
+
+def _simulation_smoother_draws(params: LDS, key: PRNGKey, x_hist: jnp.array, mask: jnp.array,
+                               K_hist: jnp.array, J_hist: jnp.array, n_samples: int):
+    """
+    Draw n_samples posterior samples of shape (n_samples, timesteps, state_size)
+    with the mean-correction simulation smoother and precomputed gains
+    """
+    timesteps = len(x_hist)
+    state_size, _ = params.get_trans_mat_of(0).shape
+
+    # LDS.sample starts at the initial state, while the filter starts
+    # one transition before the first step
+    A = params.get_trans_mat_of(0)
+    Sigma0 = jnp.broadcast_to(params.Sigma, (state_size, state_size))
+    Q = as_covariance(params.get_system_noise_of(0), state_size)
+    prior = replace(params, mu=A @ params.mu, Sigma=A @ Sigma0 @ A.T + Q)
+    z_sim, x_sim = prior.sample(key, timesteps, n_samples, sample_initial_state=True)
+    z_sim, x_sim = z_sim.reshape(n_samples, timesteps, -1), x_sim.reshape(n_samples, timesteps, -1)
+
+    correction = vmap(smoothed_mean, (None, None, None, 0, None, None))
+    mu0 = jnp.zeros(state_size)
+    return z_sim + correction(params, K_hist, J_hist, x_hist - x_sim, mask, mu0)
+
+
+def batch_smooth_sampler(params: LDS,
+                         key: PRNGKey,
+                         x_hist: jnp.array,
+                         n_samples: int = 1,
+                         params_axes: LDS = None,
+                         chunk_size: int = None,
+                         draw_chunk_size: int = None):
+    """
+    Sample from the smoothing distributions of many series at once with
+    the simulation smoother. The gains of every series are computed once
+    and shared by all its draws.
+    Missing observations, of whole steps or of single components,
+    are given as NaNs in x_hist.
+    Parameters
+    ----------
+    params: LDS
+        Bank of Linear Dynamical Systems (see batch_filter)
+    key: jax.random.PRNGKey
+        Seed of the unconditional simulations
+    x_hist: array(n_series, timesteps, observation_size)
+        Observations
+    n_samples: int
+        Number of posterior samples per series
+    params_axes: LDS
+        Mapped axis of each parameter, 0 or None (see batch_filter)
+    chunk_size: int
+        Number of series sampled at once (optional)
+    draw_chunk_size: int
+        Number of samples of a series drawn at once (optional). Together
+        with chunk_size, bounds the peak memory of the unconditional
+        simulations to chunk_size * draw_chunk_size runs.
+    Returns
+    -------
+    * array(n_series, n_samples, timesteps, state_size):
+        Posterior samples
+    """
+    if params_axes is None:
+        params_axes = tree_map(lambda _: 0, params)
+    n_series = len(x_hist)
+    draw_chunk_size = n_samples if draw_chunk_size is None else min(draw_chunk_size, n_samples)
+    n_chunks = -(-n_samples // draw_chunk_size)
+
+    def sample_series(params, key, x_hist):
+        timesteps = len(x_hist)
+        x_hist, mask = _observation_mask(x_hist)
+        K_hist, J_hist = smoother_gains(params, timesteps, mask)
+
+        def draw_chunk(key):
+            return _simulation_smoother_draws(params, key, x_hist, mask, K_hist, J_hist, draw_chunk_size)
+
+        samples = lax.map(draw_chunk, split(key, n_chunks))
+        return samples.reshape(-1, *samples.shape[2:])[:n_samples]
+
+    sampler_map = _chunked_vmap(sample_series, (params_axes, 0, 0), chunk_size)
+    return sampler_map(params, split(key, n_series), x_hist)
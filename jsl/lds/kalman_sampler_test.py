@@ -0,0 +1,96 @@
+"""Tests for jsl.lds.kalman_sampler"""
+import jax.numpy as jnp
+from jax import random, vmap, tree_map
+
+import chex
+
+from absl.testing import absltest
+from absl.testing import parameterized
+
+from jsl.lds.kalman_filter import LDS, kalman_filter, kalman_smoother
+from jsl.lds.kalman_sampler import smoother_gains, smoothed_mean, simulation_smoother
+from jsl.lds.kalman_sampler import batch_smooth_sampler
+from jsl.lds.lds_test_utils import tracking_lds
+
+
+def smoothed_moments(lds: LDS, x_hist: chex.Array):
+    mu_hist, Sigma_hist, mu_cond_hist, Sigma_cond_hist = kalman_filter(lds, x_hist)
+    return kalman_smoother(lds, mu_hist, Sigma_hist, mu_cond_hist, Sigma_cond_hist)
+
+
+class KalmanSamplerTest(parameterized.TestCase):
+
+    @parameterized.named_parameters(
+        ("full", "full"),
+        ("missing", "missing"),
+        ("partially_missing", "partially_missing"),
+    )
+    def test_smoothed_mean(self, case: str):
+        lds = tracking_lds()
+        _, x_hist = lds.sample(random.PRNGKey(0), 30)
+        mask = None
+        if case == "missing":
+            x_hist = x_hist.at[10:15].set(jnp.nan)
+            mask = ~jnp.isnan(x_hist).all(axis=-1)
+        elif case == "partially_missing":
+            x_hist = x_hist.at[5, 0].set(jnp.nan).at[10:15, 1].set(jnp.nan)
+            mask = ~jnp.isnan(x_hist)
+
+        K_hist, J_hist = smoother_gains(lds, 30, mask)
+        mu_hist_smooth = smoothed_mean(lds, K_hist, J_hist, x_hist, mask, lds.mu)
+        mu_hist_expected, _ = smoothed_moments(lds, x_hist)
+        chex.assert_trees_all_close(mu_hist_smooth, mu_hist_expected, atol=1e-4, rtol=1e-4)
+
+    @parameterized.named_parameters(
+        ("full", "full"),
+        ("missing", "missing"),
+        ("partially_missing", "partially_missing"),
+    )
+    def test_simulation_smoother(self, case: str):
+        lds = tracking_lds()
+        key_data, key_samples = random.split(random.PRNGKey(1))
+        _, x_hist = lds.sample(key_data, 15)
+        if case == "missing":
+            x_hist = x_hist.at[5:8].set(jnp.nan)
+        elif case == "partially_missing":
+            x_hist = x_hist.at[5, 0].set(jnp.nan).at[9:11, 1].set(jnp.nan)
+
+        samples = simulation_smoother(lds, key_samples, x_hist, n_samples=4000)
+        chex.assert_shape(samples, (4000, 15, 4))
+        self.assertFalse(jnp.isnan(samples).any())
+        mu_hist_smooth, Sigma_hist_smooth = smoothed_moments(lds, x_hist)
+
+        residuals = samples - samples.mean(axis=0)
+        Sigma_hist_samples = jnp.einsum("sti,stj->tij", residuals, residuals) / 4000
+        std = jnp.sqrt(jnp.diagonal(Sigma_hist_smooth, axis1=1, axis2=2))
+        self.assertLess(jnp.max(jnp.abs(samples.mean(axis=0) - mu_hist_smooth) / std), 0.1)
+        chex.assert_trees_all_close(Sigma_hist_samples, Sigma_hist_smooth, atol=0.1 * jnp.max(std ** 2))
+
+        single_sample = simulation_smoother(lds, key_samples, x_hist)
+        chex.assert_shape(single_sample, (15, 4))
+
+    @parameterized.parameters((None, None), (2, 3), (3, 7))
+    def test_batch_smooth_sampler(self, chunk_size: int, draw_chunk_size: int):
+        lds = tracking_lds()
+        keys = random.split(random.PRNGKey(2), 5)
+        x_hist = vmap(lambda key: lds.sample(key, 12)[1])(keys)
+        x_hist = x_hist.at[1, 3:6].set(jnp.nan).at[2, 4, 0].set(jnp.nan)
+
+        params_axes = tree_map(lambda _: None, lds)
+        samples = batch_smooth_sampler(lds, random.PRNGKey(3), x_hist, 7, params_axes,
+                                       chunk_size, draw_chunk_size)
+        chex.assert_shape(samples, (5, 7, 12, 4))
+        self.assertFalse(jnp.isnan(samples).any())
+
+        # The draws of every series are centred on its smoothed means
+        samples = batch_smooth_sampler(lds, random.PRNGKey(3), x_hist, 2000, params_axes,
+                                       chunk_size, draw_chunk_size)
+        for series in range(5):
+            mu_hist_smooth, Sigma_hist_smooth = smoothed_moments(lds, x_hist[series])
+            std = jnp.sqrt(jnp.diagonal(Sigma_hist_smooth, axis1=1, axis2=2))
+            error = jnp.abs(samples[series].mean(axis=0) - mu_hist_smooth) / std
+            self.assertLess(jnp.max(error), 0.15)
+
+
+if __name__ == '__main__':
+    absltest.main()
@@ -0,0 +1,366 @@
+# Maximum likelihood estimation of the parameters of a Linear Dynamical System.
+# The log-marginal-likelihood computed by the Kalman filter is differentiable,
+# so the parameters are fitted by gradient ascent (with the memory-efficient
+# gradient of jsl.lds.kalman_adjoint). The covariances are
+# parametrised by their Cholesky factors (with a log-diagonal) so that the
+# optimisation is unconstrained. Several series and several random restarts
+# are fitted in parallel with a single jitted, vmapped training loop.
+# Alternatively, lds_em fits the parameters with the EM algorithm, using
+# the expected sufficient statistics of the Kalman smoother and closed-form
+# M-steps.
+
+import chex
+
+import jax
+import jax.numpy as jnp
+from jax import lax, vmap, jit
+from jax.random import split, normal
+from jax.example_libraries import optimizers
+
+from functools import partial
+
+from jsl.lds.kalman_filter import LDS, filter, smooth, is_stacked, as_covariance
+from jsl.lds.kalman_adjoint import kalman_log_likelihood
+
+
+def _chol_to_unconstrained(L: chex.Array):
+    I = jnp.eye(L.shape[-1])
+    return jnp.tril(L, -1) + I * jnp.log(jnp.diagonal(L, axis1=-2, axis2=-1))[..., None, :]
+
+
+def _unconstrained_to_cov(raw: chex.Array):
+    I = jnp.eye(raw.shape[-1])
+    L = jnp.tril(raw, -1) + I * jnp.exp(jnp.diagonal(raw, axis1=-2, axis2=-1))[..., None, :]
+    return L @ jnp.swapaxes(L, -1, -2)
+
+
+def to_unconstrained(params: LDS):
+    """
+    Map the parameters of an LDS with constant matrices to
+    an unconstrained pytree, in which the covariances are
+    replaced by their Cholesky factors with a log-diagonal
+    Parameters
+    ----------
+    params: LDS
+         Linear Dynamical System object with constant parameters
+    Returns
+    -------
+    * dict
+        Unconstrained parameters (see from_unconstrained)
+    """
+    if any(callable(param) or is_stacked(param) for param in (params.A, params.C, params.Q, params.R)):
+        raise ValueError("Fitting requires constant A, C, Q and R.")
+    state_size, _ = params.A.shape
+    observation_size, _ = params.C.shape
+    Q = as_covariance(params.Q, state_size)
+    R = as_covariance(params.R, observation_size)
+    Sigma = as_covariance(params.Sigma, state_size)
+    return {
+        "A": params.A,
+        "C": params.C,
+        "Q": _chol_to_unconstrained(jnp.linalg.cholesky(Q)),
+        "R": _chol_to_unconstrained(jnp.linalg.cholesky(R)),
+        "mu": params.mu,
+        "Sigma": _chol_to_unconstrained(jnp.linalg.cholesky(Sigma)),
+    }
+
+
+def from_unconstrained(raw_params: dict):
+    """
+    Map unconstrained parameters back to an LDS
+    Parameters
+    ----------
+    raw_params: dict
+        Unconstrained parameters (see to_unconstrained)
+    Returns
+    -------
+    * LDS
+    """
+    return LDS(raw_params["A"], raw_params["C"],
+               _unconstrained_to_cov(raw_params["Q"]),
+               _unconstrained_to_cov(raw_params["R"]),
+               raw_params["mu"],
+               _unconstrained_to_cov(raw_params["Sigma"]))
+
+
+def init_random_params(key: chex.PRNGKey, state_size: int, observation_size: int):
+    """
+    Sample the unconstrained parameters of a stable LDS, with the transition
+    matrix around the identity and unit noise covariances
+    Parameters
+    ----------
+    key: jax.random.PRNGKey
+    state_size: int
+    observation_size: int
+    Returns
+    -------
+    * dict
+        Unconstrained parameters (see from_unconstrained)
+    """
+    key_A, key_C, key_mu = split(key, 3)
+    A = 0.9 * jnp.eye(state_size) + 0.1 * normal(key_A, (state_size, state_size)) / jnp.sqrt(state_size)
+    C = normal(key_C, (observation_size, state_size)) / jnp.sqrt(state_size)
+    return {
+        "A": A,
+        "C": C,
+        "Q": jnp.zeros((state_size, state_size)),
+        "R": jnp.zeros((observation_size, observation_size)),
+        "mu": normal(key_mu, (state_size,)),
+        "Sigma": jnp.zeros((state_size, state_size)),
+    }
+
+
+def loss_fn(raw_params: dict, x_hist: chex.Array, mask: chex.Array = None, length: int = None):
+    """
+    Negative log-marginal-likelihood of a sequence of observations,
+    divided by the number of steps
+    Parameters
+    ----------
+    raw_params: dict
+        Unconstrained parameters (see to_unconstrained)
+    x_hist: array(timesteps, observation_size)
+        Observations. Missing values are given as NaNs.
+    mask: array(timesteps) or array(timesteps, observation_size)
+        Boolean indicator of the observed steps or components (optional)
+    length: int
+        Valid length of the sequence (optional)
+    Returns
+    -------
+    * float
+    """
+    timesteps = x_hist.shape[0] if length is None else length
+    params = from_unconstrained(raw_params)
+    log_likelihood = kalman_log_likelihood(params, x_hist, mask, length)
+    return -log_likelihood / timesteps
+
+
+def fit(key: chex.PRNGKey,
+        observations: chex.Array,
+        state_size: int,
+        n_restarts: int = 1,
+        num_epochs: int = 500,
+        optimizer: optimizers.Optimizer = None,
+        lengths: chex.Array = None,
+        initial_params: LDS = None):
+    """
+    Fit an LDS to each of a batch of series by gradient ascent on the
+    log-marginal-likelihood. Every (series, restart) pair is optimised
+    independently, but all of them run in parallel in a single jitted
+    training loop. The restart with the highest final log-likelihood
+    is returned for each series.
+    Parameters
+    ----------
+    key: jax.random.PRNGKey
+        Seed of the random restarts
+    observations: array(n_series, timesteps, observation_size)
+        Observation sequences. Missing values are given as NaNs.
+    state_size: int
+        Dimension of the hidden state
+    n_restarts: int
+        Number of random initialisations per series
+    num_epochs: int
+        Number of full-batch gradient steps
+    optimizer: jax.example_libraries.optimizers.Optimizer
+        Optimizer triple (default: Adam with step size 1e-2)
+    lengths: array(n_series)
+        Valid length of each series (optional)
+    initial_params: LDS
+        Initial parameters used for the first restart of every series (optional).
+        The remaining restarts are sampled with init_random_params.
+    Returns
+    -------
+    * LDS
+        Fitted parameters, stacked along a leading (n_series,) axis
+    * array(n_series, n_restarts, num_epochs)
+        Training losses, i.e, the negative log-likelihood per step
+    """
+    if optimizer is None:
+        optimizer = optimizers.adam(1e-2)
+    opt_init, opt_update, get_params = optimizer
+
+    n_series, timesteps, observation_size = observations.shape
+    if lengths is None:
+        lengths = jnp.full(n_series, timesteps)
+
+    keys = split(key, n_series * n_restarts).reshape(n_series, n_restarts, -1)
+    init_fn = partial(init_random_params, state_size=state_size, observation_size=observation_size)
+    raw_params = vmap(vmap(init_fn))(keys)
+    if initial_params is not None:
+        raw_initial = to_unconstrained(initial_params)
+        raw_params = jax.tree_map(lambda x, x0: x.at[:, 0].set(x0), raw_params, raw_initial)
+
+    def train(raw_params, x_hist, length):
+        def train_step(opt_state, i):
+            loss, grads = jax.value_and_grad(loss_fn)(get_params(opt_state), x_hist, None, length)
+            return opt_update(i, grads, opt_state), loss
+
+        opt_state, losses = lax.scan(train_step, opt_init(raw_params), jnp.arange(num_epochs))
+        raw_params = get_params(opt_state)
+        return raw_params, losses, loss_fn(raw_params, x_hist, None, length)
+
+    # Restarts are mapped in the inner axis, series in the outer axis
+    train_map = jit(vmap(vmap(train, (0, None, None)), (0, 0, 0)))
+    raw_params, losses, final_losses = train_map(raw_params, observations, lengths)
+
+    best = jnp.nanargmin(final_losses, axis=1)
+    raw_params = jax.tree_map(lambda x: x[jnp.arange(n_series), best], raw_params)
+    return from_unconstrained(raw_params), losses
+
+
+def lds_e_step(params: LDS, observations: chex.Array, lengths: chex.Array = None):
+    """
+    Compute the expected sufficient statistics of a batch of sequences
+    under the smoothing distribution of the current parameters, including
+    the lag-one cross-covariances of the hidden states
+    Parameters
+    ----------
+    params: LDS
+         Linear Dynamical System object with constant parameters
+    observations: array(n_samples, timesteps, observation_size)
+        Fully observed sequences
+    lengths: array(n_samples)
+        Valid length of each sequence (optional)
+    Returns
+    -------
+    * dict
+        Sums over the valid steps of every sequence of
+        - Ezz_prev: E[z_{t-1} z_{t-1}^T] over the transitions
+        - Ezz_next: E[z_t z_t^T] over the transitions
+        - Ezz_lag: E[z_t z_{t-1}^T] over the transitions
+        - Exz: x_t E[z_t]^T
+        - Exx: x_t x_t^T
+        - Ez0, Ez0z0: E[z_0] and E[z_0 z_0^T] of the initial state
+        - n_steps, n_samples: number of valid steps and of sequences
+    * float
+        Sum of the log-marginal-likelihoods of the sequences
+    """
+    n_samples, timesteps, _ = observations.shape
+    if lengths is None:
+        lengths = jnp.full(n_samples, timesteps)
+    A = params.A
+    state_size, _ = A.shape
+    mu0 = params.mu
+    Sigma0 = as_covariance(params.Sigma, state_size)
+
+    *filtered, log_likelihood = filter(params, observations, lengths=lengths, return_log_likelihood=True)
+    mu_hist, Sigma_hist, mu_cond_hist, Sigma_cond_hist = filtered
+    mu_smooth, Sigma_smooth = smooth(params, *filtered, lengths=lengths)
+
+    # Prepend the initial state z0, which precedes the first observation
+    mu_prev = jnp.concatenate([jnp.broadcast_to(mu0, (n_samples, 1, state_size)), mu_hist[:, :-1]], axis=1)
+    Sigma_prev = jnp.concatenate([jnp.broadcast_to(Sigma0, (n_samples, 1, state_size, state_size)),
+                                  Sigma_hist[:, :-1]], axis=1)
+
+    # Smoother gains Jt-1 = Sigma_{t-1} A^T Sigma_{t|t-1}^{-1}
+    solve_map = vmap(vmap(lambda S_cond, S_prev: jnp.linalg.solve(S_cond, A @ S_prev).T))
+    J_hist = solve_map(Sigma_cond_hist, Sigma_prev)
+
+    J0 = J_hist[:, 0]
+    Ez0 = mu0 + jnp.einsum("nij,nj->ni", J0, mu_smooth[:, 0] - mu_cond_hist[:, 0])
+    Cov_z0 = Sigma0 + J0 @ (Sigma_smooth[:, 0] - Sigma_cond_hist[:, 0]) @ jnp.swapaxes(J0, -1, -2)
+
+    # Smoothed moments of z_{t-1}, z_t and of the pair (z_t, z_{t-1})
+    mu_smooth_prev = jnp.concatenate([Ez0[:, None], mu_smooth[:, :-1]], axis=1)
+    Sigma_smooth_prev = jnp.concatenate([Cov_z0[:, None], Sigma_smooth[:, :-1]], axis=1)
+    Cov_lag = Sigma_smooth @ jnp.swapaxes(J_hist, -1, -2)
+
+    valid = (jnp.arange(timesteps)[None, :] < lengths[:, None]).astype(mu_hist.dtype)
+    outer = lambda a, b: jnp.einsum("nti,ntj,nt->ij", a, b, valid)
+    stats = {
+        "Ezz_prev": jnp.einsum("ntij,nt->ij", Sigma_smooth_prev, valid) + outer(mu_smooth_prev, mu_smooth_prev),
+        "Ezz_next": jnp.einsum("ntij,nt->ij", Sigma_smooth, valid) + outer(mu_smooth, mu_smooth),
+        "Ezz_lag": jnp.einsum("ntij,nt->ij", Cov_lag, valid) + outer(mu_smooth, mu_smooth_prev),
+        "Exz": outer(observations, mu_smooth),
+        "Exx": outer(observations, observations),
+        "Ez0": Ez0.sum(axis=0),
+        "Ez0z0": Cov_z0.sum(axis=0) + Ez0.T @ Ez0,
+        "n_steps": valid.sum(),
+        "n_samples": n_samples,
+    }
+    return stats, log_likelihood.sum()
+
+
+def lds_m_step(stats: dict):
+    """
+    Maximum likelihood parameters of an LDS given
+    the expected sufficient statistics (see lds_e_step)
+    Parameters
+    ----------
+    stats: dict
+        Expected sufficient statistics
+    Returns
+    -------
+    * LDS
+    """
+    n_steps, n_samples = stats["n_steps"], stats["n_samples"]
+
+    A = jnp.linalg.solve(stats["Ezz_prev"], stats["Ezz_lag"].T).T
+    Q = (stats["Ezz_next"] - A @ stats["Ezz_lag"].T) / n_steps
+    C = jnp.linalg.solve(stats["Ezz_next"], stats["Exz"].T).T
+    R = (stats["Exx"] - C @ stats["Exz"].T) / n_steps
+
+    mu = stats["Ez0"] / n_samples
+    Sigma = stats["Ez0z0"] / n_samples - jnp.outer(mu, mu)
+
+    symmetrize = lambda S: (S + S.T) / 2
+    return LDS(A, C, symmetrize(Q), symmetrize(R), mu, symmetrize(Sigma))
+
+
+def lds_em(observations: chex.Array,
+           initial_params: LDS,
+           lengths: chex.Array = None,
+           num_epochs: int = 100,
+           tol: float = 1e-4):
+    """
+    Fit the parameters of an LDS to a batch of sequences with the
+    Expectation-Maximisation algorithm. The iterations run in a
+    lax.while_loop, which stops once the relative improvement of the
+    log-likelihood falls below tol, so that the function can be jitted
+    and vmapped, e.g, over thousands of independent series.
+    Parameters
+    ----------
+    observations: array(n_samples, timesteps, observation_size)
+        Fully observed sequences
+    initial_params: LDS
+        Initial Linear Dynamical System with constant parameters
+    lengths: array(n_samples)
+        Valid length of each sequence (optional)
+    num_epochs: int
+        Maximum number of EM iterations
+    tol: float
+        Tolerance on the relative improvement of the log-likelihood
+    Returns
+    -------
+    * LDS
+        Fitted Linear Dynamical System
+    * array(num_epochs)
+        Negative log-likelihood at every iteration, NaN past the last iteration
+    """
+    if any(callable(param) or is_stacked(param) for param in (initial_params.A, initial_params.C,
+                                         initial_params.Q, initial_params.R)):
+        raise ValueError("EM requires constant A, C, Q and R.")
+    state_size, _ = initial_params.A.shape
+    observation_size, _ = initial_params.C.shape
+    to_tuple = lambda params: (params.A, params.C, params.Q, params.R, params.mu, params.Sigma)
+    initial_params = LDS(initial_params.A, initial_params.C,
+                         as_covariance(initial_params.Q, state_size),
+                         as_covariance(initial_params.R, observation_size),
+                         initial_params.mu,
+                         as_covariance(initial_params.Sigma, state_size))
+
+    def cond_fun(val):
+        _, losses, it = val
+        prev_loss, loss = losses[it - 2], losses[it - 1]
+        converged = (it > 1) & (prev_loss - loss < tol * jnp.abs(prev_loss))
+        return (it < num_epochs) & ~converged
+
+    def body_fun(val):
+        params, losses, it = val
+        stats, log_likelihood = lds_e_step(LDS(*params), observations, lengths)
+        params = to_tuple(lds_m_step(stats))
+        return params, losses.at[it].set(-log_likelihood), it + 1
+
+    losses = jnp.full(num_epochs, jnp.nan)
+    initial_val = (to_tuple(initial_params), losses, 0)
+    params, neg_loglikelihoods, _ = lax.while_loop(cond_fun, body_fun, initial_val)
+    return LDS(*params), neg_loglikelihoods
@@ -0,0 +1,188 @@
+"""Tests for jsl.lds.lds_learning"""
+import jax.numpy as jnp
+from jax import random, vmap, jit
+
+import chex
+
+from absl.testing import absltest
+from absl.testing import parameterized
+
+from jsl.lds.kalman_filter import LDS, kalman_filter, filter
+from jsl.lds import lds_learning
+from jsl.lds.lds_test_utils import tracking_lds
+
+
+def joint_log_likelihood(lds: LDS, x_hist):
+    """
+    Log-likelihood of the observations under their joint Gaussian distribution
+    """
+    timesteps, observation_size = x_hist.shape
+    state_size = lds.A.shape[0]
+    # Linear map from (z0, w1, ..., wT) to (z1, ..., zT)
+    powers = [jnp.eye(state_size)]
+    for _ in range(timesteps):
+        powers.append(lds.A @ powers[-1])
+    blocks = [[powers[t + 1 - s] if s <= t + 1 else jnp.zeros((state_size, state_size))
+               for s in range(timesteps + 1)] for t in range(timesteps)]
+    M = jnp.block(blocks)
+    latent_cov = jnp.block([[lds.Sigma if s == t == 0 else jnp.zeros((state_size, state_size))
+                             for s in range(timesteps + 1)] for t in range(timesteps + 1)])
+    latent_cov = latent_cov + jnp.kron(jnp.diag(jnp.arange(timesteps + 1) > 0), lds.Q)
+    latent_mean = jnp.concatenate([lds.mu, jnp.zeros(timesteps * state_size)])
+    C = jnp.kron(jnp.eye(timesteps), lds.C)
+    mean = C @ M @ latent_mean
+    cov = C @ M @ latent_cov @ M.T @ C.T + jnp.kron(jnp.eye(timesteps), lds.R)
+    diff = x_hist.ravel() - mean
+    _, logdet = jnp.linalg.slogdet(cov)
+    return -(diff @ jnp.linalg.solve(cov, diff) + logdet + len(diff) * jnp.log(2 * jnp.pi)) / 2
+
+
+def joint_posterior(lds: LDS, x_hist):
+    """
+    Posterior mean and covariance of the stacked states (z0, ..., zT)
+    given the observations, by Gaussian conditioning
+    """
+    timesteps, _ = x_hist.shape
+    state_size = lds.A.shape[0]
+    # Linear map from (z0, w1, ..., wT) to (z0, z1, ..., zT)
+    powers = [jnp.eye(state_size)]
+    for _ in range(timesteps):
+        powers.append(lds.A @ powers[-1])
+    zeros = jnp.zeros((state_size, state_size))
+    M = jnp.block([[powers[t - s] if s <= t else zeros for s in range(timesteps + 1)]
+                   for t in range(timesteps + 1)])
+    noise_cov = jnp.kron(jnp.diag((jnp.arange(timesteps + 1) > 0).astype(float)), lds.Q)
+    noise_cov = noise_cov.at[:state_size, :state_size].set(lds.Sigma)
+    noise_mean = jnp.concatenate([lds.mu, jnp.zeros(timesteps * state_size)])
+    z_mean, z_cov = M @ noise_mean, M @ noise_cov @ M.T
+    C = jnp.concatenate([jnp.zeros((timesteps * lds.C.shape[0], state_size)),
+                         jnp.kron(jnp.eye(timesteps), lds.C)], axis=1)
+    x_cov = C @ z_cov @ C.T + jnp.kron(jnp.eye(timesteps), lds.R)
+    gain = jnp.linalg.solve(x_cov, C @ z_cov).T
+    mean = z_mean + gain @ (x_hist.ravel() - C @ z_mean)
+    cov = z_cov - gain @ C @ z_cov
+    return mean.reshape(timesteps + 1, state_size), cov
+
+
+class LDSLearningTest(parameterized.TestCase):
+
+    def test_log_likelihood(self):
+        lds = tracking_lds()
+        _, x_hist = lds.sample(random.PRNGKey(0), 8)
+        expected = joint_log_likelihood(lds, x_hist)
+
+        *_, log_likelihood = kalman_filter(lds, x_hist, return_log_likelihood=True)
+        chex.assert_trees_all_close(log_likelihood, expected, rtol=1e-4)
+
+        lds.R = jnp.ones(2) * 0.5
+        *_, log_likelihood = kalman_filter(lds, x_hist, return_log_likelihood=True)
+        chex.assert_trees_all_close(log_likelihood, expected, rtol=1e-4)
+
+        lds.Q = jnp.ones(4) * 0.01
+        *_, log_likelihood = kalman_filter(lds, x_hist, return_log_likelihood=True)
+        chex.assert_trees_all_close(log_likelihood, expected, rtol=1e-4)
+
+    def test_log_likelihood_batch(self):
+        lds = tracking_lds()
+        _, x_hist = lds.sample(random.PRNGKey(0), 10, 3)
+        lengths = jnp.array([10, 4, 7])
+
+        *_, log_likelihood = filter(lds, x_hist, lengths=lengths, return_log_likelihood=True)
+        chex.assert_shape(log_likelihood, (3,))
+        for n, length in enumerate(lengths):
+            *_, expected = kalman_filter(lds, x_hist[n, :length], return_log_likelihood=True)
+            chex.assert_trees_all_close(log_likelihood[n], expected, rtol=1e-5)
+
+    def test_unconstrained_roundtrip(self):
+        lds = tracking_lds()
+        params = lds_learning.from_unconstrained(lds_learning.to_unconstrained(lds))
+        for name in ("A", "C", "Q", "R", "mu", "Sigma"):
+            chex.assert_trees_all_close(getattr(params, name), getattr(lds, name), atol=1e-6)
+
+    def test_unconstrained_diagonal_noise(self):
+        # A vector noise term is the diagonal of the covariance
+        lds = tracking_lds()
+        lds.R = jnp.array([0.5, 2.])
+        params = lds_learning.from_unconstrained(lds_learning.to_unconstrained(lds))
+        chex.assert_trees_all_close(params.R, jnp.diag(lds.R), atol=1e-6)
+
+    def test_fit(self):
+        lds = tracking_lds()
+        _, x_hist = lds.sample(random.PRNGKey(0), 100, 2)
+
+        params, losses = lds_learning.fit(random.PRNGKey(1), x_hist, state_size=4,
+                                          n_restarts=3, num_epochs=300)
+        chex.assert_shape(losses, (2, 3, 300))
+        chex.assert_shape(params.A, (2, 4, 4))
+        assert jnp.all(losses[..., -1] < losses[..., 0])
+
+        for n in range(2):
+            params_n = LDS(*(getattr(params, name)[n] for name in ("A", "C", "Q", "R", "mu", "Sigma")))
+            *_, log_likelihood_fit = kalman_filter(params_n, x_hist[n], return_log_likelihood=True)
+            *_, log_likelihood_true = kalman_filter(lds, x_hist[n], return_log_likelihood=True)
+            # The MLE fits the data at least about as well as the true parameters
+            assert log_likelihood_fit > log_likelihood_true - 5.0
+
+    def test_e_step(self):
+        timesteps, state_size = 6, 4
+        lds = tracking_lds()
+        lds.Sigma = jnp.eye(4) * 0.5
+        _, x_hist = lds.sample(random.PRNGKey(0), timesteps)
+        stats, log_likelihood = lds_learning.lds_e_step(lds, x_hist[None])
+
+        mean, cov = joint_posterior(lds, x_hist)
+        block = lambda t, s: cov[t * state_size:(t + 1) * state_size, s * state_size:(s + 1) * state_size]
+        Ezz = lambda t, s: block(t, s) + jnp.outer(mean[t], mean[s])
+        expected_lag = sum(Ezz(t, t - 1) for t in range(1, timesteps + 1))
+        expected_prev = sum(Ezz(t, t) for t in range(timesteps))
+
+        chex.assert_trees_all_close(stats["Ezz_lag"], expected_lag, atol=1e-3, rtol=1e-3)
+        chex.assert_trees_all_close(stats["Ezz_prev"], expected_prev, atol=1e-3, rtol=1e-3)
+        chex.assert_trees_all_close(stats["Ez0"], mean[0], atol=1e-4, rtol=1e-4)
+        chex.assert_trees_all_close(log_likelihood, joint_log_likelihood(lds, x_hist), rtol=1e-4)
+
+    @parameterized.parameters((False,), (True,))
+    def test_em(self, diagonal_noise: bool):
+        lds = tracking_lds()
+        _, x_hist = lds.sample(random.PRNGKey(0), 50, 5)
+        lengths = jnp.array([50, 30, 50, 20, 40])
+
+        # A vector R is the diagonal of the initial observation covariance
+        R = jnp.ones(2) if diagonal_noise else jnp.eye(2)
+        initial_params = LDS(jnp.eye(4) * 0.9, lds.C + 0.1, jnp.eye(4) * 0.1, R,
+                             jnp.zeros(4), jnp.eye(4))
+        params, neg_loglikelihoods = lds_learning.lds_em(x_hist, initial_params, lengths,
+                                                         num_epochs=30, tol=0.)
+        assert not jnp.any(jnp.isnan(neg_loglikelihoods))
+        # EM never decreases the log-likelihood
+        assert jnp.all(jnp.diff(neg_loglikelihoods) < 1e-2)
+
+        # Iterations stop once the improvement is below the tolerance
+        _, neg_loglikelihoods_tol = lds_learning.lds_em(x_hist, initial_params, lengths,
+                                                        num_epochs=30, tol=1e-2)
+        n_iter = jnp.sum(~jnp.isnan(neg_loglikelihoods_tol))
+        assert 1 < n_iter < 30
+        chex.assert_trees_all_close(neg_loglikelihoods_tol[:n_iter], neg_loglikelihoods[:n_iter], rtol=1e-4)
+        assert not jnp.any(jnp.isnan(params.R))
+
+    def test_em_vmap(self):
+        lds = tracking_lds()
+        _, x_hist = lds.sample(random.PRNGKey(1), 30, 6)
+        x_hist = x_hist.reshape(3, 2, 30, 2)
+        initial_params = LDS(jnp.eye(4) * 0.9, lds.C + 0.1, jnp.eye(4) * 0.1, jnp.eye(2),
+                             jnp.zeros(4), jnp.eye(4))
+
+        def em_fn(x):
+            params, neg_loglikelihoods = lds_learning.lds_em(x, initial_params, num_epochs=10)
+            return params.A, neg_loglikelihoods
+
+        A, neg_loglikelihoods = jit(vmap(em_fn))(x_hist)
+        chex.assert_shape(A, (3, 4, 4))
+
+        params_1, neg_loglikelihoods_1 = lds_learning.lds_em(x_hist[1], initial_params, num_epochs=10)
+        chex.assert_trees_all_close(A[1], params_1.A, atol=1e-3, rtol=1e-3)
+        chex.assert_trees_all_close(neg_loglikelihoods[1], neg_loglikelihoods_1, rtol=1e-4)
+
+
+if __name__ == '__main__':
+    absltest.main()
@@ -0,0 +1,42 @@
+# Linear Dynamical Systems shared by the tests of the lds module
+# and by the benchmarks of jsl/demos
+
+import jax.numpy as jnp
+
+from jsl.lds.kalman_filter import LDS
+
+
+def tracking_lds(dt: float = 0.1, system_noise: float = 0.01,
+                 obs_noise: float = 0.5, prior_variance: float = 1.):
+    """
+    Constant-velocity model of an object moving in the plane,
+    whose position is observed with noise
+    Parameters
+    ----------
+    dt: float
+        Time between two steps
+    system_noise: float
+        Variance of the transition noise of every component
+    obs_noise: float
+        Variance of the observation noise of every component
+    prior_variance: float
+        Variance of every component of the initial state
+    Returns
+    -------
+    * LDS
+    """
+    A = jnp.array([
+        [1, 0, dt, 0],
+        [0, 1, 0, dt],
+        [0, 0, 1, 0],
+        [0, 0, 0, 1]
+    ])
+    C = jnp.array([
+        [1, 0, 0, 0],
+        [0, 1, 0, 0]
+    ]).astype(float)
+    Q = jnp.eye(4) * system_noise
+    R = jnp.eye(2) * obs_noise
+    mu0 = jnp.array([1., 0., 0.5, -0.2])
+    Sigma0 = jnp.eye(4) * prior_variance
+    return LDS(A, C, Q, R, mu0, Sigma0)
@@ -0,0 +1,82 @@
+# Common functions to prepare batches of ragged sequences
+# for the linear dynamical system library
+
+import numpy as np
+import jax.numpy as jnp
+
+
+def pad_sequences(sequences, pad_val=0.):
+    '''
+    Stack sequences of different lengths into a single array,
+    padding each sequence at the end
+
+    Parameters
+    ----------
+    sequences : list of array(seq_len, observation_size)
+        Observation sequences
+
+    pad_val : float
+        Value of the padded steps
+
+    Returns
+    -------
+    * array(n, max_len, observation_size)
+        Padded sequences
+
+    * array(n)
+        Valid length of each sequence
+    '''
+    lengths = np.array([len(seq) for seq in sequences])
+    max_len = lengths.max()
+
+    def pad(seq):
+        seq = np.asarray(seq)
+        pad_width = [(0, max_len - len(seq))] + [(0, 0)] * (seq.ndim - 1)
+        return np.pad(seq, pad_width, constant_values=pad_val)
+
+    padded = np.stack([pad(seq) for seq in sequences])
+    return jnp.array(padded), jnp.array(lengths)
+
+
+def bucket_sequences(observations, valid_lens, n_buckets, multiple=1):
+    '''
+    Group padded sequences of similar length into buckets and trim the
+    padding of each bucket to its longest sequence. Filtering every
+    bucket separately avoids most of the computation on padded steps.
+
+    Parameters
+    ----------
+    observations : array(N, max_len, observation_size)
+        Padded observation sequences
+
+    valid_lens : array(N)
+        Valid length of each observation sequence
+
+    n_buckets : int
+        Number of buckets. Each bucket has roughly N / n_buckets sequences
+
+    multiple : int
+        The length of every bucket is rounded up to a multiple of this value,
+        which bounds the number of distinct shapes (and thus compilations)
+
+    Returns
+    -------
+    * list of tuples (indices, observations, valid_lens), one per non-empty bucket
+        - indices : array(n_bucket) Position of the sequences in the original batch
+        - observations : array(n_bucket, bucket_len, observation_size)
+        - valid_lens : array(n_bucket)
+    '''
+    valid_lens = np.asarray(valid_lens)
+    max_len = observations.shape[1]
+    order = np.argsort(valid_lens, kind="stable")
+
+    buckets = []
+    for indices in np.array_split(order, n_buckets):
+        if len(indices) == 0:
+            continue
+        bucket_len = int(valid_lens[indices].max())
+        bucket_len = min(-(-bucket_len // multiple) * multiple, max_len)
+        buckets.append((jnp.array(indices),
+                        observations[indices, :bucket_len],
+                        jnp.array(valid_lens[indices])))
+    return buckets
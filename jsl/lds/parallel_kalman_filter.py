@@ -0,0 +1,236 @@
+# Parallel-in-time Kalman filter and RTS smoother for a Linear Dynamical System.
+# The filtering (smoothing) distributions are obtained as the prefix (suffix) sums
+# of an associative operator over per-step elements, so that a sequence of
+# T observations is processed in O(log T) depth.
+# See: S. Särkkä and Á. F. García-Fernández, "Temporal Parallelization
+# of Bayesian Smoothers", IEEE Transactions on Automatic Control, 2021.
+
+import chex
+
+import jax.numpy as jnp
+from jax import lax, vmap
+from jax.scipy.linalg import solve
+
+from jsl.lds.kalman_filter import LDS, as_covariance
+
+
+def _get_params_hist(params: LDS, timesteps: int):
+    """
+    Stack the (possibly time-varying) parameters of an LDS
+    for every step of the filtering process
+
+    Parameters
+    ----------
+    params: LDS
+         Linear Dynamical System object
+    timesteps: int
+        Number of steps to evaluate
+
+    Returns
+    -------
+    * array(timesteps, state_size, state_size)
+        Transition matrices
+    * array(timesteps, observation_size, state_size)
+        Observation matrices
+    * array(timesteps, state_size, state_size)
+        Transition covariance matrices
+    * array(timesteps, observation_size, observation_size)
+        Observation covariance matrices
+    """
+    def params_of(t):
+        A = params.get_trans_mat_of(t)
+        C = params.get_obs_mat_of(t)
+        state_size = A.shape[0]
+        observation_size = C.shape[0]
+        Q = as_covariance(params.get_system_noise_of(t), state_size)
+        R = as_covariance(params.get_observation_noise_of(t), observation_size)
+        return A, C, Q, R
+
+    return vmap(params_of)(jnp.arange(timesteps))
+
+
+def _filtering_elements(params: LDS,
+                        x_hist: chex.Array,
+                        A_hist: chex.Array,
+                        C_hist: chex.Array,
+                        Q_hist: chex.Array,
+                        R_hist: chex.Array):
+    """
+    Construct the elements (A, b, C, eta, J) of the associative
+    filtering operator for every step of the sequence. The first
+    element absorbs the prior (mu, Sigma) of the LDS.
+    """
+    state_size = A_hist.shape[-1]
+    I = jnp.eye(state_size)
+    mu0 = params.mu
+    Sigma0 = jnp.broadcast_to(params.Sigma, (state_size, state_size))
+
+    def first_element(A, C, Q, R, obs):
+        mu_cond = A @ mu0
+        Sigma_cond = A @ Sigma0 @ A.T + Q
+
+        S = C @ Sigma_cond @ C.T + R
+        K = solve(S, C @ Sigma_cond, sym_pos=True).T
+
+        At = jnp.zeros_like(A)
+        bt = mu_cond + K @ (obs - C @ mu_cond)
+        Ct = Sigma_cond - K @ S @ K.T
+        etat = jnp.zeros(state_size)
+        Jt = jnp.zeros_like(A)
+        return At, bt, Ct, etat, Jt
+
+    def generic_element(A, C, Q, R, obs):
+        S = C @ Q @ C.T + R
+        K = solve(S, C @ Q, sym_pos=True).T
+        CS = solve(S, C, sym_pos=True)
+
+        At = (I - K @ C) @ A
+        bt = K @ obs
+        Ct = (I - K @ C) @ Q
+        etat = A.T @ CS.T @ obs
+        Jt = A.T @ CS.T @ C @ A
+        return At, bt, Ct, etat, Jt
+
+    first = first_element(A_hist[0], C_hist[0], Q_hist[0], R_hist[0], x_hist[0])
+    generic = vmap(generic_element)(A_hist[1:], C_hist[1:], Q_hist[1:], R_hist[1:], x_hist[1:])
+
+    return tuple(jnp.concatenate([first_elem[None, ...], generic_elem])
+                 for first_elem, generic_elem in zip(first, generic))
+
+
+def _filtering_operator(elem_i, elem_j):
+    """
+    Associative operator to combine two consecutive filtering elements,
+    where elem_i precedes elem_j in time.
+    """
+    A_i, b_i, C_i, eta_i, J_i = elem_i
+    A_j, b_j, C_j, eta_j, J_j = elem_j
+    I = jnp.eye(A_i.shape[0])
+
+    IpCJ = I + C_i @ J_j
+    IpJC = I + J_j @ C_i
+
+    AM = solve(IpCJ.T, A_j.T).T
+    A = AM @ A_i
+    b = AM @ (b_i + C_i @ eta_j) + b_j
+    C = AM @ C_i @ A_j.T + C_j
+    C = (C + C.T) / 2
+
+    AtN = solve(IpJC.T, A_i).T
+    eta = AtN @ (eta_j - J_j @ b_i) + eta_i
+    J = AtN @ J_j @ A_i + J_i
+    J = (J + J.T) / 2
+
+    return A, b, C, eta, J
+
+
+def parallel_kalman_filter(params: LDS, x_hist: chex.Array,
+                           return_history: bool = True):
+    """
+    Compute the online version of the Kalman-Filter using an
+    associative scan over time, i.e, the filtering distributions are
+    computed in O(log timesteps) sequential depth.
+    The output matches that of kalman_filter.kalman_filter.
+    Parameters
+    ----------
+    params: LDS
+         Linear Dynamical System object
+    x_hist: array(timesteps, observation_size)
+    return_history: bool
+    Returns
+    -------
+    * array(timesteps, state_size):
+        Filtered means mut
+    * array(timesteps, state_size, state_size)
+        Filtered covariances Sigmat
+    * array(timesteps, state_size)
+        Filtered conditional means mut|t-1
+    * array(timesteps, state_size, state_size)
+        Filtered conditional covariances Sigmat|t-1
+    """
+    timesteps = x_hist.shape[0]
+    A_hist, C_hist, Q_hist, R_hist = _get_params_hist(params, timesteps)
+    state_size = A_hist.shape[-1]
+
+    elements = _filtering_elements(params, x_hist, A_hist, C_hist, Q_hist, R_hist)
+    _, mu_hist, Sigma_hist, _, _ = lax.associative_scan(vmap(_filtering_operator), elements)
+
+    if not return_history:
+        return mu_hist[-1], Sigma_hist[-1], None, None
+
+    # One-step-ahead predictions from the previous filtered state
+    Sigma0 = jnp.broadcast_to(params.Sigma, (state_size, state_size))
+    mu_prev = jnp.concatenate([params.mu[None, ...], mu_hist[:-1]])
+    Sigma_prev = jnp.concatenate([Sigma0[None, ...], Sigma_hist[:-1]])
+    mu_cond_hist = jnp.einsum("tij,tj->ti", A_hist, mu_prev)
+    Sigma_cond_hist = jnp.einsum("tij,tjk,tlk->til", A_hist, Sigma_prev, A_hist) + Q_hist
+
+    return mu_hist, Sigma_hist, mu_cond_hist, Sigma_cond_hist
+
+
+def _smoothing_operator(elem_j, elem_i):
+    """
+    Associative operator to combine two consecutive smoothing elements,
+    where elem_i precedes elem_j in time. Since the smoothing pass runs
+    backwards in time, the later element comes first.
+    """
+    E_j, g_j, L_j = elem_j
+    E_i, g_i, L_i = elem_i
+
+    E = E_i @ E_j
+    g = E_i @ g_j + g_i
+    L = E_i @ L_j @ E_i.T + L_i
+    L = (L + L.T) / 2
+
+    return E, g, L
+
+
+def parallel_kalman_smoother(params: LDS,
+                             mu_hist: chex.Array,
+                             Sigma_hist: chex.Array,
+                             mu_cond_hist: chex.Array,
+                             Sigma_cond_hist: chex.Array):
+    """
+    Compute the offline version of the Kalman-Filter, i.e,
+    the kalman smoother for the hidden state, using an associative
+    scan backwards in time.
+    Note that we require to independently run the kalman_filter
+    (or parallel_kalman_filter) function first
+    Parameters
+    ----------
+    params: LDS
+         Linear Dynamical System object
+    mu_hist: array(timesteps, state_size):
+        Filtered means mut
+    Sigma_hist: array(timesteps, state_size, state_size)
+        Filtered covariances Sigmat
+    mu_cond_hist: array(timesteps, state_size)
+        Filtered conditional means mut|t-1
+    Sigma_cond_hist: array(timesteps, state_size, state_size)
+        Filtered conditional covariances Sigmat|t-1
+    Returns
+    -------
+    * array(timesteps, state_size):
+        Smoothed means mut
+    * array(timesteps, state_size, state_size)
+        Smoothed covariances Sigmat
+    """
+    timesteps = mu_hist.shape[0]
+    A_hist = vmap(params.get_trans_mat_of)(jnp.arange(1, timesteps))
+
+    def generic_element(A, mutt, Sigmatt, mut_cond_next, Sigmat_cond_next):
+        Et = solve(Sigmat_cond_next, A @ Sigmatt, sym_pos=True).T
+        gt = mutt - Et @ mut_cond_next
+        Lt = Sigmatt - Et @ A @ Sigmatt
+        return Et, gt, Lt
+
+    generic = vmap(generic_element)(A_hist, mu_hist[:-1], Sigma_hist[:-1],
+                                    mu_cond_hist[1:], Sigma_cond_hist[1:])
+    last = (jnp.zeros_like(Sigma_hist[-1]), mu_hist[-1], Sigma_hist[-1])
+
+    elements = tuple(jnp.concatenate([generic_elem, last_elem[None, ...]])
+                     for generic_elem, last_elem in zip(generic, last))
+    _, mu_hist_smooth, Sigma_hist_smooth = lax.associative_scan(vmap(_smoothing_operator),
+                                                                elements, reverse=True)
+
+    return mu_hist_smooth, Sigma_hist_smooth
@@ -0,0 +1,69 @@
+"""Tests for jsl.lds.parallel_kalman_filter"""
+import jax.numpy as jnp
+from jax import random
+
+import chex
+
+from absl.testing import absltest
+from absl.testing import parameterized
+
+from jsl.lds.kalman_filter import LDS, kalman_filter, kalman_smoother
+from jsl.lds.parallel_kalman_filter import parallel_kalman_filter, parallel_kalman_smoother
+from jsl.lds.lds_test_utils import tracking_lds
+
+
+class ParallelKalmanFilterTest(parameterized.TestCase):
+
+    @parameterized.parameters((0, 1), (1, 25), (2, 100))
+    def test_matches_kalman_filter(self, seed: int, timesteps: int):
+        lds = tracking_lds()
+        _, x_hist = lds.sample(random.PRNGKey(seed), timesteps)
+
+        expected = kalman_filter(lds, x_hist)
+        outputs = parallel_kalman_filter(lds, x_hist)
+
+        for expected_hist, hist in zip(expected, outputs):
+            chex.assert_equal_shape([expected_hist, hist])
+            chex.assert_trees_all_close(hist, expected_hist, atol=1e-3, rtol=1e-3)
+
+    def test_time_varying_observation(self):
+        timesteps, input_dim = 30, 3
+        key_x, key_w, key_noise = random.split(random.PRNGKey(0), 3)
+        x = random.normal(key_x, (timesteps, input_dim))
+        w = random.normal(key_w, (input_dim,))
+        y = (x @ w + 0.1 * random.normal(key_noise, (timesteps,)))[:, None]
+
+        C = lambda t: x[t][None, ...]
+        lds = LDS(jnp.eye(input_dim), C, jnp.zeros((input_dim, input_dim)),
+                  jnp.eye(1) * 0.01, jnp.zeros(input_dim), jnp.eye(input_dim))
+
+        mun, Sigman, _, _ = kalman_filter(lds, y, return_history=False)
+        mun_parallel, Sigman_parallel, _, _ = parallel_kalman_filter(lds, y, return_history=False)
+
+        chex.assert_trees_all_close(mun_parallel, mun, atol=1e-3, rtol=1e-3)
+        chex.assert_trees_all_close(Sigman_parallel, Sigman, atol=1e-3, rtol=1e-3)
+
+    @parameterized.parameters((0, 2), (1, 25), (2, 100))
+    def test_smoother_matches_kalman_smoother(self, seed: int, timesteps: int):
+        lds = tracking_lds()
+        _, x_hist = lds.sample(random.PRNGKey(seed), timesteps)
+        filter_hist = kalman_filter(lds, x_hist)
+
+        mu_hist_smooth, Sigma_hist_smooth = kalman_smoother(lds, *filter_hist)
+        mu_hist_parallel, Sigma_hist_parallel = parallel_kalman_smoother(lds, *filter_hist)
+
+        chex.assert_trees_all_close(mu_hist_parallel, mu_hist_smooth, atol=1e-3, rtol=1e-3)
+        chex.assert_trees_all_close(Sigma_hist_parallel, Sigma_hist_smooth, atol=1e-3, rtol=1e-3)
+
+    def test_diagonal_system_noise(self):
+        lds = tracking_lds()
+        _, x_hist = lds.sample(random.PRNGKey(0), 25)
+        expected = kalman_filter(lds, x_hist)
+        lds.Q = jnp.diagonal(lds.Q)
+
+        outputs = parallel_kalman_filter(lds, x_hist)
+        chex.assert_trees_all_close(outputs, expected, atol=1e-3, rtol=1e-3)
+
+
+if __name__ == '__main__':
+    absltest.main()
@@ -0,0 +1,161 @@
+# Square-root Kalman filter and RTS smoother for a Linear Dynamical System.
+# Covariances are propagated through their (lower-triangular) Cholesky
+# factors, which are updated with QR decompositions of stacked factors.
+# This keeps the covariances symmetric positive semi-definite by
+# construction and roughly doubles the effective numerical precision.
+
+import chex
+
+import jax.numpy as jnp
+from jax import lax
+from jax.scipy.linalg import solve_triangular
+
+from jsl.lds.kalman_filter import LDS, as_covariance
+
+
+def _tria(M: chex.Array):
+    """
+    Compute a lower-triangular matrix L such that L L^T = M M^T
+    from the QR decomposition of M^T
+    Parameters
+    ----------
+    M: array(n, m), with m >= n
+    Returns
+    -------
+    * array(n, n)
+        Lower-triangular square-root of M M^T with
+        non-negative diagonal
+    """
+    _, r = jnp.linalg.qr(M.T)
+    L = r.T
+    sign = jnp.where(jnp.diag(L) < 0, -1, 1).astype(L.dtype)
+    return L * sign[None, :]
+
+
+def _chol_of(noise: chex.Array, size: int):
+    return jnp.linalg.cholesky(as_covariance(noise, size))
+
+
+def sqrt_kalman_filter(params: LDS, x_hist: chex.Array,
+                       return_history: bool = True):
+    """
+    Compute the online version of the Kalman-Filter in square-root form.
+    The noise covariances Q, R and the initial covariance Sigma of the
+    LDS are required to be positive definite.
+    Parameters
+    ----------
+    params: LDS
+         Linear Dynamical System object
+    x_hist: array(timesteps, observation_size)
+    return_history: bool
+    Returns
+    -------
+    * array(timesteps, state_size):
+        Filtered means mut
+    * array(timesteps, state_size, state_size)
+        Cholesky factors of the filtered covariances Sigmat
+    * array(timesteps, state_size)
+        Filtered conditional means mut|t-1
+    * array(timesteps, state_size, state_size)
+        Cholesky factors of the filtered conditional covariances Sigmat|t-1
+    """
+    state_size, _ = params.get_trans_mat_of(0).shape
+
+    def sqrt_kalman_step(state, obs):
+        mu, Sigma_chol, t = state
+        A = params.get_trans_mat_of(t)
+        Q_chol = _chol_of(params.get_system_noise_of(t), state_size)
+        Ct = params.get_obs_mat_of(t)
+        observation_size, _ = Ct.shape
+        R_chol = jnp.linalg.cholesky(as_covariance(params.get_observation_noise_of(t), observation_size))
+
+        # Time update
+        mu_cond = A @ mu
+        Sigma_cond_chol = _tria(jnp.concatenate([A @ Sigma_chol, Q_chol], axis=1))
+
+        # Measurement update through the QR decomposition of the pre-array
+        #  [[R^{1/2}, Ct Sigma_cond^{1/2}],   ->  [[St^{1/2}, 0],
+        #   [0,       Sigma_cond^{1/2}]]           [Kt St^{1/2}, Sigma^{1/2}]]
+        pre_array = jnp.block([
+            [R_chol, Ct @ Sigma_cond_chol],
+            [jnp.zeros((state_size, observation_size)), Sigma_cond_chol]
+        ])
+        post_array = _tria(pre_array)
+        St_chol = post_array[:observation_size, :observation_size]
+        Kt_scaled = post_array[observation_size:, :observation_size]
+        Sigma_chol = post_array[observation_size:, observation_size:]
+
+        et = obs - Ct @ mu_cond
+        mu = mu_cond + Kt_scaled @ solve_triangular(St_chol, et, lower=True)
+
+        return (mu, Sigma_chol, t + 1), (mu, Sigma_chol, mu_cond, Sigma_cond_chol)
+
+    mu0 = params.mu
+    Sigma0_chol = _chol_of(params.Sigma, state_size)
+    initial_state = (mu0, Sigma0_chol, 0)
+    (mun, Sigman_chol, _), history = lax.scan(sqrt_kalman_step, initial_state, x_hist)
+    if return_history:
+        return history
+    return mun, Sigman_chol, None, None
+
+
+def sqrt_kalman_smoother(params: LDS,
+                         mu_hist: chex.Array,
+                         Sigma_chol_hist: chex.Array,
+                         mu_cond_hist: chex.Array,
+                         Sigma_cond_chol_hist: chex.Array):
+    """
+    Compute the offline version of the Kalman-Filter in square-root form,
+    i.e, the kalman smoother for the hidden state.
+    Note that we require to independently run the sqrt_kalman_filter function first
+    Parameters
+    ----------
+    params: LDS
+         Linear Dynamical System object
+    mu_hist: array(timesteps, state_size):
+        Filtered means mut
+    Sigma_chol_hist: array(timesteps, state_size, state_size)
+        Cholesky factors of the filtered covariances Sigmat
+    mu_cond_hist: array(timesteps, state_size)
+        Filtered conditional means mut|t-1
+    Sigma_cond_chol_hist: array(timesteps, state_size, state_size)
+        Cholesky factors of the filtered conditional covariances Sigmat|t-1
+    Returns
+    -------
+    * array(timesteps, state_size):
+        Smoothed means mut
+    * array(timesteps, state_size, state_size)
+        Cholesky factors of the smoothed covariances Sigmat
+    """
+    timesteps, state_size = mu_hist.shape
+    I = jnp.eye(state_size)
+
+    mut_giv_T = mu_hist[-1]
+    Sigmat_giv_T_chol = Sigma_chol_hist[-1]
+
+    def sqrt_smoother_step(state, elements):
+        mut_giv_T, Sigmat_giv_T_chol = state
+        mutt, Sigmatt_chol, mut_cond_next, Sigmat_cond_next_chol, t = elements
+        A = params.get_trans_mat_of(t)
+        Q_chol = _chol_of(params.get_system_noise_of(t), state_size)
+
+        # Jt = Sigmatt A^T Sigma_cond_next^{-1}
+        tmp = solve_triangular(Sigmat_cond_next_chol, A @ Sigmatt_chol @ Sigmatt_chol.T, lower=True)
+        Jt = solve_triangular(Sigmat_cond_next_chol.T, tmp, lower=False).T
+
+        mut_giv_T = mutt + Jt @ (mut_giv_T - mut_cond_next)
+        Sigmat_giv_T_chol = _tria(jnp.concatenate([(I - Jt @ A) @ Sigmatt_chol,
+                                                    Jt @ Q_chol,
+                                                    Jt @ Sigmat_giv_T_chol], axis=1))
+        return (mut_giv_T, Sigmat_giv_T_chol), (mut_giv_T, Sigmat_giv_T_chol)
+
+    elements = (mu_hist[:-1], Sigma_chol_hist[:-1], mu_cond_hist[1:], Sigma_cond_chol_hist[1:],
+                jnp.arange(1, timesteps))
+    initial_state = (mut_giv_T, Sigmat_giv_T_chol)
+    _, (mu_hist_smooth, Sigma_chol_hist_smooth) = lax.scan(sqrt_smoother_step, initial_state,
+                                                           elements, reverse=True)
+
+    mu_hist_smooth = jnp.concatenate([mu_hist_smooth, mut_giv_T[None, ...]], axis=0)
+    Sigma_chol_hist_smooth = jnp.concatenate([Sigma_chol_hist_smooth, Sigmat_giv_T_chol[None, ...]], axis=0)
+
+    return mu_hist_smooth, Sigma_chol_hist_smooth
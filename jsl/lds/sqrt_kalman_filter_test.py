@@ -0,0 +1,57 @@
+"""Tests for jsl.lds.sqrt_kalman_filter"""
+import jax.numpy as jnp
+from jax import random
+
+import chex
+
+from absl.testing import absltest
+from absl.testing import parameterized
+
+from jsl.lds.kalman_filter import kalman_filter, kalman_smoother
+from jsl.lds.sqrt_kalman_filter import sqrt_kalman_filter, sqrt_kalman_smoother
+from jsl.lds.lds_test_utils import tracking_lds
+
+
+def outer(chol_hist):
+    return jnp.einsum("tij,tkj->tik", chol_hist, chol_hist)
+
+
+class SqrtKalmanFilterTest(parameterized.TestCase):
+
+    @parameterized.parameters((0, 1), (1, 30), (2, 200))
+    def test_matches_kalman_filter(self, seed: int, timesteps: int):
+        lds = tracking_lds()
+        _, x_hist = lds.sample(random.PRNGKey(seed), timesteps)
+
+        mu_hist, Sigma_hist, mu_cond_hist, Sigma_cond_hist = kalman_filter(lds, x_hist)
+        mu_hist_sqrt, Sigma_chol_hist, mu_cond_hist_sqrt, Sigma_cond_chol_hist = sqrt_kalman_filter(lds, x_hist)
+
+        chex.assert_trees_all_close(mu_hist_sqrt, mu_hist, atol=1e-3, rtol=1e-3)
+        chex.assert_trees_all_close(mu_cond_hist_sqrt, mu_cond_hist, atol=1e-3, rtol=1e-3)
+        chex.assert_trees_all_close(outer(Sigma_chol_hist), Sigma_hist, atol=1e-4, rtol=1e-3)
+        chex.assert_trees_all_close(outer(Sigma_cond_chol_hist), Sigma_cond_hist, atol=1e-4, rtol=1e-3)
+        assert jnp.allclose(Sigma_chol_hist, jnp.tril(Sigma_chol_hist))
+
+    @parameterized.parameters((0, 2), (1, 50))
+    def test_smoother_matches_kalman_smoother(self, seed: int, timesteps: int):
+        lds = tracking_lds()
+        _, x_hist = lds.sample(random.PRNGKey(seed), timesteps)
+
+        mu_hist_smooth, Sigma_hist_smooth = kalman_smoother(lds, *kalman_filter(lds, x_hist))
+        mu_hist_sqrt, Sigma_chol_hist = sqrt_kalman_smoother(lds, *sqrt_kalman_filter(lds, x_hist))
+
+        chex.assert_trees_all_close(mu_hist_sqrt, mu_hist_smooth, atol=1e-3, rtol=1e-3)
+        chex.assert_trees_all_close(outer(Sigma_chol_hist), Sigma_hist_smooth, atol=1e-4, rtol=1e-3)
+
+    def test_diagonal_system_noise(self):
+        lds = tracking_lds()
+        _, x_hist = lds.sample(random.PRNGKey(0), 30)
+        _, Sigma_hist, _, _ = kalman_filter(lds, x_hist)
+        lds.Q = jnp.diagonal(lds.Q)
+
+        _, Sigma_chol_hist, _, _ = sqrt_kalman_filter(lds, x_hist)
+        chex.assert_trees_all_close(outer(Sigma_chol_hist), Sigma_hist, atol=1e-4, rtol=1e-3)
+
+
+if __name__ == '__main__':
+    absltest.main()
@@ -0,0 +1,183 @@
+# Steady-state Kalman filter for a time-invariant Linear Dynamical System.
+# For constant A, C, Q, R the filtered covariances converge to the
+# solution of the discrete algebraic Riccati equation (DARE). We solve
+# the DARE once and then run a pure matrix-vector recursion for the means.
+
+import chex
+
+import jax.numpy as jnp
+from jax import lax
+from jax.scipy.linalg import solve
+
+from jsl.lds.kalman_filter import LDS, kalman_filter, as_covariance, is_stacked
+
+
+def solve_discrete_are(A: chex.Array,
+                       C: chex.Array,
+                       Q: chex.Array,
+                       R: chex.Array,
+                       tol: float = 1e-6,
+                       max_iter: int = 100):
+    """
+    Solve the filtering discrete algebraic Riccati equation
+        P = A P A^T - A P C^T (C P C^T + R)^{-1} C P A^T + Q
+    using the structure-preserving doubling algorithm, which
+    converges quadratically.
+    Parameters
+    ----------
+    A: array(state_size, state_size)
+        Transition matrix
+    C: array(observation_size, state_size)
+        Observation matrix
+    Q: array(state_size, state_size)
+        Transition covariance matrix
+    R: array(observation_size, observation_size)
+        Observation covariance
+    tol: float
+        Relative tolerance on the change of the solution
+    max_iter: int
+        Maximum number of doubling steps
+    Returns
+    -------
+    * array(state_size, state_size)
+        Steady-state conditional covariance Sigma_{t|t-1}
+    """
+    state_size, _ = A.shape
+    I = jnp.eye(state_size)
+
+    def cond_fun(val):
+        *_, err, it = val
+        return (err > tol) & (it < max_iter)
+
+    def body_fun(val):
+        Ak, Gk, Hk, _, it = val
+        W = I + Gk @ Hk
+        AW = solve(W.T, Ak.T).T
+        A_next = AW @ Ak
+        G_next = Gk + AW @ Gk @ Ak.T
+        H_next = Hk + Ak.T @ Hk @ solve(W, Ak)
+        H_next = (H_next + H_next.T) / 2
+        err = jnp.linalg.norm(H_next - Hk) / jnp.linalg.norm(H_next)
+        return A_next, G_next, H_next, err, it + 1
+
+    G0 = C.T @ solve(R, C, sym_pos=True)
+    initial_val = (A.T, G0, Q, jnp.inf, 0)
+    *_, P, _, _ = lax.while_loop(cond_fun, body_fun, initial_val)
+    return P
+
+
+def steady_state_gain(params: LDS, tol: float = 1e-6, max_iter: int = 100):
+    """
+    Compute the steady-state Kalman gain and covariances
+    of a time-invariant LDS
+    Parameters
+    ----------
+    params: LDS
+         Linear Dynamical System object with constant parameters
+    tol: float
+        Relative tolerance of the DARE solver
+    max_iter: int
+        Maximum number of iterations of the DARE solver
+    Returns
+    -------
+    * array(state_size, observation_size)
+        Steady-state Kalman gain K
+    * array(state_size, state_size)
+        Steady-state filtered covariance Sigma
+    * array(state_size, state_size)
+        Steady-state conditional covariance Sigma_{t|t-1}
+    """
+    if any(callable(param) or is_stacked(param) for param in (params.A, params.C, params.Q, params.R)):
+        raise ValueError("The steady-state Kalman filter requires constant A, C, Q and R.")
+
+    A, C = params.A, params.C
+    state_size, _ = A.shape
+    observation_size, _ = C.shape
+    I = jnp.eye(state_size)
+    Q = as_covariance(params.Q, state_size)
+    R = as_covariance(params.R, observation_size)
+
+    Sigma_cond = solve_discrete_are(A, C, Q, R, tol, max_iter)
+    S = C @ Sigma_cond @ C.T + R
+    K = solve(S, C @ Sigma_cond, sym_pos=True).T
+
+    tmp = I - K @ C
+    Sigma = tmp @ Sigma_cond @ tmp.T + K @ R @ K.T
+
+    return K, Sigma, Sigma_cond
+
+
+def steady_state_kalman_filter(params: LDS, x_hist: chex.Array,
+                               return_history: bool = True,
+                               n_warmup: int = 0,
+                               tol: float = 1e-6,
+                               max_iter: int = 100):
+    """
+    Compute the online version of the Kalman-Filter using the
+    steady-state Kalman gain. The first n_warmup steps are filtered
+    exactly; the remaining steps only update the means as
+        mu_t = (I - K C) A mu_{t-1} + K x_t
+    Parameters
+    ----------
+    params: LDS
+         Linear Dynamical System object with constant parameters
+    x_hist: array(timesteps, observation_size)
+    return_history: bool
+    n_warmup: int
+        Number of steps to run the exact Kalman filter before
+        switching to the steady-state gain
+    tol: float
+        Relative tolerance of the DARE solver
+    max_iter: int
+        Maximum number of iterations of the DARE solver
+    Returns
+    -------
+    * array(timesteps, state_size):
+        Filtered means mut
+    * array(timesteps, state_size, state_size)
+        Filtered covariances Sigmat
+    * array(timesteps, state_size)
+        Filtered conditional means mut|t-1
+    * array(timesteps, state_size, state_size)
+        Filtered conditional covariances Sigmat|t-1
+    * float
+        Frobenius distance between the exact filtered covariance at the
+        switching step and the steady-state covariance. The error of
+        the steady-state means with respect to the exact filter decays
+        from this initial mismatch.
+    """
+    K, Sigma_inf, Sigma_cond_inf = steady_state_gain(params, tol, max_iter)
+    A, C = params.A, params.C
+    timesteps = x_hist.shape[0]
+    n_warmup = min(n_warmup, timesteps)
+
+    if n_warmup > 0:
+        warmup_hist = kalman_filter(params, x_hist[:n_warmup])
+        mu_warmup_hist, Sigma_warmup_hist, *_ = warmup_hist
+        mu0, Sigma0 = mu_warmup_hist[-1], Sigma_warmup_hist[-1]
+    else:
+        mu0, Sigma0 = params.mu, jnp.broadcast_to(params.Sigma, Sigma_inf.shape)
+    error = jnp.linalg.norm(Sigma0 - Sigma_inf)
+
+    F = A - K @ C @ A
+
+    def steady_state_step(mu, obs):
+        mu_cond = A @ mu
+        mu = F @ mu + K @ obs
+        return mu, (mu, mu_cond)
+
+    mun, (mu_hist, mu_cond_hist) = lax.scan(steady_state_step, mu0, x_hist[n_warmup:])
+
+    if not return_history:
+        Sigman = Sigma_inf if n_warmup < timesteps else Sigma0
+        return mun, Sigman, None, None, error
+
+    n_steady = timesteps - n_warmup
+    Sigma_hist = jnp.broadcast_to(Sigma_inf, (n_steady, *Sigma_inf.shape))
+    Sigma_cond_hist = jnp.broadcast_to(Sigma_cond_inf, (n_steady, *Sigma_cond_inf.shape))
+    history = (mu_hist, Sigma_hist, mu_cond_hist, Sigma_cond_hist)
+
+    if n_warmup > 0:
+        history = tuple(jnp.concatenate([warmup, steady]) for warmup, steady in zip(warmup_hist, history))
+
+    return (*history, error)
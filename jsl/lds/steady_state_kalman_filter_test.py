@@ -0,0 +1,68 @@
+"""Tests for jsl.lds.steady_state_kalman_filter"""
+import jax.numpy as jnp
+from jax import random
+
+import chex
+
+from absl.testing import absltest
+from absl.testing import parameterized
+
+from jsl.lds.kalman_filter import kalman_filter
+from jsl.lds.steady_state_kalman_filter import solve_discrete_are, steady_state_kalman_filter
+from jsl.lds.lds_test_utils import tracking_lds
+
+
+class SteadyStateKalmanFilterTest(parameterized.TestCase):
+
+    def test_dare_fixed_point(self):
+        lds = tracking_lds()
+        P = solve_discrete_are(lds.A, lds.C, lds.Q, lds.R)
+
+        S = lds.C @ P @ lds.C.T + lds.R
+        P_next = lds.A @ P @ lds.A.T + lds.Q - \
+                 lds.A @ P @ lds.C.T @ jnp.linalg.solve(S, lds.C @ P @ lds.A.T)
+        chex.assert_trees_all_close(P_next, P, atol=1e-4, rtol=1e-4)
+
+    @parameterized.parameters((0, 0), (1, 100), (2, 500))
+    def test_converges_to_kalman_filter(self, seed: int, n_warmup: int):
+        timesteps = 800
+        lds = tracking_lds()
+        _, x_hist = lds.sample(random.PRNGKey(seed), timesteps)
+
+        expected = kalman_filter(lds, x_hist)
+        *outputs, error = steady_state_kalman_filter(lds, x_hist, n_warmup=n_warmup)
+
+        for expected_hist, hist in zip(expected, outputs):
+            chex.assert_equal_shape([expected_hist, hist])
+            chex.assert_trees_all_close(hist[-100:], expected_hist[-100:], atol=1e-3, rtol=1e-3)
+        if n_warmup > 0:
+            chex.assert_trees_all_close(outputs[0][:n_warmup], expected[0][:n_warmup])
+        assert error >= 0
+
+    def test_error_decreases_with_warmup(self):
+        lds = tracking_lds()
+        _, x_hist = lds.sample(random.PRNGKey(0), 300)
+
+        *_, error_short = steady_state_kalman_filter(lds, x_hist, return_history=False, n_warmup=10)
+        *_, error_long = steady_state_kalman_filter(lds, x_hist, return_history=False, n_warmup=200)
+        assert error_long < error_short
+
+    def test_time_varying_raises(self):
+        lds = tracking_lds()
+        C = lds.C
+        lds.C = lambda t: C
+        with self.assertRaises(ValueError):
+            steady_state_kalman_filter(lds, jnp.zeros((10, 2)))
+
+    def test_diagonal_system_noise(self):
+        lds = tracking_lds()
+        _, x_hist = lds.sample(random.PRNGKey(0), 300)
+        expected = steady_state_kalman_filter(lds, x_hist)
+        lds.Q = jnp.diagonal(lds.Q)
+
+        outputs = steady_state_kalman_filter(lds, x_hist)
+        chex.assert_trees_all_close(outputs, expected, atol=1e-4, rtol=1e-4)
+
+
+if __name__ == '__main__':
+    absltest.main()
@@ -0,0 +1,123 @@
+# Streaming (resumable) Kalman filter for a Linear Dynamical System.
+# Observations arrive in chunks; the filter keeps a small state
+# (mu, Sigma, t, log_likelihood) between chunks, so that an unbounded
+# stream is processed in constant memory with a single compiled kernel
+# per chunk size.
+
+import chex
+
+import jax
+import jax.numpy as jnp
+
+from typing import NamedTuple
+
+from jsl.lds.kalman_filter import LDS, OutputSpec, kalman_filter_scan
+
+
+class KalmanFilterState(NamedTuple):
+    """
+    State of the streaming Kalman-Filter. Every field is an array, so the
+    state can be stored and restored, e.g, with
+    np.savez(path, **state._asdict()) and KalmanFilterState(**np.load(path))
+    Parameters
+    ----------
+    mu: array(state_size)
+        Filtered mean of the last processed step
+    Sigma: array(state_size, state_size)
+        Filtered covariance of the last processed step
+    t: int
+        Number of processed steps
+    log_likelihood: float
+        Running log-marginal-likelihood log p(x1:t)
+    """
+    mu: chex.Array
+    Sigma: chex.Array
+    t: chex.Array
+    log_likelihood: chex.Array
+
+
+def init(params: LDS) -> KalmanFilterState:
+    """
+    Initial state of the streaming Kalman-Filter,
+    before any observation has been processed
+    Parameters
+    ----------
+    params: LDS
+         Linear Dynamical System object
+    Returns
+    -------
+    * KalmanFilterState
+    """
+    state_size, _ = params.get_trans_mat_of(0).shape
+    # Copy the parameters: the state buffers may be donated by update_fn
+    mu = jnp.array(params.mu)
+    Sigma = jnp.array(jnp.broadcast_to(params.Sigma, (state_size, state_size)), dtype=mu.dtype)
+    return KalmanFilterState(mu, Sigma, jnp.array(0, dtype=jnp.int32), jnp.zeros((), dtype=mu.dtype))
+
+
+def update(params: LDS,
+           state: KalmanFilterState,
+           x_chunk: chex.Array,
+           mask: chex.Array = None,
+           length: int = None,
+           return_history: bool = True):
+    """
+    Process a chunk of observations with the Kalman-Filter, starting
+    from the state left by the previous chunk. Stacked time-varying
+    parameters of the LDS are given per chunk, aligned with x_chunk.
+    Parameters
+    ----------
+    params: LDS
+         Linear Dynamical System object
+    state: KalmanFilterState
+        State after the previous chunk (see init)
+    x_chunk: array(chunk_size, observation_size)
+    mask: array(chunk_size) or array(chunk_size, observation_size)
+        Boolean indicator of the observed steps or components (optional).
+        If not given, every non-NaN value of x_chunk is observed.
+    length: int
+        Number of valid steps in the chunk (optional). Use it to pad the
+        last, incomplete, chunk of a stream to the common chunk size.
+    return_history: bool
+    Returns
+    -------
+    * KalmanFilterState
+        State after the last valid step of the chunk
+    * tuple or None
+        History of the filtered means, filtered covariances,
+        conditional means and conditional covariances of the chunk
+    """
+    # Without history, no quantity of the steps is recorded
+    output_spec = None if return_history else OutputSpec(quantities=())
+    final_state, history = kalman_filter_scan(params, tuple(state), x_chunk, mask, length, output_spec)
+    if not return_history:
+        history = None
+    return KalmanFilterState(*final_state), history
+
+
+def streaming_filter(params: LDS, return_history: bool = True):
+    """
+    Build jitted init and update functions of a streaming Kalman-Filter.
+    The update function donates the buffers of the input state, so that
+    processing a stream chunk by chunk runs in constant memory. Chunks
+    with the same shape reuse the same compiled kernel.
+    Parameters
+    ----------
+    params: LDS
+         Linear Dynamical System object
+    return_history: bool
+        Whether the update function returns the history of each chunk
+    Returns
+    -------
+    * function
+        init_fn() -> KalmanFilterState
+    * function
+        update_fn(state, x_chunk, mask=None, length=None) -> (KalmanFilterState, history)
+    """
+    def init_fn():
+        return init(params)
+
+    def update_fn(state, x_chunk, mask=None, length=None):
+        return update(params, state, x_chunk, mask, length, return_history)
+
+    return init_fn, jax.jit(update_fn, donate_argnums=(0,))
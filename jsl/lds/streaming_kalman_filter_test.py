@@ -0,0 +1,70 @@
+"""Tests for jsl.lds.streaming_kalman_filter"""
+import numpy as np
+import jax.numpy as jnp
+from jax import random, make_jaxpr
+
+import chex
+
+from absl.testing import absltest
+from absl.testing import parameterized
+
+from jsl.lds.kalman_filter import kalman_filter
+from jsl.lds import streaming_kalman_filter as skf
+from jsl.lds.lds_test_utils import tracking_lds
+
+
+class StreamingKalmanFilterTest(parameterized.TestCase):
+
+    @parameterized.parameters((10,), (16,))
+    def test_chunks_match_kalman_filter(self, chunk_size: int):
+        timesteps = 50
+        lds = tracking_lds()
+        _, x_hist = lds.sample(random.PRNGKey(0), timesteps)
+        mu_hist, Sigma_hist, _, _ = kalman_filter(lds, x_hist)
+
+        init_fn, update_fn = skf.streaming_filter(lds)
+        state = init_fn()
+        mu_chunks = []
+        for start in range(0, timesteps, chunk_size):
+            x_chunk = x_hist[start:start + chunk_size]
+            length = len(x_chunk)
+            # Pad the last chunk so that every chunk has the same shape
+            x_chunk = jnp.pad(x_chunk, ((0, chunk_size - length), (0, 0)))
+            state, (mu_chunk, *_) = update_fn(state, x_chunk, length=length)
+            mu_chunks.append(mu_chunk[:length])
+
+        assert int(state.t) == timesteps
+        chex.assert_trees_all_close(jnp.concatenate(mu_chunks), mu_hist, atol=1e-5, rtol=1e-5)
+        chex.assert_trees_all_close(state.mu, mu_hist[-1], atol=1e-5, rtol=1e-5)
+        chex.assert_trees_all_close(state.Sigma, Sigma_hist[-1], atol=1e-5, rtol=1e-5)
+
+        state_full, _ = skf.update(lds, skf.init(lds), x_hist, return_history=False)
+        chex.assert_trees_all_close(state.log_likelihood, state_full.log_likelihood, rtol=1e-5)
+
+    def test_state_roundtrip(self):
+        lds = tracking_lds()
+        _, x_hist = lds.sample(random.PRNGKey(1), 20)
+        state, _ = skf.update(lds, skf.init(lds), x_hist[:10])
+
+        restored = skf.KalmanFilterState(**{key: np.asarray(val) for key, val in state._asdict().items()})
+        state_next, _ = skf.update(lds, state, x_hist[10:])
+        restored_next, _ = skf.update(lds, restored, x_hist[10:])
+        chex.assert_trees_all_close(restored_next, state_next)
+
+    def test_no_history(self):
+        timesteps = 30
+        lds = tracking_lds()
+        _, x_hist = lds.sample(random.PRNGKey(2), timesteps)
+        state, _ = skf.update(lds, skf.init(lds), x_hist)
+        state_no_history, history = skf.update(lds, skf.init(lds), x_hist, return_history=False)
+        self.assertIsNone(history)
+        chex.assert_trees_all_close(state_no_history, state)
+
+        # The scan does not record any per-step output
+        jaxpr = make_jaxpr(lambda x: skf.update(lds, skf.init(lds), x, return_history=False))(x_hist)
+        scan, = [eqn for eqn in jaxpr.eqns if eqn.primitive.name == "scan"]
+        self.assertFalse(any(var.aval.shape[:1] == (timesteps,) for var in scan.outvars))
+
+
+if __name__ == '__main__':
+    absltest.main()
@@ -0,0 +1,260 @@
+# UD-factorised Kalman filter (Bierman-Thornton) for a Linear Dynamical System.
+# Covariances are propagated as Sigma = U diag(D) U^T, with U unit
+# upper-triangular and D non-negative. The measurement update is Bierman's
+# scalar update, done one (decorrelated) observation component at a time,
+# and the time update is Thornton's modified weighted Gram-Schmidt (MWGS)
+# orthogonalisation. Like the square-root filter, the covariances stay
+# symmetric positive semi-definite by construction, but no square root
+# is ever taken, which suits float32 and embedded workloads.
+
+import chex
+
+import jax.numpy as jnp
+from jax import lax
+from jax.scipy.linalg import solve_triangular
+
+from jsl.lds.kalman_filter import LDS, as_covariance, is_stacked, _observation_mask
+
+
+def ud_factorize(Sigma: chex.Array):
+    """
+    Compute the UD factorization Sigma = U diag(D) U^T of a symmetric
+    positive semi-definite matrix, without square roots
+    Parameters
+    ----------
+    Sigma: array(n, n)
+    Returns
+    -------
+    * array(n, n)
+        Unit upper-triangular factor U
+    * array(n)
+        Diagonal factor D
+    """
+    n, _ = Sigma.shape
+    index = jnp.arange(n)
+
+    def factorize_column(carry, j):
+        Sigma, U, D = carry
+        d = Sigma[j, j]
+        # Zero pivots (e.g, a deterministic component) give a zero column
+        u = jnp.where((index < j) & (d > 0), Sigma[:, j] / jnp.where(d > 0, d, 1.), 0.)
+        Sigma = Sigma - d * jnp.outer(u, u)
+        U = U.at[:, j].set(u.at[j].set(1.))
+        D = D.at[j].set(d)
+        return (Sigma, U, D), None
+
+    initial_state = (Sigma, jnp.eye(n, dtype=Sigma.dtype), jnp.zeros(n, dtype=Sigma.dtype))
+    (_, U, D), _ = lax.scan(factorize_column, initial_state, index[::-1])
+    return U, D
+
+
+def ud_to_covariance(U: chex.Array, D: chex.Array):
+    """
+    Compute Sigma = U diag(D) U^T
+    """
+    return (U * D[..., None, :]) @ jnp.swapaxes(U, -1, -2)
+
+
+def mwgs_time_update(A: chex.Array, U: chex.Array, D: chex.Array,
+                     U_Q: chex.Array, D_Q: chex.Array):
+    """
+    Time update of the UD factors of the covariance, A Sigma A^T + Q,
+    by modified weighted Gram-Schmidt orthogonalisation of the rows
+    of W = [A U, U_Q] with weights [D, D_Q] (Thornton, 1976)
+    Parameters
+    ----------
+    A: array(state_size, state_size)
+        Transition matrix
+    U: array(state_size, state_size)
+    D: array(state_size)
+        UD factors of the filtered covariance Sigmat-1
+    U_Q: array(state_size, state_size)
+    D_Q: array(state_size)
+        UD factors of the system noise covariance Q
+    Returns
+    -------
+    * array(state_size, state_size)
+    * array(state_size)
+        UD factors of the conditional covariance Sigmat|t-1
+    """
+    n, _ = U.shape
+    index = jnp.arange(n)
+    W = jnp.concatenate([A @ U, U_Q], axis=1)
+    weights = jnp.concatenate([D, D_Q])
+
+    def orthogonalize_row(carry, j):
+        W, U, D = carry
+        c = weights * W[j]
+        d = W[j] @ c
+        u = jnp.where((index < j) & (d > 0), (W @ c) / jnp.where(d > 0, d, 1.), 0.)
+        W = W - jnp.outer(u, W[j])
+        U = U.at[:, j].set(u.at[j].set(1.))
+        D = D.at[j].set(d)
+        return (W, U, D), None
+
+    initial_state = (W, jnp.eye(n, dtype=U.dtype), jnp.zeros(n, dtype=U.dtype))
+    (_, U, D), _ = lax.scan(orthogonalize_row, initial_state, index[::-1])
+    return U, D
+
+
+def bierman_update(mu: chex.Array, U: chex.Array, D: chex.Array,
+                   c: chex.Array, r: float, obs: float, observed: float = 1.):
+    """
+    Bierman's measurement update of the mean and the UD factors
+    of the covariance for a scalar observation obs = c^T z + v,
+    with v ~ N(0, r)
+    Parameters
+    ----------
+    mu: array(state_size)
+    U: array(state_size, state_size)
+    D: array(state_size)
+        Mean and UD factors of the covariance before the update
+    c: array(state_size)
+        Observation vector
+    r: float
+        Observation noise variance
+    obs: float
+        Observation
+    observed: float
+        1 if the observation is available, 0 to skip the update
+    Returns
+    -------
+    * array(state_size)
+    * array(state_size, state_size)
+    * array(state_size)
+        Mean and UD factors of the covariance after the update
+    * float
+        Log-likelihood of the observation
+    """
+    n, = mu.shape
+    index = jnp.arange(n)
+    f = U.T @ c
+    v = D * f
+
+    def update_column(carry, j):
+        U, D, b, alpha = carry
+        alpha_new = alpha + f[j] * v[j]
+        D = D.at[j].set(D[j] * alpha / alpha_new)
+        p = -f[j] / alpha
+        b = b.at[j].set(v[j])
+        column = U[:, j]
+        U = U.at[:, j].set(jnp.where(index < j, column + b * p, column))
+        b = b + jnp.where(index < j, column * v[j], 0.)
+        return (U, D, b, alpha_new), None
+
+    initial_state = (U, D, jnp.zeros_like(mu), jnp.asarray(r, dtype=mu.dtype))
+    (U_new, D_new, b, s), _ = lax.scan(update_column, initial_state, index)
+
+    e = obs - c @ mu
+    mu = mu + observed * b / s * e
+    U = jnp.where(observed > 0, U_new, U)
+    D = jnp.where(observed > 0, D_new, D)
+    log_likelihood = -observed * (e ** 2 / s + jnp.log(2 * jnp.pi * s)) / 2
+    return mu, U, D, log_likelihood
+
+
+def ud_kalman_filter(params: LDS, x_hist: chex.Array,
+                     return_history: bool = True,
+                     mask: chex.Array = None,
+                     length: int = None,
+                     return_log_likelihood: bool = False):
+    """
+    Compute the online version of the Kalman-Filter in UD form, with the
+    same interface as kalman_filter. A full observation covariance R is
+    decorrelated through its own UD factorization, R = U_R diag(D_R) U_R^T,
+    after which the components of the observation are assimilated one at
+    a time with Bierman's update. A constant system noise covariance Q is
+    factorized once, before the recursion.
+    Parameters
+    ----------
+    params: LDS
+         Linear Dynamical System object
+    x_hist: array(timesteps, observation_size)
+    return_history: bool
+    mask: array(timesteps) or array(timesteps, observation_size)
+        Boolean indicator of the observed steps or components (optional).
+        If not given, every non-NaN value of x_hist is observed.
+    length: int
+        Number of valid steps of x_hist (optional)
+    return_log_likelihood: bool
+        Whether to also return the log-marginal-likelihood log p(x1:T)
+    Returns
+    -------
+    * array(timesteps, state_size):
+        Filtered means mut
+    * array(timesteps, state_size, state_size)
+        Filtered covariances Sigmat
+    * array(timesteps, state_size)
+        Filtered conditional means mut|t-1
+    * array(timesteps, state_size, state_size)
+        Filtered conditional covariances Sigmat|t-1
+    * float
+        Log-marginal-likelihood (only if return_log_likelihood)
+    """
+    timesteps = x_hist.shape[0]
+    if length is None:
+        length = timesteps
+    state_size, _ = params.get_trans_mat_of(0).shape
+    x_hist, mask = _observation_mask(x_hist, mask)
+
+    constant_noise = not (callable(params.Q) or is_stacked(params.Q))
+    if constant_noise:
+        U_Q, D_Q = ud_factorize(as_covariance(params.Q, state_size).astype(x_hist.dtype))
+
+    def ud_kalman_step(state, inps):
+        mu_prev, U_prev, D_prev, log_likelihood = state
+        obs, obs_mask, t = inps
+        A = params.get_trans_mat_of(t)
+        Ct = params.get_obs_mat_of(t)
+        observation_size, _ = Ct.shape
+        if constant_noise:
+            U_Qt, D_Qt = U_Q, D_Q
+        else:
+            U_Qt, D_Qt = ud_factorize(as_covariance(params.get_system_noise_of(t), state_size))
+
+        # Time update
+        mu_cond = A @ mu_prev
+        U_cond, D_cond = mwgs_time_update(A, U_prev, D_prev, U_Qt, D_Qt)
+
+        # Missing components are decoupled from the observed ones,
+        # so that they do not mix with them after decorrelation
+        R = as_covariance(params.get_observation_noise_of(t), observation_size)
+        R = R * jnp.outer(obs_mask, obs_mask) + jnp.diag(1 - obs_mask)
+        U_R, D_R = ud_factorize(R)
+        obs_dec = solve_triangular(U_R, obs * obs_mask, lower=False, unit_diagonal=True)
+        C_dec = solve_triangular(U_R, Ct * obs_mask[:, None], lower=False, unit_diagonal=True)
+
+        def scalar_update(carry, inps):
+            mu, U, D, log_likelihood = carry
+            c, r_i, obs_i, mask_i = inps
+            mu, U, D, log_likelihood_i = bierman_update(mu, U, D, c, r_i, obs_i, mask_i)
+            return (mu, U, D, log_likelihood + log_likelihood_i), None
+
+        initial_state = (mu_cond, U_cond, D_cond, jnp.zeros((), mu_cond.dtype))
+        (mu, U, D, log_likelihood_t), _ = lax.scan(scalar_update, initial_state,
+                                                   (C_dec, D_R, obs_dec, obs_mask))
+
+        # Freeze the state past the end of the sequence
+        is_valid = t < length
+        mu = jnp.where(is_valid, mu, mu_prev)
+        U = jnp.where(is_valid, U, U_prev)
+        D = jnp.where(is_valid, D, D_prev)
+        mu_cond = jnp.where(is_valid, mu_cond, mu_prev)
+        U_cond = jnp.where(is_valid, U_cond, U_prev)
+        D_cond = jnp.where(is_valid, D_cond, D_prev)
+        log_likelihood = log_likelihood + jnp.where(is_valid, log_likelihood_t, 0.)
+
+        outputs = (mu, ud_to_covariance(U, D), mu_cond, ud_to_covariance(U_cond, D_cond))
+        return (mu, U, D, log_likelihood), outputs if return_history else None
+
+    Sigma0 = jnp.broadcast_to(params.Sigma, (state_size, state_size)).astype(x_hist.dtype)
+    U0, D0 = ud_factorize(Sigma0)
+    initial_state = (params.mu.astype(x_hist.dtype), U0, D0, jnp.zeros((), x_hist.dtype))
+    (mun, Un, Dn, log_likelihood), history = lax.scan(ud_kalman_step, initial_state,
+                                                      (x_hist, mask, jnp.arange(timesteps)))
+
+    if not return_history:
+        history = (mun, ud_to_covariance(Un, Dn), None, None)
+    if return_log_likelihood:
+        return (*history, log_likelihood)
+    return history
@@ -0,0 +1,80 @@
+"""Tests for jsl.lds.ud_kalman_filter"""
+import jax.numpy as jnp
+from jax import random
+
+import chex
+
+from absl.testing import absltest
+from absl.testing import parameterized
+
+from jsl.lds.kalman_filter import kalman_filter
+from jsl.lds.ud_kalman_filter import ud_factorize, ud_to_covariance, mwgs_time_update, ud_kalman_filter
+from jsl.lds.lds_test_utils import tracking_lds
+
+
+class UDKalmanFilterTest(parameterized.TestCase):
+
+    def test_ud_factorize(self):
+        M = random.normal(random.PRNGKey(0), (5, 5))
+        Sigma = M @ M.T + 0.1 * jnp.eye(5)
+        U, D = ud_factorize(Sigma)
+        chex.assert_trees_all_close(jnp.triu(U), U)
+        chex.assert_trees_all_close(jnp.diagonal(U), jnp.ones(5))
+        chex.assert_trees_all_close(ud_to_covariance(U, D), Sigma, atol=1e-4, rtol=1e-4)
+
+        # Singular covariances keep a zero diagonal factor
+        U, D = ud_factorize(jnp.zeros((3, 3)).at[0, 0].set(2.))
+        chex.assert_trees_all_close(D, jnp.array([2., 0., 0.]))
+
+    def test_mwgs_time_update(self):
+        key_A, key_Sigma, key_Q = random.split(random.PRNGKey(1), 3)
+        A = random.normal(key_A, (4, 4))
+        M, N = random.normal(key_Sigma, (4, 4)), random.normal(key_Q, (4, 4))
+        Sigma, Q = M @ M.T, N @ N.T + jnp.eye(4)
+        U, D = mwgs_time_update(A, *ud_factorize(Sigma), *ud_factorize(Q))
+        chex.assert_trees_all_close(ud_to_covariance(U, D), A @ Sigma @ A.T + Q, atol=1e-3, rtol=1e-3)
+
+    @parameterized.named_parameters(
+        ("full", "full"),
+        ("correlated_noise", "correlated_noise"),
+        ("diagonal_noise", "diagonal_noise"),
+        ("missing", "missing"),
+        ("ragged", "ragged"),
+        ("stacked_system_noise", "stacked_system_noise"),
+        ("callable_system_noise", "callable_system_noise"),
+    )
+    def test_matches_kalman_filter(self, case: str):
+        lds = tracking_lds()
+        _, x_hist = lds.sample(random.PRNGKey(2), 50)
+        mask, length = None, None
+        if case == "correlated_noise":
+            lds.R = jnp.array([[0.5, 0.3], [0.3, 0.4]])
+        elif case == "diagonal_noise":
+            lds.R = jnp.array([0.5, 0.2])
+        elif case == "missing":
+            lds.R = jnp.array([[0.5, 0.3], [0.3, 0.4]])
+            x_hist = x_hist.at[10:13].set(jnp.nan).at[20, 0].set(jnp.nan)
+        elif case == "ragged":
+            length = 31
+        elif case == "stacked_system_noise":
+            lds.Q = lds.Q * jnp.linspace(0.5, 2., 50)[:, None, None]
+        elif case == "callable_system_noise":
+            Q = lds.Q
+            lds.Q = lambda t: Q * (1 + 0.02 * t)
+
+        outputs = kalman_filter(lds, x_hist, mask=mask, length=length, return_log_likelihood=True)
+        outputs_ud = ud_kalman_filter(lds, x_hist, mask=mask, length=length, return_log_likelihood=True)
+        chex.assert_trees_all_close(outputs_ud, outputs, atol=1e-4, rtol=1e-4)
+
+    def test_no_history(self):
+        lds = tracking_lds()
+        _, x_hist = lds.sample(random.PRNGKey(3), 20)
+        mu_hist, Sigma_hist, _, _ = ud_kalman_filter(lds, x_hist)
+        mun, Sigman, mu_cond, Sigma_cond = ud_kalman_filter(lds, x_hist, return_history=False)
+        chex.assert_trees_all_close((mun, Sigman), (mu_hist[-1], Sigma_hist[-1]))
+        self.assertIsNone(mu_cond)
+        self.assertIsNone(Sigma_cond)
+
+
+if __name__ == '__main__':
+    absltest.main()
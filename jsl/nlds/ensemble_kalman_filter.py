@@ -0,0 +1,343 @@
+# Ensemble Kalman filter (EnKF) for very high-dimensional states, e.g,
+# states on a grid with 1e4-1e5 components, for which the dense d x d
+# covariances of the Kalman and extended Kalman filters do not fit in
+# memory. The uncertainty is represented by an ensemble of N members,
+# stored as an array(N, d), whose forecast is vectorised with vmap.
+# Two analysis steps are available:
+#   * "stochastic": the EnKF with perturbed observations
+#     (Burgers, van Leeuwen & Evensen, 1998)
+#   * "etkf": the ensemble transform Kalman filter, a deterministic
+#     square-root filter that works in the N-dimensional space of the
+#     ensemble (Bishop, Etherton & Majumdar, 2001; Hunt et al, 2007)
+# Sampling errors of small ensembles are mitigated by multiplicative
+# inflation and by localization with the Gaspari-Cohn taper (covariance
+# localization for the stochastic filter, local analyses with tapered
+# observation errors (LETKF) for the ETKF). Memory grows as O(N d), plus
+# O(m^2) for the localised stochastic filter with m observations.
+
+import chex
+
+import jax.numpy as jnp
+from jax import lax, random, vmap
+from jax.scipy.linalg import solve
+
+from dataclasses import dataclass
+
+from .base import NLDS
+
+
+@dataclass
+class Localization:
+    """
+    Spatial localization of the analysis step
+    Parameters
+    ----------
+    state_coords: array(state_size, n_dims) or array(state_size)
+        Coordinates of every component of the state
+    obs_coords: array(obs_size, n_dims) or array(obs_size)
+        Coordinates of every observation
+    radius: float
+        Distance beyond which the correlations are cut to zero
+    period: float
+        Size of a periodic domain (optional)
+    max_obs: int
+        Maximum number of (nearest) observations used by the local
+        analysis of every state component in the ETKF (optional)
+    """
+    state_coords: chex.Array
+    obs_coords: chex.Array
+    radius: float
+    period: float = None
+    max_obs: int = None
+
+
+def gaspari_cohn(distance: chex.Array, radius: float):
+    """
+    Gaspari-Cohn fifth-order piecewise rational taper, a compactly
+    supported approximation of a Gaussian that is one at distance zero
+    and zero beyond radius
+    """
+    r = 2 * jnp.abs(distance) / radius
+    inner = -r ** 5 / 4 + r ** 4 / 2 + 5 * r ** 3 / 8 - 5 * r ** 2 / 3 + 1
+    outer = r ** 5 / 12 - r ** 4 / 2 + 5 * r ** 3 / 8 + 5 * r ** 2 / 3 - 5 * r + 4 - 2 / (3 * jnp.maximum(r, 1))
+    return jnp.where(r <= 1, inner, jnp.where(r < 2, outer, 0.))
+
+
+def _distance(coords_a: chex.Array, coords_b: chex.Array, period: float = None):
+    """
+    Pairwise distances between array(n, n_dims) and array(m, n_dims)
+    """
+    diff = jnp.atleast_2d(coords_a.T).T[:, None, :] - jnp.atleast_2d(coords_b.T).T[None, :, :]
+    if period is not None:
+        diff = diff - period * jnp.round(diff / period)
+    return jnp.sqrt(jnp.sum(diff ** 2, axis=-1))
+
+
+def _sample_noise(key: chex.PRNGKey, cov: chex.Array, n_members: int, size: int):
+    """
+    Sample array(n_members, size) of zero-mean noise with covariance cov,
+    given as a scalar, a diagonal or a dense matrix
+    """
+    if jnp.ndim(cov) == 2:
+        return random.multivariate_normal(key, jnp.zeros(size), cov, (n_members,))
+    return random.normal(key, (n_members, size)) * jnp.sqrt(cov)
+
+
+def _inv_cov_product(cov: chex.Array, Y: chex.Array):
+    """
+    Compute Y cov^{-1} for Y of shape (n, size)
+    """
+    if jnp.ndim(cov) == 2:
+        return solve(cov, Y.T, sym_pos=True).T
+    return Y / cov
+
+
+def _map_state_chunks(fn, state_size: int, chunk_size: int):
+    """
+    Apply fn to chunks of chunk_size indices of the state with lax.map,
+    so that the intermediates of a single chunk are kept in memory.
+    fn maps an array(chunk_size) of indices to an array(n_members, chunk_size).
+    """
+    chunk_size = min(chunk_size, state_size)
+    n_chunks = -(-state_size // chunk_size)
+    indices = jnp.minimum(jnp.arange(n_chunks * chunk_size), state_size - 1).reshape(n_chunks, chunk_size)
+    outputs = lax.map(fn, indices)
+    n_members = outputs.shape[1]
+    return jnp.swapaxes(outputs, 0, 1).reshape(n_members, -1)[:, :state_size]
+
+
+def init_ensemble(key: chex.PRNGKey, mean: chex.Array, cov: chex.Array, n_members: int):
+    """
+    Sample an initial ensemble
+    Parameters
+    ----------
+    key: jax.random.PRNGKey
+    mean: array(state_size)
+    cov: float, array(state_size) or array(state_size, state_size)
+        Initial covariance, as a scalar variance, a diagonal or a dense matrix
+    n_members: int
+        Number of members of the ensemble
+    Returns
+    -------
+    * array(n_members, state_size)
+    """
+    state_size, = mean.shape
+    return mean + _sample_noise(key, cov, n_members, state_size)
+
+
+def stochastic_analysis(key: chex.PRNGKey,
+                        ensemble: chex.Array,
+                        obs_ensemble: chex.Array,
+                        obs: chex.Array,
+                        R: chex.Array,
+                        localization: Localization = None,
+                        chunk_size: int = 1024):
+    """
+    Analysis step of the EnKF with perturbed observations.
+    Every member is updated with a perturbed copy of the observation,
+    with the gain estimated from the ensemble anomalies.
+    Parameters
+    ----------
+    key: jax.random.PRNGKey
+        Seed of the observation perturbations
+    ensemble: array(n_members, state_size)
+        Forecast ensemble
+    obs_ensemble: array(n_members, obs_size)
+        Predicted observations of every member
+    obs: array(obs_size)
+        Observation
+    R: float, array(obs_size) or array(obs_size, obs_size)
+        Observation noise covariance
+    localization: Localization
+        Covariance localization (optional)
+    chunk_size: int
+        Number of state components localised at once
+    Returns
+    -------
+    * array(n_members, state_size)
+        Analysis ensemble
+    """
+    n_members, state_size = ensemble.shape
+    _, obs_size = obs_ensemble.shape
+    X = (ensemble - ensemble.mean(axis=0)) / jnp.sqrt(n_members - 1)
+    Y = (obs_ensemble - obs_ensemble.mean(axis=0)) / jnp.sqrt(n_members - 1)
+    innovations = obs + _sample_noise(key, R, n_members, obs_size) - obs_ensemble
+
+    if localization is None:
+        # Z = innovations (Y^T Y + R)^{-1}, with the Woodbury identity
+        # for a diagonal R so that only N x N systems are solved
+        if jnp.ndim(R) == 2:
+            Z = solve(Y.T @ Y + R, innovations.T, sym_pos=True).T
+        else:
+            innovations_scaled = _inv_cov_product(R, innovations)
+            Y_scaled = _inv_cov_product(R, Y)
+            inner = jnp.eye(n_members) + Y_scaled @ Y.T
+            Z = innovations_scaled - solve(inner, Y @ innovations_scaled.T, sym_pos=True).T @ Y_scaled
+        return ensemble + (Z @ Y.T) @ X
+
+    # Schur product of the tapers with the sample covariances
+    taper_obs = gaspari_cohn(_distance(localization.obs_coords, localization.obs_coords,
+                                       localization.period), localization.radius)
+    R = R if jnp.ndim(R) == 2 else jnp.diag(jnp.broadcast_to(R, (obs_size,)))
+    Z = solve(taper_obs * (Y.T @ Y) + R, innovations.T, sym_pos=True).T
+
+    def increment_chunk(indices):
+        distance = _distance(localization.state_coords[indices], localization.obs_coords, localization.period)
+        gain = gaspari_cohn(distance, localization.radius) * (X[:, indices].T @ Y)
+        return Z @ gain.T
+
+    return ensemble + _map_state_chunks(increment_chunk, state_size, chunk_size)
+
+
+def _transform(Y: chex.Array, Y_scaled: chex.Array, innovation: chex.Array):
+    """
+    Weights of the ETKF analysis, array(n_members, n_members), such that
+    the analysis anomalies are weights^T X, for anomalies Y and
+    anomalies Y_scaled = Y R^{-1} of the predicted observations
+    """
+    n_members, _ = Y.shape
+    # Eigendecomposition of (N - 1) I + Y R^{-1} Y^T, which gives both
+    # its inverse and the symmetric square root of the transform
+    eigvals, eigvecs = jnp.linalg.eigh((n_members - 1) * jnp.eye(n_members) + Y_scaled @ Y.T)
+    Pa = (eigvecs / eigvals) @ eigvecs.T
+    Wa = (eigvecs * jnp.sqrt((n_members - 1) / eigvals)) @ eigvecs.T
+    wa = Pa @ (Y_scaled @ innovation)
+    return Wa + wa[:, None]
+
+
+def etkf_analysis(ensemble: chex.Array,
+                  obs_ensemble: chex.Array,
+                  obs: chex.Array,
+                  R: chex.Array,
+                  localization: Localization = None,
+                  chunk_size: int = 1024):
+    """
+    Analysis step of the ensemble transform Kalman filter. The analysis
+    ensemble is a deterministic linear combination of the forecast
+    members, computed in the N-dimensional space of the ensemble.
+    With localization, every state component has its own analysis (LETKF)
+    in which the inverse observation errors are tapered by the distance
+    between the component and the observations.
+    Parameters
+    ----------
+    ensemble: array(n_members, state_size)
+        Forecast ensemble
+    obs_ensemble: array(n_members, obs_size)
+        Predicted observations of every member
+    obs: array(obs_size)
+        Observation
+    R: float, array(obs_size) or array(obs_size, obs_size)
+        Observation noise covariance. It must be diagonal
+        (a scalar or a vector) if localization is given.
+    localization: Localization
+        Local analyses (optional)
+    chunk_size: int
+        Number of state components analysed at once
+    Returns
+    -------
+    * array(n_members, state_size)
+        Analysis ensemble
+    """
+    n_members, state_size = ensemble.shape
+    _, obs_size = obs_ensemble.shape
+    mean = ensemble.mean(axis=0)
+    obs_mean = obs_ensemble.mean(axis=0)
+    X = ensemble - mean
+    Y = obs_ensemble - obs_mean
+    innovation = obs - obs_mean
+
+    if localization is None:
+        weights = _transform(Y, _inv_cov_product(R, Y), innovation)
+        return mean + weights.T @ X
+
+    if jnp.ndim(R) == 2:
+        raise ValueError("The localised ETKF requires a diagonal observation noise covariance R")
+    R_inv = jnp.broadcast_to(1 / R, (obs_size,))
+    max_obs = obs_size if localization.max_obs is None else min(localization.max_obs, obs_size)
+
+    def local_analysis(index):
+        distance = _distance(localization.state_coords[index][None], localization.obs_coords,
+                             localization.period)[0]
+        # Only the nearest observations take part in the local analysis
+        _, nearest = lax.top_k(-distance, max_obs)
+        R_inv_local = R_inv[nearest] * gaspari_cohn(distance[nearest], localization.radius)
+        Y_local = Y[:, nearest]
+        weights = _transform(Y_local, Y_local * R_inv_local, innovation[nearest])
+        return mean[index] + weights.T @ X[:, index]
+
+    analysis_chunk = vmap(local_analysis, out_axes=1)
+    return _map_state_chunks(analysis_chunk, state_size, chunk_size)
+
+
+def filter(params: NLDS,
+           key: chex.PRNGKey,
+           init_ensemble: chex.Array,
+           observations: chex.Array,
+           method: str = "etkf",
+           inflation: float = 1.,
+           localization: Localization = None,
+           chunk_size: int = 1024,
+           return_history: bool = True):
+    """
+    Run the Ensemble Kalman Filter over a set of observations.
+    The transition noise Q and the observation noise R of the NLDS can be
+    given as scalar variances or diagonals to keep the memory in O(N d).
+    As in the extended Kalman filter, a time-varying Q is a function
+    Q(z, t) of the previous mean and of the step index t.
+    Parameters
+    ----------
+    params: NLDS
+        Nonlinear dynamical system, whose transition function fz and
+        observation function fx act on a single member
+    key: jax.random.PRNGKey
+        Seed of the transition noise and of the observation perturbations
+    init_ensemble: array(n_members, state_size)
+        Ensemble before the first observation (see init_ensemble)
+    observations: array(nsteps, obs_size)
+    method: str
+        Analysis step, "stochastic" or "etkf"
+    inflation: float
+        Multiplicative inflation of the forecast anomalies (>= 1)
+    localization: Localization
+        Localization of the analysis step (optional)
+    chunk_size: int
+        Number of state components localised at once
+    return_history: bool
+        Whether to return the history of the ensemble mean and spread
+    Returns
+    -------
+    * array(n_members, state_size)
+        Final analysis ensemble
+    * dict
+        History of the ensemble means ("mean") and standard
+        deviations ("std"), array(nsteps, state_size) each
+    """
+    if method not in ("stochastic", "etkf"):
+        raise ValueError(f"Unknown method {method}, expected 'stochastic' or 'etkf'")
+    n_members, state_size = init_ensemble.shape
+
+    def filter_step(state, obs):
+        ensemble, key, t = state
+        key, key_system, key_obs = random.split(key, 3)
+
+        # Forecast, vectorised over the members. As in the EKF, the
+        # system noise is evaluated at the previous mean and step
+        Q = params.Qz(ensemble.mean(axis=0), t)
+        ensemble = vmap(params.fz)(ensemble)
+        ensemble = ensemble + _sample_noise(key_system, Q, n_members, state_size)
+        mean = ensemble.mean(axis=0)
+        ensemble = mean + inflation * (ensemble - mean)
+
+        # Analysis
+        obs_ensemble = vmap(params.fx)(ensemble)
+        R = params.Rx(mean)
+        if method == "stochastic":
+            ensemble = stochastic_analysis(key_obs, ensemble, obs_ensemble, obs, R, localization, chunk_size)
+        else:
+            ensemble = etkf_analysis(ensemble, obs_ensemble, obs, R, localization, chunk_size)
+
+        history = {"mean": ensemble.mean(axis=0), "std": ensemble.std(axis=0, ddof=1)}
+        return (ensemble, key, t + 1), history if return_history else None
+
+    (ensemble, _, _), history = lax.scan(filter_step, (init_ensemble, key, 0), observations)
+    return ensemble, history
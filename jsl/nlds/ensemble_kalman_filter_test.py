@@ -0,0 +1,180 @@
+"""Tests for jsl.nlds.ensemble_kalman_filter"""
+import jax.numpy as jnp
+from jax import random
+
+import chex
+
+from absl.testing import absltest
+from absl.testing import parameterized
+
+from jsl.nlds.base import NLDS
+from jsl.nlds.ensemble_kalman_filter import (Localization, init_ensemble, stochastic_analysis,
+                                             etkf_analysis, filter)
+
+
+def linear_ensemble(key: chex.PRNGKey, n_members: int = 10, state_size: int = 5, obs_size: int = 3):
+    """
+    Forecast ensemble, linear observation matrix and observation
+    of a small linear-Gaussian system
+    """
+    key_ensemble, key_C, key_obs = random.split(key, 3)
+    ensemble = init_ensemble(key_ensemble, jnp.linspace(-1., 1., state_size), 1., n_members)
+    C = random.normal(key_C, (obs_size, state_size))
+    obs = random.normal(key_obs, (obs_size,))
+    return ensemble, C, obs
+
+
+def lorenz96(state_size: int = 40, forcing: float = 8., dt: float = 0.05):
+    """
+    Transition of the Lorenz-96 model, integrated with RK4
+    """
+    def drift(z):
+        return (jnp.roll(z, -1) - jnp.roll(z, 2)) * jnp.roll(z, 1) - z + forcing
+
+    def fz(z):
+        k1 = drift(z)
+        k2 = drift(z + dt / 2 * k1)
+        k3 = drift(z + dt / 2 * k2)
+        k4 = drift(z + dt * k3)
+        return z + dt / 6 * (k1 + 2 * k2 + 2 * k3 + k4)
+
+    return fz
+
+
+class EnsembleKalmanFilterTest(parameterized.TestCase):
+
+    @parameterized.named_parameters(
+        ("scalar_noise", "scalar"),
+        ("diagonal_noise", "diagonal"),
+        ("dense_noise", "dense"),
+    )
+    def test_etkf_exact(self, noise: str):
+        # The ETKF analysis has the mean and the sample covariance of the
+        # Kalman update of the sample covariance of the forecast ensemble
+        ensemble, C, obs = linear_ensemble(random.PRNGKey(0))
+        n_members, _ = ensemble.shape
+        R_dense = jnp.diag(jnp.array([0.5, 1., 2.]))
+        R = {"scalar": 0.5, "diagonal": jnp.diag(R_dense), "dense": R_dense}[noise]
+        R_dense = R_dense if noise != "scalar" else 0.5 * jnp.eye(3)
+
+        mean = ensemble.mean(axis=0)
+        Sigma = jnp.cov(ensemble, rowvar=False)
+        K = jnp.linalg.solve(C @ Sigma @ C.T + R_dense, C @ Sigma).T
+        mean_expected = mean + K @ (obs - C @ mean)
+        Sigma_expected = Sigma - K @ C @ Sigma
+
+        analysis = etkf_analysis(ensemble, ensemble @ C.T, obs, R)
+        chex.assert_shape(analysis, (n_members, 5))
+        chex.assert_trees_all_close(analysis.mean(axis=0), mean_expected, atol=1e-4, rtol=1e-4)
+        chex.assert_trees_all_close(jnp.cov(analysis, rowvar=False), Sigma_expected, atol=1e-4, rtol=1e-4)
+
+    def test_stochastic_woodbury(self):
+        # The Woodbury identity for a diagonal R matches the dense solve
+        key = random.PRNGKey(1)
+        ensemble, C, obs = linear_ensemble(random.PRNGKey(0))
+        n_members, _ = ensemble.shape
+        r = jnp.array([0.5, 1., 2.])
+        obs_ensemble = ensemble @ C.T
+
+        X = (ensemble - ensemble.mean(axis=0)) / jnp.sqrt(n_members - 1)
+        Y = (obs_ensemble - obs_ensemble.mean(axis=0)) / jnp.sqrt(n_members - 1)
+        innovations = obs + random.normal(key, (n_members, 3)) * jnp.sqrt(r) - obs_ensemble
+        Z = jnp.linalg.solve(Y.T @ Y + jnp.diag(r), innovations.T).T
+        expected = ensemble + Z @ Y.T @ X
+
+        analysis = stochastic_analysis(key, ensemble, obs_ensemble, obs, r)
+        chex.assert_trees_all_close(analysis, expected, atol=1e-4, rtol=1e-4)
+
+    def test_stochastic_mean(self):
+        # With a large ensemble, the perturbations of the observations
+        # average out and the analysis mean is that of the Kalman update
+        ensemble, C, obs = linear_ensemble(random.PRNGKey(0), n_members=2000)
+        R = 0.5
+
+        mean = ensemble.mean(axis=0)
+        Sigma = jnp.cov(ensemble, rowvar=False)
+        K = jnp.linalg.solve(C @ Sigma @ C.T + R * jnp.eye(3), C @ Sigma).T
+        mean_expected = mean + K @ (obs - C @ mean)
+        Sigma_expected = Sigma - K @ C @ Sigma
+
+        analysis = stochastic_analysis(random.PRNGKey(1), ensemble, ensemble @ C.T, obs, R)
+        chex.assert_trees_all_close(analysis.mean(axis=0), mean_expected, atol=5e-2)
+        chex.assert_trees_all_close(jnp.cov(analysis, rowvar=False), Sigma_expected, atol=1e-1)
+
+    @parameterized.named_parameters(
+        ("stochastic", "stochastic"),
+        ("etkf", "etkf"),
+    )
+    def test_global_localization(self, method: str):
+        # A radius much larger than the domain leaves the analysis unchanged
+        key = random.PRNGKey(1)
+        ensemble, C, obs = linear_ensemble(random.PRNGKey(0))
+        r = jnp.array([0.5, 1., 2.])
+        localization = Localization(state_coords=jnp.arange(5.), obs_coords=jnp.array([0., 2., 4.]),
+                                    radius=1e6)
+
+        if method == "stochastic":
+            analyse = lambda localization: stochastic_analysis(key, ensemble, ensemble @ C.T, obs, r,
+                                                               localization, chunk_size=2)
+        else:
+            analyse = lambda localization: etkf_analysis(ensemble, ensemble @ C.T, obs, r,
+                                                         localization, chunk_size=2)
+        chex.assert_trees_all_close(analyse(localization), analyse(None), atol=1e-4, rtol=1e-4)
+
+    def test_localized_etkf_dense_noise(self):
+        ensemble, C, obs = linear_ensemble(random.PRNGKey(0))
+        localization = Localization(state_coords=jnp.arange(5.), obs_coords=jnp.array([0., 2., 4.]),
+                                    radius=2.)
+        with self.assertRaises(ValueError):
+            etkf_analysis(ensemble, ensemble @ C.T, obs, jnp.eye(3), localization)
+
+    @parameterized.named_parameters(
+        ("stochastic", "stochastic"),
+        ("etkf", "etkf"),
+    )
+    def test_lorenz96(self, method: str):
+        # A small localised ensemble tracks the state of Lorenz-96
+        # more closely than the observations do
+        state_size, n_members, nsteps = 40, 20, 100
+        key_init, key_sample, key_ensemble, key_filter = random.split(random.PRNGKey(0), 4)
+        fz = lorenz96(state_size)
+        fx = lambda z: z[::2]
+        q, r = 0.01, 1.
+
+        z0 = 8. + random.normal(key_init, (state_size,))
+        for _ in range(200):
+            z0 = fz(z0)
+        system = NLDS(fz, fx, q * jnp.eye(state_size), r * jnp.eye(state_size // 2))
+        z_hist, x_hist = system.sample(key_sample, z0, nsteps)
+
+        coords = jnp.arange(state_size, dtype=jnp.float32)
+        localization = Localization(state_coords=coords, obs_coords=coords[::2],
+                                    radius=8., period=state_size)
+        ensemble = init_ensemble(key_ensemble, z0, 1., n_members)
+        model = NLDS(fz, fx, q, r)
+        _, history = filter(model, key_filter, ensemble, x_hist, method=method,
+                            inflation=1.05, localization=localization)
+
+        chex.assert_shape(history["mean"], (nsteps, state_size))
+        rmse = jnp.sqrt(jnp.mean((history["mean"][20:] - z_hist[20:]) ** 2))
+        rmse_obs = jnp.sqrt(jnp.mean((x_hist[20:] - z_hist[20:, ::2]) ** 2))
+        self.assertLess(rmse, 0.8 * rmse_obs)
+
+    def test_time_varying_system_noise(self):
+        # Q(z, t) has the signature of the extended Kalman filter
+        ensemble = init_ensemble(random.PRNGKey(0), jnp.zeros(2), 1., 500)
+        observations = jnp.zeros((3, 2))
+        model = NLDS(lambda z: z, lambda z: z, lambda z, t: (t == 1) * 100. * jnp.ones(2), 1e4)
+        _, history = filter(model, random.PRNGKey(1), ensemble, observations, method="stochastic")
+        std = history["std"].mean(axis=1)
+        self.assertGreater(std[1], 5 * std[0])
+
+    def test_unknown_method(self):
+        ensemble = jnp.zeros((4, 2))
+        model = NLDS(lambda z: z, lambda z: z, 0.1, 0.1)
+        with self.assertRaises(ValueError):
+            filter(model, random.PRNGKey(0), ensemble, jnp.zeros((3, 2)), method="letkf")
+
+
+if __name__ == '__main__':
+    absltest.main()